@@ -3,7 +3,7 @@ from backend_auth import get_db_connection
 
 # Function to count pending comments
 def get_pending_comments():
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if not conn:
         return "DB connection error!"
     
@@ -36,7 +36,7 @@ def add_comment(data_id, patient_id, comment):
 
 # Function to retrieve all pending comment cases
 def get_pending_comment_cases():
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if not conn:
         return "DB connection error!"
 
@@ -53,7 +53,7 @@ def get_pending_comment_cases():
     return pending_cases  # Returns a list of (data_id, patient_id)
 
 def total_count():
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if not conn:
         return "DB connection error!"
 
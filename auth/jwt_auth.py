@@ -22,5 +22,5 @@ def verify_token(token: str):
         return payload
     except jwt.ExpiredSignatureError:
         return None
-    except jwt.JWTError:
+    except jwt.PyJWTError:
         return None
@@ -0,0 +1,188 @@
+import os
+import time
+import random
+import ipaddress
+import threading
+from collections import OrderedDict
+
+# Login attempts allowed in a burst per account, and the steady rate after it
+LOGIN_RATE_CAPACITY = float(os.getenv("LOGIN_RATE_CAPACITY", "5"))
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", "5"))
+
+# The same per client address, across all accounts (looser: one address may be a NAT)
+LOGIN_IP_RATE_CAPACITY = float(os.getenv("LOGIN_IP_RATE_CAPACITY", "20"))
+LOGIN_IP_RATE_PER_MINUTE = float(os.getenv("LOGIN_IP_RATE_PER_MINUTE", "20"))
+
+# Reverse proxies (addresses or CIDRs, comma-separated) whose X-Forwarded-For is believed.
+# Empty: the header is ignored and the socket peer address is the client.
+TRUSTED_PROXIES = [ipaddress.ip_network(net.strip(), strict=False)
+                   for net in os.getenv("TRUSTED_PROXIES", "").split(",") if net.strip()]
+
+# "memory" keeps buckets in this process; "postgres" shares them between processes
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+
+# Buckets kept in memory; the least recently used are dropped beyond this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Unlogged: bucket state is disposable, so it skips the WAL (and is not replicated)
+RATE_LIMIT_SCHEMA = """
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    allowed BOOLEAN NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated ON rate_limit_buckets(updated_at);
+"""
+
+# Refill and take in one atomic statement; the row lock serializes callers of a key.
+# In SET, b.* are the old values, so `allowed` and `tokens` see the same refill.
+RATE_LIMIT_TAKE = """
+    INSERT INTO rate_limit_buckets AS b (key, tokens, allowed, updated_at)
+    VALUES (%(key)s, %(capacity)s - %(cost)s, TRUE, now())
+    ON CONFLICT (key) DO UPDATE SET
+        allowed = LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM now() - b.updated_at) * %(rate)s) >= %(cost)s,
+        tokens = LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM now() - b.updated_at) * %(rate)s)
+                 - CASE WHEN LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM now() - b.updated_at) * %(rate)s) >= %(cost)s
+                        THEN %(cost)s ELSE 0 END,
+        updated_at = now()
+    RETURNING allowed, tokens
+"""
+
+# Buckets idle long enough to be full again carry no state and can go
+RATE_LIMIT_PURGE = "DELETE FROM rate_limit_buckets WHERE updated_at < now() - make_interval(secs => %s)"
+
+class TokenBucketLimiter:
+    """
+    Token buckets per key, in this process.
+
+    A bucket holds up to `capacity` tokens and refills at `rate` tokens per second;
+    each request takes `cost`. State is (tokens, last update) per key, refilled lazily
+    on access, so a check is O(1) whatever the traffic. Keys live in an LRU of at most
+    max_keys entries; an evicted key simply starts again with a full bucket.
+    """
+
+    def __init__(self, capacity, rate, max_keys=None):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.max_keys = max_keys or RATE_LIMIT_MAX_KEYS
+        self.lock = threading.Lock()
+        # {key: [tokens, monotonic time of last update]}
+        self.buckets = OrderedDict()
+
+    def take(self, key, cost=1.0):
+        """
+        Take `cost` tokens from `key`'s bucket if it has them.
+
+        Returns:
+            tuple: (allowed, seconds until `cost` tokens are available; 0 if allowed)
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [self.capacity, now]
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True, 0.0
+            return False, (cost - bucket[0]) / self.rate
+
+class PostgresTokenBucketLimiter:
+    """
+    The same token buckets kept in the rate_limit_buckets table, so every process
+    (Streamlit replicas, workers) draws on one bucket per key. A check is one UPSERT.
+
+    If the database is unreachable the check falls back to a local bucket, so logins
+    stay limited per process rather than failing open or locking everyone out.
+    """
+
+    def __init__(self, capacity, rate, connect, purge_probability=0.01):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        # connect() -> psycopg2 connection or None
+        self.connect = connect
+        self.purge_probability = purge_probability
+        self.fallback = TokenBucketLimiter(capacity, rate)
+        self.schema_ready = False
+
+    def take(self, key, cost=1.0):
+        conn = self.connect()
+        if not conn:
+            return self.fallback.take(key, cost)
+
+        try:
+            with conn.cursor() as cursor:
+                if not self.schema_ready:
+                    cursor.execute(RATE_LIMIT_SCHEMA)
+                    self.schema_ready = True
+                cursor.execute(RATE_LIMIT_TAKE, {'key': key, 'capacity': self.capacity,
+                                                 'rate': self.rate, 'cost': float(cost)})
+                allowed, tokens = cursor.fetchone()
+                if random.random() < self.purge_probability:
+                    cursor.execute(RATE_LIMIT_PURGE, (self.capacity / self.rate,))
+            conn.commit()
+            return allowed, 0.0 if allowed else (cost - tokens) / self.rate
+        except Exception as e:
+            print(f"Error checking rate limit: {str(e)}")
+            conn.rollback()
+            return self.fallback.take(key, cost)
+        finally:
+            conn.close()
+
+def make_limiter(capacity, per_minute, connect=None):
+    """Limiter for RATE_LIMIT_BACKEND; `connect` is required for the postgres backend"""
+    rate = per_minute / 60.0
+    if RATE_LIMIT_BACKEND == "postgres" and connect is not None:
+        return PostgresTokenBucketLimiter(capacity, rate, connect)
+    return TokenBucketLimiter(capacity, rate)
+
+def _trusted(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in net for net in TRUSTED_PROXIES)
+
+def forwarded_client(peer, forwarded):
+    """
+    The client address given the socket peer and an X-Forwarded-For value.
+
+    X-Forwarded-For is only read when the peer is a trusted proxy, and then from the
+    right: each trusted proxy appends the address it received from, so the rightmost
+    hop that is not itself a trusted proxy is the first one a client could not forge.
+    """
+    if not peer or not forwarded or not _trusted(peer):
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+def client_ip():
+    """The Streamlit client's address (see forwarded_client), or 'unknown'"""
+    try:
+        import streamlit as st
+        peer = getattr(st.context, "ip_address", None)
+        return forwarded_client(peer, st.context.headers.get("X-Forwarded-For")) or "unknown"
+    except Exception:
+        return "unknown"
+
+def login_keys(table, username, ip=None):
+    """
+    Bucket keys of a login attempt: (account, client address).
+
+    Kept apart so that neither rotating addresses against one account nor trying many
+    accounts from one address escapes the limit. The address key is None when the
+    client address is unknown (Streamlit reports none for localhost), rather than
+    putting every such client in one shared bucket.
+    """
+    ip = ip or client_ip()
+    account = f"login:{table}:{(username or '').strip().lower()}"
+    return account, (None if ip == "unknown" else f"login-ip:{ip}")
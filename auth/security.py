@@ -1,26 +1,38 @@
 from functools import wraps
 import streamlit as st
 from datetime import datetime, timedelta
-import time
+import math
 from .jwt_auth import verify_token
+from .rate_limiter import make_limiter, client_ip, RATE_LIMIT_BACKEND
 
-def rate_limit(max_requests: int = 5, window_seconds: int = 60):
+def rate_limit(max_requests: int = 5, window_seconds: int = 60, key=None):
+    """
+    Token-bucket limit on calls: bursts of up to max_requests, refilled at
+    max_requests per window_seconds.
+
+    Args:
+        max_requests (int): Bucket capacity
+        window_seconds (int): Seconds to refill an empty bucket
+        key (callable, optional): key(*args, **kwargs) -> str choosing the bucket;
+            defaults to the client address (socket peer, or X-Forwarded-For only
+            behind TRUSTED_PROXIES), so one client cannot use up everyone's quota
+
+    Buckets are shared between processes when RATE_LIMIT_BACKEND=postgres.
+    """
     def decorator(func):
-        requests = []
+        connect = None
+        if RATE_LIMIT_BACKEND == "postgres":
+            from backend_auth import get_db_connection
+            connect = get_db_connection
+        limiter = make_limiter(max_requests, max_requests * 60.0 / window_seconds, connect)
         
         @wraps(func)
         def wrapper(*args, **kwargs):
-            now = time.time()
-            
-            # Remove old requests
-            while requests and requests[0] < now - window_seconds:
-                requests.pop(0)
-            
-            if len(requests) >= max_requests:
-                st.error("Too many attempts. Please try again later.")
+            bucket = f"{func.__module__}.{func.__qualname__}:{key(*args, **kwargs) if key else client_ip()}"
+            allowed, retry_after = limiter.take(bucket)
+            if not allowed:
+                st.error(f"Too many attempts. Please try again in {math.ceil(retry_after)} seconds.")
                 return None
-                
-            requests.append(now)
             return func(*args, **kwargs)
         return wrapper
     return decorator
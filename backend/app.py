@@ -1,10 +1,8 @@
 from fastapi import FastAPI, WebSocket, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.responses import JSONResponse
-from fastapi.responses import JSONResponse
 import asyncpg
 import jwt
 from datetime import datetime, timedelta
@@ -13,19 +11,9 @@ from dotenv import load_dotenv
 from backend.services.stream_service import StreamService
 from backend.models.auth import TokenData, DeviceAuth
 from backend.models.stream import SensorData, TrialResponse
-from backend.services.stream_service import StreamService
-from backend.models.auth import TokenData, DeviceAuth
-from backend.models.stream import SensorData, TrialResponse
+from utils.profiling import profiling_router
 import ssl
 
-import os
-from dotenv import load_dotenv
-import asyncpg
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
-
 # Load .env from common locations
 env_files = [
     os.path.join('.env', 'FYP_webapp.env'),
@@ -35,16 +23,7 @@ env_files = [
 for env_file in env_files:
     if os.path.exists(env_file):
         load_dotenv(env_file)
-        print(f"[INFO] Loaded environment variables from {env_file}")
         break
-    else:
-        print("[WARN] No .env found. Falling back to system env.")
-
-# Check if variables are loaded
-print(f"DB_HOST: {os.getenv('DB_HOST')}")
-print(f"DB_USER: {os.getenv('DB_USER')}")
-print(f"DB_NAME: {os.getenv('DB_NAME')}")
-print(f"DB_PASSWORD: {os.getenv('DB_PASSWORD')}")
 
 app = FastAPI(
     title="FYP WebApp API",
@@ -52,11 +31,11 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Admin-only on-demand CPU (sampling) and memory (tracemalloc) profiles under /debug/profile
+app.include_router(profiling_router())
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Security middleware
-app.add_middleware(TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1"])
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Security middleware
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1"])
@@ -77,16 +56,6 @@ app.add_middleware(
     max_age=600,  # Cache preflight requests for 10 minutes
 )
 
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    return response
-
-# Your database connection logic should go here
 @app.middleware("http")
 async def add_security_headers(request: Request, call_next):
     response = await call_next(request)
@@ -8,8 +8,10 @@ import asyncpg
 from fastapi import WebSocket
 
 class StreamService:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: asyncpg.Pool, alert_engine=None, alert_writer=None):
         self.pool = pool
+        self.alert_engine = alert_engine  # utils.alert_rules.AlertEngine, optional
+        self.alert_writer = alert_writer  # utils.alert_rules.AlertWriter, optional
         self.active_trials: Dict[int, Dict] = {}  # patient_id -> trial info
         self.data_buffer: Dict[int, List] = defaultdict(list)
         self.buffer_size = 1000  # Number of readings before batch insert
@@ -76,6 +78,10 @@ class StreamService:
 
     async def handle_sensor_data(self, patient_id: int, device_id: str, data: Dict):
         """Handle incoming sensor data"""
+        # Clinical alert rules; fired alerts are batch-written by the writer
+        if self.alert_engine is not None and self.alert_writer is not None:
+            self.alert_writer.add(self.alert_engine.evaluate(patient_id, data))
+
         # Only store in temp table if trial is active
         if patient_id in self.active_trials:
             self.data_buffer[patient_id].append({
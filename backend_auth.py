@@ -1,11 +1,47 @@
 from argon2 import PasswordHasher
 ph = PasswordHasher()
 import os
+import math
+import threading
 import psycopg2
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
+from functools import partial
+from utils.query_profiler import profiled_connect
+from database.workloads import open_connection
+from database.replicas import routed
+from auth.rate_limiter import (make_limiter, login_keys, LOGIN_RATE_CAPACITY, LOGIN_RATE_PER_MINUTE,
+                               LOGIN_IP_RATE_CAPACITY, LOGIN_IP_RATE_PER_MINUTE)
 
-def get_db_connection():
-    """Create a new database connection."""
+# Threads verifying logins (user lookup + argon2). argon2-cffi releases the GIL, so
+# these run in parallel without stalling other sessions; the bound caps CPU and DB use.
+LOGIN_WORKERS = int(os.getenv("LOGIN_WORKERS", "4"))
+
+# Logins allowed to queue behind busy workers before new ones are turned away
+LOGIN_QUEUE = int(os.getenv("LOGIN_QUEUE", "16"))
+
+# Seconds a login waits for its verification before giving up
+LOGIN_TIMEOUT = float(os.getenv("LOGIN_TIMEOUT", "10"))
+
+_login_executor = None
+_login_limiters = None
+_login_slots = threading.BoundedSemaphore(LOGIN_WORKERS + LOGIN_QUEUE)
+_login_lock = threading.Lock()
+
+def get_db_connection(workload='interactive', read_only=False, max_lag=None):
+    """
+    Create a new database connection.
+
+    Args:
+        workload (str): Workload class ('interactive' or 'analytics'); sets the
+            connection's statement_timeout and application_name, and waits for a slot
+        read_only (bool): The caller only reads; it may be served by a replica
+            (DB_REPLICA_DSNS) whose replay lag is within max_lag
+        max_lag (float, optional): Lag bound in seconds (defaults to DB_REPLICA_MAX_LAG)
+
+    Returns:
+        connection or None: None if the connection failed or the class stayed full
+    """
     import os
     import psycopg2
     # Load .env from common locations
@@ -31,13 +67,20 @@ def get_db_connection():
     DB_PORT = os.getenv("DB_PORT", "5432")
 
     try:
-        conn = psycopg2.connect(
+        # Admission and class settings, a replica for reads when one is fresh enough, then
+        # psycopg2.connect (through the query profiler when on)
+        conn = open_connection(
+            routed(partial(profiled_connect, psycopg2.connect), read_only, max_lag),
+            workload,
             host=DB_HOST,
             database=DB_NAME,
             user=DB_USER,
             password=DB_PASSWORD,
             port=DB_PORT
         )
+        if conn is None:
+            print(f"[WARN] No {workload} database slot free; try again shortly")
+            return None
         print(f"[INFO] Connected to database {DB_NAME} at {DB_HOST}:{DB_PORT} as {DB_USER}")
         return conn
     except psycopg2.OperationalError as e:
@@ -57,17 +100,39 @@ def verify_password(stored_hash, password):
     except:
         return False
 
-# Login function (works for both Users & Admins)
-def login(table, username, password):
+def _login_pool():
+    """The login verification executor and (account, address) rate limiters, created on first use"""
+    global _login_executor, _login_limiters
+    with _login_lock:
+        if _login_executor is None:
+            _login_executor = ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="login")
+            _login_limiters = (
+                make_limiter(LOGIN_RATE_CAPACITY, LOGIN_RATE_PER_MINUTE, get_db_connection),
+                make_limiter(LOGIN_IP_RATE_CAPACITY, LOGIN_IP_RATE_PER_MINUTE, get_db_connection),
+            )
+    return _login_executor, _login_limiters
+
+def _login_message(message):
+    """Tell the user why a login was not attempted (console outside Streamlit)"""
+    print(f"[WARN] {message}")
+    try:
+        import streamlit as st
+        st.error(message)
+    except Exception:
+        pass
+
+def _check_credentials(table, username, password):
+    """Look up and verify a login; runs on a login worker"""
     conn = get_db_connection()
     if not conn:
         return False  # Stop if DB connection fails
 
-    with conn.cursor() as cursor:
-        cursor.execute(f"SELECT passkey FROM {table} WHERE username = %s;", (username,))
-        result = cursor.fetchone()
-
-    conn.close()  # Close connection after query
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT passkey FROM {table} WHERE username = %s;", (username,))
+            result = cursor.fetchone()
+    finally:
+        conn.close()  # Close before hashing so the connection isn't held through argon2
 
     if result:
         stored_passkey = result[0]
@@ -77,6 +142,48 @@ def login(table, username, password):
             return verify_password(stored_passkey, password)
     return False
 
+# Login function (works for both Users & Admins)
+def login(table, username, password):
+    """
+    Check a username and password against `table` (patients or admin_users).
+
+    Attempts are rate limited per client address and, separately, per account
+    (token buckets; both must allow the attempt). The lookup and the argon2
+    verification run on a bounded worker pool.
+
+    Returns:
+        bool: True if the credentials are valid; False otherwise, including when
+        the attempt was rate limited or the login service was busy
+    """
+    executor, (account_limiter, ip_limiter) = _login_pool()
+    account_key, ip_key = login_keys(table, username)
+    # Address first, stopping at the first denial: a throttled client must not
+    # drain the tokens of the account it is guessing at
+    for limiter, key in ((ip_limiter, ip_key), (account_limiter, account_key)):
+        if key is None:
+            continue
+        allowed, retry_after = limiter.take(key)
+        if not allowed:
+            _login_message(f"Too many login attempts. Please try again in {math.ceil(retry_after)} seconds.")
+            return False
+
+    if not _login_slots.acquire(blocking=False):
+        _login_message("The login service is busy. Please try again in a moment.")
+        return False
+    try:
+        future = executor.submit(_check_credentials, table, username, password)
+    except Exception:
+        _login_slots.release()
+        raise
+    future.add_done_callback(lambda _: _login_slots.release())
+
+    try:
+        return future.result(timeout=LOGIN_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        _login_message("Login timed out. Please try again.")
+        return False
+
 # Register a new user
 def register_user(username, password):
     conn = get_db_connection()
@@ -0,0 +1,139 @@
+import pandas as pd
+from datetime import datetime, timezone
+from backend_auth import get_db_connection
+from utils.latency_trace import LatencyAggregator, LATENCY_METRICS_SCHEMA, STAGES, elapsed_ms
+
+# One aggregator per dashboard, shared by every session of this Streamlit process
+_render_latency = {}
+
+def _as_utc(value):
+    """Aware UTC datetime; naive DB timestamps are stored in the server's zone (UTC in the containers)"""
+    if value is None:
+        return None
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def record_render(source, committed_at, device_time=None, rendered_at=None):
+    """
+    Record that a reading reached the screen, and write the finished window if one is due.
+
+    Args:
+        source (str): Dashboard name (becomes latency_metrics.source)
+        committed_at (datetime): The reading's DB timestamp
+        device_time (datetime, optional): The reading's device timestamp
+        rendered_at (datetime, optional): Render time (defaults to now)
+
+    Returns:
+        dict: {stage: milliseconds} for this reading (stages that could be computed)
+    """
+    rendered_at = rendered_at or datetime.now(timezone.utc)
+    aggregator = _render_latency.get(source)
+    if aggregator is None:
+        aggregator = _render_latency.setdefault(source, LatencyAggregator(source))
+
+    stages = {
+        'commit_to_render': elapsed_ms(_as_utc(committed_at), rendered_at),
+        'device_to_render': elapsed_ms(_as_utc(device_time), rendered_at)
+    }
+    for stage, ms in stages.items():
+        aggregator.add(stage, ms)
+
+    rows = aggregator.drain()
+    if rows:
+        save_latency_rows(rows)
+    return {stage: ms for stage, ms in stages.items() if ms is not None}
+
+def save_latency_rows(rows):
+    """Insert drained LatencyAggregator rows into latency_metrics"""
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(LATENCY_METRICS_SCHEMA)
+            cursor.executemany("""
+                INSERT INTO latency_metrics
+                    (window_start, window_seconds, source, stage, samples, mean_ms, p50_ms, p95_ms, max_ms)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Error saving latency metrics: {str(e)}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def reading_latency(device_time, received_at, committed_at, rendered_at=None):
+    """Per-stage milliseconds of a single reading, for an on-screen age readout"""
+    rendered_at = rendered_at or datetime.now(timezone.utc)
+    device_time, received_at, committed_at = _as_utc(device_time), _as_utc(received_at), _as_utc(committed_at)
+    return {
+        'device_to_receive': elapsed_ms(device_time, received_at),
+        'receive_to_commit': elapsed_ms(received_at, committed_at),
+        'commit_to_render': elapsed_ms(committed_at, rendered_at),
+        'device_to_render': elapsed_ms(device_time, rendered_at)
+    }
+
+def get_latency_breakdown(hours=1):
+    """
+    Per-stage latency over the last `hours`, combined across windows and sources.
+
+    Means are sample-weighted; p50/p95 are sample-weighted averages of the window
+    percentiles (an approximation) and max is exact.
+
+    Returns:
+        pd.DataFrame: One row per (stage, source) in pipeline order; empty on error
+    """
+    conn = get_db_connection()
+    if not conn:
+        return pd.DataFrame()
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT stage, source,
+                       SUM(samples) AS samples,
+                       SUM(mean_ms * samples) / SUM(samples) AS mean_ms,
+                       SUM(p50_ms * samples) / SUM(samples) AS p50_ms,
+                       SUM(p95_ms * samples) / SUM(samples) AS p95_ms,
+                       MAX(max_ms) AS max_ms
+                FROM latency_metrics
+                WHERE window_start > NOW() - make_interval(hours => %s)
+                GROUP BY stage, source
+            """, (int(hours),))
+            rows = cursor.fetchall()
+
+        df = pd.DataFrame(rows, columns=['stage', 'source', 'samples', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms'])
+        df['order'] = df['stage'].map({stage: i for i, stage in enumerate(STAGES)})
+        return df.sort_values(['order', 'source']).drop(columns='order').reset_index(drop=True)
+    except Exception as e:
+        print(f"Error loading latency breakdown: {str(e)}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+
+def get_latency_history(hours=1):
+    """Window-by-window p50/p95 per stage and source over the last `hours` (pd.DataFrame; empty on error)"""
+    conn = get_db_connection()
+    if not conn:
+        return pd.DataFrame()
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT window_start, stage, source, samples, p50_ms, p95_ms
+                FROM latency_metrics
+                WHERE window_start > NOW() - make_interval(hours => %s)
+                ORDER BY window_start
+            """, (int(hours),))
+            rows = cursor.fetchall()
+        return pd.DataFrame(rows, columns=['window_start', 'stage', 'source', 'samples', 'p50_ms', 'p95_ms'])
+    except Exception as e:
+        print(f"Error loading latency history: {str(e)}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
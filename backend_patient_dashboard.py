@@ -3,12 +3,13 @@ import pandas as pd
 import plotly.express as px
 import time
 from backend_auth import get_db_connection
+from database.replicas import DB_REPLICA_LIVE_MAX_LAG
 from datetime import datetime
 
 # **Fetch Patient Data**
 def get_patient_trials(patient_id):
     """Get count of completed trials for a patient"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if not conn:
         return 0
         
@@ -31,7 +32,7 @@ def get_patient_trials(patient_id):
 # **Fetch Live Data**
 def get_live_data(patient_id, limit=60):
     """Get live data for a patient with all parameters"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True, max_lag=DB_REPLICA_LIVE_MAX_LAG)
     if not conn:
         return None
     
@@ -8,7 +8,7 @@ from backend_auth import get_db_connection, hash_password
 
 def get_all_patients():
     """Retrieve all patients along with their data count."""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -53,7 +53,7 @@ def update_patient_password(patient_id: str, new_password: str):
 
 def get_patient_data_count(patient_id: str):
     """Get count of data entries for a specific patient"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT COUNT(*) 
@@ -67,7 +67,7 @@ def get_patient_data_count(patient_id: str):
 
 def get_patient_data(patient_id: str = None, filters: dict = None):
     """Get patient data with optional filters"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     
     query = """
@@ -110,7 +110,7 @@ def get_patient_data(patient_id: str = None, filters: dict = None):
 
 def get_data_instance(data_id: str):
     """Get a single data instance with all details"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT pd.*, p.username 
@@ -125,7 +125,7 @@ def get_data_instance(data_id: str):
 
 def get_patient_summary():
     
-     conn = get_db_connection()
+     conn = get_db_connection(read_only=True)
      cursor = conn.cursor()
     
      query = """
@@ -181,6 +181,5 @@ def print_patient_data_columns():
     cursor.close()
     conn.close()
 
-# Call the function to print column names
-print_patient_data_columns()
+# Debug helper: call print_patient_data_columns() by hand; it is not run at import
 #print(get_patient_summary())
\ No newline at end of file
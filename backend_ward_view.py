@@ -0,0 +1,108 @@
+import pandas as pd
+from backend_auth import get_db_connection
+from database.replicas import DB_REPLICA_LIVE_MAX_LAG
+
+# Parameters the ward tiles can show (the device payload keys)
+WARD_PARAMETERS = [
+    "heart_rate", "oxygen_saturation", "blood_pressure_systolic", "blood_pressure_diastolic",
+    "respiratory_rate", "temperature", "glucose_level", "ecg_voltage", "brain_activity"
+]
+
+# One statement per refresh: every monitored patient's latest reading plus its recent
+# window of the selected parameter, gathered per patient with a LATERAL subquery that
+# walks the (patient_id, timestamp) index backwards.
+WARD_QUERY = """
+    SELECT lr.patient_id,
+           p.username,
+           lr.sensor_data,
+           lr.timestamp,
+           lr.device_time,
+           w.series_times,
+           w.series_values
+    FROM latest_reading lr
+    JOIN patients p ON p.patient_id = lr.patient_id
+    LEFT JOIN LATERAL (
+        SELECT array_agg(s.timestamp ORDER BY s.timestamp) AS series_times,
+               array_agg(s.value ORDER BY s.timestamp) AS series_values
+        FROM (
+            SELECT l.timestamp, (l.sensor_data->>%(param)s)::double precision AS value
+            FROM live_patient_data l
+            WHERE l.patient_id = lr.patient_id
+              AND l.timestamp > NOW() - make_interval(secs => %(window_seconds)s)
+            ORDER BY l.timestamp DESC
+            LIMIT %(max_points)s
+        ) s
+    ) w ON TRUE
+    WHERE lr.timestamp > NOW() - make_interval(secs => %(active_seconds)s)
+      AND (%(patient_ids)s::int[] IS NULL OR lr.patient_id = ANY(%(patient_ids)s::int[]))
+    ORDER BY p.username
+"""
+
+def get_ward_snapshot(param, window_seconds=600, max_points=120, active_seconds=3600, patient_ids=None):
+    """
+    Latest reading and recent window of one parameter for every monitored patient, in one query.
+
+    Args:
+        param (str): Sensor parameter for the sparklines
+        window_seconds (int): How far back each sparkline reaches
+        max_points (int): Most points per sparkline (newest kept)
+        active_seconds (int): Patients whose latest reading is older than this are left out
+        patient_ids (list, optional): Restrict to these patients
+
+    Returns:
+        list: One dict per patient {'patient_id', 'username', 'latest' (dict), 'latest_at',
+              'device_time', 'series' (pd.Series indexed by time)}; empty on error
+    """
+    conn = get_db_connection(read_only=True, max_lag=DB_REPLICA_LIVE_MAX_LAG)
+    if not conn:
+        return []
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(WARD_QUERY, {
+                'param': param,
+                'window_seconds': int(window_seconds),
+                'max_points': int(max_points),
+                'active_seconds': int(active_seconds),
+                'patient_ids': [int(p) for p in patient_ids] if patient_ids else None
+            })
+            rows = cursor.fetchall()
+
+        return [
+            {
+                'patient_id': patient_id,
+                'username': username,
+                'latest': sensor_data or {},
+                'latest_at': timestamp,
+                'device_time': device_time,
+                'series': pd.Series(values or [], index=pd.to_datetime(times or []), dtype=float)
+            }
+            for patient_id, username, sensor_data, timestamp, device_time, times, values in rows
+        ]
+    except Exception as e:
+        print(f"Error fetching ward snapshot: {str(e)}")
+        return []
+    finally:
+        conn.close()
+
+def get_monitored_patients(active_seconds=3600):
+    """(patient_id, username) of patients that streamed within active_seconds"""
+    conn = get_db_connection(read_only=True, max_lag=DB_REPLICA_LIVE_MAX_LAG)
+    if not conn:
+        return []
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT lr.patient_id, p.username
+                FROM latest_reading lr
+                JOIN patients p ON p.patient_id = lr.patient_id
+                WHERE lr.timestamp > NOW() - make_interval(secs => %s)
+                ORDER BY p.username
+            """, (int(active_seconds),))
+            return cursor.fetchall()
+    except Exception as e:
+        print(f"Error fetching monitored patients: {str(e)}")
+        return []
+    finally:
+        conn.close()
@@ -0,0 +1,135 @@
+"""
+Throughput benchmark for utils.alert_rules.
+
+Generates a rule set spread over the simulator's vital-sign parameters plus a stream
+of readings from many patients, then reports readings/s and rule evaluations/s for the
+indexed engine next to a naive "evaluate every rule on every reading" loop. "Rules
+evaluated" counts the rules each reading decides (rule applies to the patient and all
+of its parameters are present), whichever way they are decided.
+
+Before timing, the indexed engine's matches are checked against the naive loop on a
+sample of readings, including ones with NaN and infinite values (which count as absent).
+
+Usage:
+    python benchmarks/bench_alert_rules.py [--rules 1000] [--patients 500] [--readings 200000]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.alert_rules import AlertEngine, CompiledRule
+
+PARAMETERS = {
+    "heart_rate": (60, 100),
+    "blood_pressure_systolic": (100, 140),
+    "blood_pressure_diastolic": (60, 90),
+    "temperature": (36.1, 37.8),
+    "oxygen_saturation": (95, 100),
+    "respiratory_rate": (12, 20),
+    "glucose_level": (70, 140),
+    "ecg_voltage": (-0.5, 1.5),
+    "brain_activity": (8, 13)
+}
+
+def make_rules(n_rules, n_patients, seed=0):
+    """Rules with 1-2 clauses near the edges of each range; a third are patient-specific"""
+    rng = random.Random(seed)
+    names = list(PARAMETERS)
+    rules = []
+    for rule_id in range(n_rules):
+        conditions = []
+        for param in rng.sample(names, rng.choice([1, 2])):
+            low, high = PARAMETERS[param]
+            if rng.random() < 0.5:
+                conditions.append({'param': param, 'op': '<', 'value': low + 0.05 * (high - low)})
+            else:
+                conditions.append({'param': param, 'op': '>', 'value': high - 0.05 * (high - low)})
+        patient_id = rng.randrange(n_patients) if rng.random() < 0.33 else None
+        rules.append(CompiledRule(rule_id, f"rule {rule_id}", conditions, rng.choice([0, 10, 30]),
+                                  'warning', patient_id))
+    return rules
+
+def make_readings(n_readings, n_patients, params_per_reading, seed=1):
+    rng = random.Random(seed)
+    names = list(PARAMETERS)
+    readings = []
+    for _ in range(n_readings):
+        keys = names if params_per_reading >= len(names) else rng.sample(names, params_per_reading)
+        readings.append((rng.randrange(n_patients),
+                         {key: rng.uniform(*PARAMETERS[key]) for key in keys}))
+    return readings
+
+def naive_evaluate(rules, patient_id, reading):
+    """Baseline: every rule against every reading, no index and no duration state"""
+    decided = 0
+    for rule in rules:
+        if rule.patient_id is not None and rule.patient_id != patient_id:
+            continue
+        if rule.matches(reading) is not None:
+            decided += 1
+    return decided
+
+def check_consistency(engine, rules, readings, sample=2000, seed=2):
+    """
+    Readings (out of `sample`, some with NaN/inf values) where the indexed engine and
+    the naive loop disagree on which rules match.
+    """
+    rng = random.Random(seed)
+    mismatches = 0
+    for patient_id, reading in readings[:sample]:
+        reading = dict(reading)
+        if rng.random() < 0.3:
+            reading[rng.choice(list(reading))] = rng.choice([math.nan, math.inf, -math.inf])
+        indexed = {rule.rule_id for rule in engine.satisfied(patient_id, reading)}
+        naive = {rule.rule_id for rule in rules
+                 if (rule.patient_id is None or rule.patient_id == patient_id) and rule.matches(reading)}
+        mismatches += indexed != naive
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Alert rule engine throughput benchmark")
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--params-per-reading", type=int, default=2,
+                        help="Parameters present in each reading (9 = full simulator payload)")
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules, args.patients)
+    readings = make_readings(args.readings, args.patients, args.params_per_reading)
+    engine = AlertEngine(rules)
+
+    mismatches = check_consistency(engine, rules, readings)
+    if mismatches:
+        print(f"indexed engine disagrees with the naive loop on {mismatches} readings")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    alerts = 0
+    for i, (patient_id, reading) in enumerate(readings):
+        alerts += len(engine.evaluate(patient_id, reading, now=float(i)))
+    indexed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # Rules a reading actually decides (applies to the patient, all parameters present)
+    decided = 0
+    for patient_id, reading in readings:
+        decided += naive_evaluate(rules, patient_id, reading)
+    naive_seconds = time.perf_counter() - start
+
+    print(f"rules={args.rules} patients={args.patients} readings={args.readings} "
+          f"params/reading={args.params_per_reading}")
+    print(f"{'engine':>8} {'seconds':>9} {'readings/s':>12} {'rules evaluated/s':>18}")
+    print(f"{'indexed':>8} {indexed_seconds:>9.3f} {args.readings / indexed_seconds:>12.0f} "
+          f"{decided / indexed_seconds:>18.0f}")
+    print(f"{'naive':>8} {naive_seconds:>9.3f} {args.readings / naive_seconds:>12.0f} "
+          f"{decided / naive_seconds:>18.0f}")
+    live_states = sum(len(states) for states in engine.active.values())
+    print(f"\nalerts fired: {alerts}, live duration states: {live_states}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cold-start import budget for the app entry points.
+
+Each target is imported in a fresh interpreter and timed. Streamlit scripts (main.py
+and pages/*.py) run UI and database code at top level, so for those only the script's
+top-level import statements are executed; that is the part of a cold start that module
+side effects and heavy dependencies inflate. websocket_server.py is imported whole.
+
+The best of --repeat runs is compared with the budget (IMPORT_BUDGET_SECONDS, or
+--budget); the script exits with status 1 if any target is over, and prints the
+slowest top-level imports of each offender (from python -X importtime).
+
+Usage:
+    python benchmarks/bench_import_time.py [--budget 2.5] [--repeat 3] [targets ...]
+"""
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "2.5"))
+
+# Imported as a module rather than as a list of import statements
+MODULE_TARGETS = {"websocket_server.py": "websocket_server"}
+
+def default_targets():
+    pages = sorted(os.path.relpath(p, ROOT) for p in glob.glob(os.path.join(ROOT, "pages", "*.py")))
+    return ["main.py", "websocket_server.py"] + pages
+
+def import_source(target):
+    """Code that reproduces the target's import-time cost without running its body"""
+    if target in MODULE_TARGETS:
+        return f"import {MODULE_TARGETS[target]}"
+
+    with open(os.path.join(ROOT, target), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=target)
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.unparse(node) for node in imports) or "pass"
+
+def time_imports(source):
+    """(seconds, importtime stderr) for running source in a fresh interpreter"""
+    program = (
+        "import time\n"
+        "_start = time.perf_counter()\n"
+        f"{source}\n"
+        "print(time.perf_counter() - _start)\n"
+    )
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", program], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+def slowest_imports(importtime_log, top=5):
+    """Top-level packages with the largest cumulative import time, in ms"""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented further; keep the ones the script itself pulled in
+        if not name.startswith("  "):
+            rows.append((int(cumulative) / 1000.0, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import time budget")
+    parser.add_argument("targets", nargs="*", help="Scripts relative to the repo root (default: main.py, websocket_server.py, pages/*.py)")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="Seconds allowed per target")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per target; the best run counts")
+    args = parser.parse_args()
+
+    over = []
+    print(f"{'target':<36} {'seconds':>8}  budget={args.budget:.2f}s")
+    for target in args.targets or default_targets():
+        try:
+            runs = [time_imports(import_source(target)) for _ in range(max(1, args.repeat))]
+        except Exception as e:
+            print(f"{target:<36} {'error':>8}  {e}")
+            over.append((target, None, ""))
+            continue
+
+        seconds, log = min(runs, key=lambda run: run[0])
+        flag = "OVER" if seconds > args.budget else ""
+        print(f"{target:<36} {seconds:>8.3f}  {flag}")
+        if flag:
+            over.append((target, seconds, log))
+
+    for target, seconds, log in over:
+        if seconds is None:
+            continue
+        print(f"\n{target}: slowest imports")
+        for ms, name in slowest_imports(log):
+            print(f"    {ms:>9.1f} ms  {name}")
+
+    if over:
+        print(f"\n{len(over)} target(s) failed or went over the {args.budget:.2f}s import budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
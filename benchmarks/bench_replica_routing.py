@@ -0,0 +1,78 @@
+"""
+Read-replica routing check for get_db_connection(read_only=True).
+
+Opens --calls read-only connections with each lag bound (the default one and the
+live-window one), runs a small query on each and reports where the reads landed
+(primary or which replica), the measured replica lag and the mean connect+query time,
+next to the same calls made against the primary only.
+
+Two local instances with streaming replication are enough, e.g.:
+    pg_basebackup -h localhost -p 5432 -U postgres -D /tmp/replica -R -X stream
+    pg_ctl -D /tmp/replica -o "-p 5433" start
+    DB_HOST=localhost DB_REPLICA_DSNS="host=localhost port=5433" \
+        python benchmarks/bench_replica_routing.py
+Stop the replica (or pause replay with pg_wal_replay_pause()) to watch the fallback.
+
+Usage:
+    python benchmarks/bench_replica_routing.py [--calls 50] [--max-lag 5] [--live-max-lag 1]
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend_auth import get_db_connection
+from database.replicas import replica_router, DB_REPLICA_MAX_LAG, DB_REPLICA_LIVE_MAX_LAG
+
+WHERE_QUERY = "SELECT pg_is_in_recovery(), inet_server_addr(), inet_server_port()"
+
+def run(calls, read_only, max_lag=None):
+    """(Counter of servers hit, mean ms per connect+query, failed calls)"""
+    servers, failed, elapsed = Counter(), 0, 0.0
+    for _ in range(calls):
+        start = time.perf_counter()
+        conn = get_db_connection(read_only=read_only, max_lag=max_lag)
+        if conn is None:
+            failed += 1
+            continue
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(WHERE_QUERY)
+                in_recovery, addr, port = cursor.fetchone()
+        finally:
+            conn.close()
+        elapsed += time.perf_counter() - start
+        servers[f"{'replica' if in_recovery else 'primary'} {addr or 'local'}:{port}"] += 1
+    done = calls - failed
+    return servers, (elapsed / done * 1000 if done else float('nan')), failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-replica routing check")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--max-lag", type=float, default=DB_REPLICA_MAX_LAG)
+    parser.add_argument("--live-max-lag", type=float, default=DB_REPLICA_LIVE_MAX_LAG)
+    args = parser.parse_args()
+
+    if not replica_router.replicas:
+        print("DB_REPLICA_DSNS is not set: every read goes to the primary")
+
+    print(f"{'mode':>22} {'ms/call':>9} {'failed':>7}  servers")
+    for label, read_only, max_lag in [
+        ("primary only", False, None),
+        (f"read (lag <= {args.max_lag:g}s)", True, args.max_lag),
+        (f"live (lag <= {args.live_max_lag:g}s)", True, args.live_max_lag),
+    ]:
+        servers, mean_ms, failed = run(args.calls, read_only, max_lag)
+        hits = ", ".join(f"{server} x{count}" for server, count in servers.most_common())
+        print(f"{label:>22} {mean_ms:>9.2f} {failed:>7}  {hits}")
+
+    stats = replica_router.stats()
+    print(f"\nrouted to a replica: {stats['routed']}, fell back to the primary: {stats['fallbacks']}")
+    for replica in stats['replicas']:
+        lag = "unknown" if replica['lag_seconds'] is None else f"{replica['lag_seconds']:.3f}s"
+        print(f"  {replica['replica']}: healthy={replica['healthy']} lag={lag}")
+
+if __name__ == "__main__":
+    main()
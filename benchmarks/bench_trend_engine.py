@@ -0,0 +1,62 @@
+"""
+Speed/accuracy benchmark for utils.trend_engine.
+
+Runs every trend method over synthetic vital-sign series of increasing length
+and reports wall time plus the RMSE against exact LOWESS (where exact LOWESS
+is still affordable).
+
+Usage:
+    python benchmarks/bench_trend_engine.py [--sizes 1000 10000 100000] [--exact-limit 20000]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.trend_engine import compute_trend, trend_fraction
+
+def make_series(n, seed=0):
+    """Slow drift + breathing-like oscillation + noise, roughly like heart_rate"""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, n)
+    return 75 + 8 * np.sin(2 * np.pi * 3 * t) + 4 * t + rng.normal(0, 2, n)
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Trend engine speed/accuracy benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 100000, 1000000])
+    parser.add_argument("--exact-limit", type=int, default=20000,
+                        help="Largest n for which exact LOWESS is run as the reference")
+    parser.add_argument("--window", type=int, default=10)
+    args = parser.parse_args()
+
+    methods = ["lowess", "binned_lowess", "savgol", "ema"]
+    print(f"{'n':>9} {'method':>14} {'seconds':>10} {'rmse_vs_exact':>14}")
+
+    for n in args.sizes:
+        y = make_series(n)
+        x = np.arange(n, dtype=float)
+        reference = None
+
+        for method in methods:
+            if method == "lowess" and n > args.exact_limit:
+                print(f"{n:>9} {method:>14} {'skipped':>10} {'-':>14}")
+                continue
+
+            (trend, _), seconds = time_call(compute_trend, y, x, window=args.window, method=method)
+            if method == "lowess":
+                reference = trend
+
+            rmse = "-" if reference is None else f"{np.sqrt(np.mean((trend - reference) ** 2)):.4f}"
+            print(f"{n:>9} {method:>14} {seconds:>10.4f} {rmse:>14}")
+
+    print(f"\nspan fraction for window={args.window}: {trend_fraction(max(args.sizes), args.window):.3f}")
+
+if __name__ == "__main__":
+    main()
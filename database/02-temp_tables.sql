@@ -1,9 +1,22 @@
 -- Create unlogged table for live streaming data
+-- timestamp is the DB commit time; device_time is the sensor's clock, received_at the ingest server's
 CREATE UNLOGGED TABLE IF NOT EXISTS live_patient_data (
     id SERIAL PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     sensor_data JSONB NOT NULL,
     timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    device_time TIMESTAMP WITH TIME ZONE,
+    received_at TIMESTAMP WITH TIME ZONE,
+    FOREIGN KEY (patient_id) REFERENCES patients(patient_id) ON DELETE CASCADE
+);
+
+-- Newest reading per patient, upserted by the ingest server (ward view reads this)
+CREATE UNLOGGED TABLE IF NOT EXISTS latest_reading (
+    patient_id INTEGER PRIMARY KEY,
+    sensor_data JSONB NOT NULL,
+    timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    device_time TIMESTAMP WITH TIME ZONE,
+    received_at TIMESTAMP WITH TIME ZONE,
     FOREIGN KEY (patient_id) REFERENCES patients(patient_id) ON DELETE CASCADE
 );
 
@@ -41,6 +54,8 @@ CREATE TABLE IF NOT EXISTS patient_data (
 -- Create indices for faster querying
 CREATE INDEX IF NOT EXISTS idx_live_data_patient_id ON live_patient_data(patient_id);
 CREATE INDEX IF NOT EXISTS idx_live_data_timestamp ON live_patient_data(timestamp);
+CREATE INDEX IF NOT EXISTS idx_live_data_patient_time ON live_patient_data(patient_id, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_latest_reading_timestamp ON latest_reading(timestamp);
 CREATE INDEX IF NOT EXISTS idx_trial_temp_trial_id ON trial_temp(trial_id);
 CREATE INDEX IF NOT EXISTS idx_trial_temp_patient_id ON trial_temp(patient_id);
 CREATE INDEX IF NOT EXISTS idx_patient_trials_patient_id ON patient_trials(patient_id);
@@ -0,0 +1,36 @@
+-- Mergeable per-trial moments (n, sums, sums of squares, cross-products per parameter pair)
+-- written when a trial is finalized; pooled correlations are computed from these without raw data
+CREATE TABLE IF NOT EXISTS trial_moments (
+    data_id INTEGER PRIMARY KEY,
+    patient_id INTEGER NOT NULL,
+    moments JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_trial_moments_patient_id ON trial_moments(patient_id);
+
+-- Per-(trial, parameter) t-digest quantile sketches, merged at query time for
+-- percentiles, box plots and histograms over any set of trials or patients
+CREATE TABLE IF NOT EXISTS trial_quantile_sketches (
+    data_id INTEGER NOT NULL,
+    patient_id INTEGER NOT NULL,
+    parameter TEXT NOT NULL,
+    sample_count BIGINT NOT NULL,
+    sketch BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (data_id, parameter)
+);
+
+CREATE INDEX IF NOT EXISTS idx_trial_sketches_patient_param ON trial_quantile_sketches(patient_id, parameter);
+
+-- Memoized analysis outputs (FFT, trend, outlier masks) as compressed npz blobs,
+-- keyed by the analysis options and a fingerprint of the input series
+CREATE TABLE IF NOT EXISTS analytics_results (
+    data_id INTEGER NOT NULL,
+    parameter TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    options_hash TEXT NOT NULL,
+    result BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (data_id, parameter, analysis, options_hash)
+);
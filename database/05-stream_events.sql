@@ -0,0 +1,69 @@
+-- Anomalies flagged by the online detectors in the ingest server (one row per episode
+-- start per detector), so dashboards can show them without rescanning raw readings
+CREATE TABLE IF NOT EXISTS anomaly_events (
+    id BIGSERIAL PRIMARY KEY,
+    patient_id INTEGER NOT NULL,
+    parameter TEXT NOT NULL,
+    detector TEXT NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    expected DOUBLE PRECISION,
+    score DOUBLE PRECISION NOT NULL,
+    event_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_anomaly_events_patient_time ON anomaly_events(patient_id, event_time DESC);
+
+-- Clinical alert rules: all conditions (JSON list of {param, op, value}) must hold for
+-- duration_seconds before the rule fires; patient_id NULL applies the rule to everyone
+CREATE TABLE IF NOT EXISTS alert_rules (
+    rule_id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    conditions JSONB NOT NULL,
+    duration_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    severity TEXT NOT NULL DEFAULT 'warning',
+    patient_id INTEGER,
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Alerts fired by the ingest server's rule engine, written in batches
+CREATE TABLE IF NOT EXISTS alerts (
+    id BIGSERIAL PRIMARY KEY,
+    rule_id INTEGER NOT NULL,
+    patient_id INTEGER NOT NULL,
+    rule_name TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    readings JSONB NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    fired_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_alerts_patient_fired ON alerts(patient_id, fired_at DESC);
+
+INSERT INTO alert_rules (name, conditions, duration_seconds, severity) VALUES
+    ('Low SpO2', '[{"param": "oxygen_saturation", "op": "<", "value": 92}]', 30, 'critical'),
+    ('Tachycardia with hypotension',
+     '[{"param": "heart_rate", "op": ">", "value": 130}, {"param": "blood_pressure_systolic", "op": "<", "value": 90}]',
+     0, 'critical')
+ON CONFLICT (name) DO NOTHING;
+
+-- Sensor-to-screen latency per stage, one row per (source, stage) and aggregation window;
+-- written by the ingest server (device_to_receive, receive_to_commit) and the dashboards
+-- (commit_to_render, device_to_render)
+CREATE TABLE IF NOT EXISTS latency_metrics (
+    id BIGSERIAL PRIMARY KEY,
+    window_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    window_seconds DOUBLE PRECISION NOT NULL,
+    source TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    mean_ms DOUBLE PRECISION NOT NULL,
+    p50_ms DOUBLE PRECISION NOT NULL,
+    p95_ms DOUBLE PRECISION NOT NULL,
+    max_ms DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_latency_metrics_window ON latency_metrics(window_start DESC);
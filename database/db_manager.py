@@ -11,6 +11,9 @@ import logging
 import threading
 import atexit
 import traceback
+from contextlib import contextmanager, asynccontextmanager
+from database.workloads import get_workload, workload_stats, AdmissionError
+from database.replicas import replica_router, replica_params, asyncpg_params
 
 # Configure logging
 logging.basicConfig(
@@ -55,10 +58,51 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 TEMP_TABLE_CLEANUP_INTERVAL = int(os.getenv("TEMP_TABLE_CLEANUP_INTERVAL", "300"))  # 5 minutes by default
 TEMP_DATA_MAX_AGE = int(os.getenv("TEMP_DATA_MAX_AGE", "3600"))  # 1 hours by default
 
-# Connection pool settings
+# Connection pool settings (the ingest class; see database/workloads.py for the others)
 MIN_CONNECTIONS = int(os.getenv("DB_MIN_CONNECTIONS", "1"))
 MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "10"))
 
+# Workload classes used when a caller names none
+DEFAULT_ASYNC_WORKLOAD = 'ingest'
+DEFAULT_SYNC_WORKLOAD = 'interactive'
+
+# Async connections opened (and their statements prepared) before the first request
+ASYNC_POOL_WARM_SIZE = int(os.getenv("DB_POOL_WARM_SIZE", "4"))
+
+# Seconds an idle async connection is kept; 0 keeps warm connections open indefinitely
+ASYNC_POOL_MAX_INACTIVE = float(os.getenv("DB_POOL_MAX_INACTIVE", "0"))
+
+# Tables the ingest path needs; checked with one catalog query
+REQUIRED_TABLES = ['patient_trials', 'live_patient_data', 'trial_temp', 'sensor_data']
+
+# Hot statements prepared on every pooled asyncpg connection as it is opened
+STATEMENTS = {
+    'insert_live': """
+        INSERT INTO live_patient_data (patient_id, sensor_data, device_time, received_at)
+        VALUES ($1, $2::jsonb, $3, $4)
+    """,
+    'upsert_latest': """
+        INSERT INTO latest_reading (patient_id, sensor_data, timestamp, device_time, received_at)
+        VALUES ($1, $2::jsonb, NOW(), $3, $4)
+        ON CONFLICT (patient_id) DO UPDATE
+        SET sensor_data = EXCLUDED.sensor_data, timestamp = EXCLUDED.timestamp,
+            device_time = EXCLUDED.device_time, received_at = EXCLUDED.received_at
+    """,
+    'active_trial': """
+        SELECT trial_id
+        FROM patient_trials
+        WHERE patient_id = $1
+        AND end_time IS NULL
+        ORDER BY start_time DESC
+        LIMIT 1
+    """,
+    'insert_trial_temp': """
+        INSERT INTO trial_temp (trial_id, patient_id, sensor_data)
+        VALUES ($1, $2, $3::jsonb)
+    """,
+    'ping': "SELECT 1"
+}
+
 # Fallback schema if schema.sql file is not found
 FALLBACK_SCHEMA = """
 -- Create patient_trials table if it doesn't exist
@@ -75,7 +119,18 @@ CREATE TABLE IF NOT EXISTS live_patient_data (
     id SERIAL PRIMARY KEY,
     patient_id INTEGER NOT NULL,
     sensor_data JSONB NOT NULL,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    device_time TIMESTAMP WITH TIME ZONE,
+    received_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Create latest_reading table if it doesn't exist (one row per patient, for the ward view)
+CREATE TABLE IF NOT EXISTS latest_reading (
+    patient_id INTEGER PRIMARY KEY,
+    sensor_data JSONB NOT NULL,
+    timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    device_time TIMESTAMP WITH TIME ZONE,
+    received_at TIMESTAMP WITH TIME ZONE
 );
 
 -- Create trial_temp table if it doesn't exist
@@ -97,6 +152,10 @@ CREATE TABLE IF NOT EXISTS sensor_data (
 );
 """
 
+class RegistryConnection(asyncpg.Connection):
+    """asyncpg connection that carries its own prepared statements ({name: PreparedStatement})"""
+    __slots__ = ('prepared',)
+
 # Singleton pattern for database manager
 class DatabaseManager:
     _instance = None
@@ -114,17 +173,32 @@ class DatabaseManager:
             return
             
         self._initialized = True
-        self.sync_pool = None
-        self.async_pool = None
+        # One pool per workload class: {class name: pool}
+        self.sync_pools = {}
+        self.async_pools = {}
+        # Replica pools for read-only calls: {(class name, replica DSN): pool}
+        self.replica_sync_pools = {}
+        self.replica_async_pools = {}
         self.schema_initialized = False
         self.cleanup_thread = None
         self.is_running = False
         self.schema_init_attempts = 0
         self.max_schema_init_attempts = 3
+        self.statements = dict(STATEMENTS)
         
         # Register cleanup on exit
         atexit.register(self.shutdown)
     
+    @property
+    def sync_pool(self):
+        """Sync pool of the default (interactive) class"""
+        return self.sync_pools.get(DEFAULT_SYNC_WORKLOAD)
+
+    @property
+    def async_pool(self):
+        """Async pool of the default (ingest) class"""
+        return self.async_pools.get(DEFAULT_ASYNC_WORKLOAD)
+
     def get_schema_path(self):
         """Get the path to the schema.sql file"""
         # Try different possible locations
@@ -146,88 +220,331 @@ class DatabaseManager:
         logger.error("Schema file not found in any of the expected locations. Using fallback schema.")
         return None
     
-    def init_sync_pool(self):
-        """Initialize the synchronous connection pool for psycopg2"""
-        if self.sync_pool is not None:
-            return self.sync_pool
-            
+    def init_sync_pool(self, workload=None):
+        """
+        Initialize the synchronous psycopg2 pool of a workload class.
+
+        Args:
+            workload (str, optional): Class name (defaults to interactive)
+
+        Returns:
+            psycopg2.pool.ThreadedConnectionPool or None
+        """
+        workload = workload or DEFAULT_SYNC_WORKLOAD
+        if workload in self.sync_pools:
+            return self.sync_pools[workload]
+
+        settings = get_workload(workload)
+        # Shared by Streamlit threads and the cleanup thread, hence the threaded pool. psycopg2
+        # pools raise rather than wait when exhausted, so the admission gate must be the
+        # tighter bound: never fewer pooled connections than gate slots.
+        pool_args = dict(
+            minconn=settings.pool_min,
+            maxconn=max(settings.pool_max, settings.max_concurrent, 1),
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            port=DB_PORT,
+            **settings.libpq_settings()
+        )
         try:
             # First try with quoted database name (for names with spaces)
             try:
-                logger.info(f"Attempting to connect to database with quoted name: \"{DB_NAME}\"")
-                self.sync_pool = psycopg2.pool.SimpleConnectionPool(
-                    minconn=MIN_CONNECTIONS,
-                    maxconn=MAX_CONNECTIONS,
-                    host=DB_HOST,
-                    database=f'"{DB_NAME}"',  # Quote the database name
-                    user=DB_USER,
-                    password=DB_PASSWORD,
-                    port=DB_PORT
-                )
+                logger.info(f"Attempting to connect to database with quoted name: \"{DB_NAME}\" ({workload})")
+                sync_pool = psycopg2.pool.ThreadedConnectionPool(database=f'"{DB_NAME}"', **pool_args)
                 logger.info("Synchronous database pool created with quoted name")
             except psycopg2.Error as e:
                 logger.warning(f"First connection attempt failed: {e}")
                 # Try without quotes
-                logger.info(f"Attempting to connect to database without quotes: {DB_NAME}")
-                self.sync_pool = psycopg2.pool.SimpleConnectionPool(
-                    minconn=MIN_CONNECTIONS,
-                    maxconn=MAX_CONNECTIONS,
-                    host=DB_HOST,
-                    database=DB_NAME,
-                    user=DB_USER,
-                    password=DB_PASSWORD,
-                    port=DB_PORT
-                )
+                logger.info(f"Attempting to connect to database without quotes: {DB_NAME} ({workload})")
+                sync_pool = psycopg2.pool.ThreadedConnectionPool(database=DB_NAME, **pool_args)
                 logger.info("Synchronous database pool created without quotes")
             
             # Test the connection
-            conn = self.sync_pool.getconn()
+            conn = sync_pool.getconn()
             cur = conn.cursor()
             cur.execute("SELECT 1")
             cur.close()
-            self.sync_pool.putconn(conn)
+            sync_pool.putconn(conn)
             
-            return self.sync_pool
+            self.sync_pools[workload] = sync_pool
+            return sync_pool
             
         except psycopg2.Error as e:
             logger.error(f"Failed to create synchronous database pool: {e}")
             return None
+
+    def _primary_params(self):
+        """The primary's connection parameters, the base of every replica's"""
+        return dict(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
+
+    def configure_replicas(self, dsns):
+        """
+        Replace the replica DSN list (DB_REPLICA_DSNS by default). Pools of removed
+        replicas are closed; sync ones here, async ones by close_replica_pools().
+        """
+        replica_router.configure(dsns)
+        for replica_pool in self.replica_sync_pools.values():
+            replica_pool.closeall()
+        self.replica_sync_pools = {}
+
+    def _replica_sync_pool(self, workload, replica):
+        key = (workload, replica.dsn)
+        if key not in self.replica_sync_pools:
+            settings = get_workload(workload)
+            try:
+                self.replica_sync_pools[key] = psycopg2.pool.ThreadedConnectionPool(
+                    minconn=0,
+                    maxconn=max(settings.pool_max, settings.max_concurrent, 1),
+                    **replica_params(replica.dsn, {**self._primary_params(), **settings.libpq_settings()})
+                )
+                logger.info(f"Replica pool created for {workload} on {replica.label}")
+            except psycopg2.Error as e:
+                logger.warning(f"Replica {replica.label} unavailable, using the primary: {e}")
+                replica_router.mark_failed(replica)
+                return None
+        return self.replica_sync_pools[key]
+
+    @contextmanager
+    def sync_connection(self, workload=None, read_only=False, max_lag=None):
+        """
+        Pooled psycopg2 connection of a workload class, taken through its admission gate.
+
+        Use as `with db_manager.sync_connection('analytics') as conn`. Statements cancelled
+        by the class's statement_timeout are counted before the error propagates.
+
+        Args:
+            workload (str, optional): Class name (defaults to interactive)
+            read_only (bool): Serve from a replica within max_lag when one qualifies
+            max_lag (float, optional): Replica lag bound in seconds (defaults to DB_REPLICA_MAX_LAG)
+
+        Raises:
+            AdmissionError: If the class stayed full for its admission timeout
+        """
+        workload = workload or DEFAULT_SYNC_WORKLOAD
+        pool = self.init_sync_pool(workload)
+        if not pool:
+            raise Exception("Database pool not available")
+
+        gate = get_workload(workload)
+        if not gate.admit():
+            raise AdmissionError(f"{workload} workload busy")
+        if read_only and replica_router.replicas:
+            replica = replica_router.choose(self._primary_params(), max_lag)
+            pool = (self._replica_sync_pool(workload, replica) if replica else None) or pool
+        conn = None
+        try:
+            conn = pool.getconn()
+            yield conn
+        except psycopg2.errors.QueryCanceled:
+            gate.record_statement_timeout()
+            raise
+        finally:
+            if conn is not None:
+                pool.putconn(conn)
+            gate.release()
     
-    async def init_async_pool(self):
-        """Initialize the asynchronous connection pool for asyncpg"""
-        if self.async_pool is not None:
-            return self.async_pool
-            
+    def register_statement(self, name, query):
+        """
+        Add a statement to the registry.
+
+        Connections opened afterwards prepare it up front; already-open ones prepare it
+        on first use through statement().
+        """
+        self.statements[name] = query
+
+    async def _prepare_statements(self, conn):
+        """asyncpg init hook: prepare every registered statement on a new pooled connection"""
+        conn.prepared = {}
+        for name, query in self.statements.items():
+            try:
+                conn.prepared[name] = await conn.prepare(query)
+            except (asyncpg.UndefinedTableError, asyncpg.UndefinedColumnError):
+                # Schema not created/migrated yet; statement() prepares it once it exists
+                pass
+            except Exception as e:
+                logger.warning(f"Could not prepare statement '{name}': {e}")
+
+    async def statement(self, conn, name):
+        """
+        Prepared statement `name` on this connection.
+
+        Args:
+            conn: Connection (or pool proxy) acquired from the async pool
+            name (str): Registered statement name
+
+        Returns:
+            asyncpg.prepared_stmt.PreparedStatement
+        """
+        prepared = getattr(conn, 'prepared', None)
+        if prepared is None:
+            # Not opened through this manager's pool; nowhere to keep the statement
+            return await conn.prepare(self.statements[name])
+
+        stmt = prepared.get(name)
+        if stmt is None:
+            stmt = prepared[name] = await conn.prepare(self.statements[name])
+        return stmt
+
+    async def init_async_pool(self, workload=None):
+        """
+        Initialize the asyncpg pool of a workload class.
+
+        Only the ingest pool is pre-warmed and prepares the statement registry on connect.
+
+        Args:
+            workload (str, optional): Class name (defaults to ingest)
+        """
+        workload = workload or DEFAULT_ASYNC_WORKLOAD
+        if workload in self.async_pools:
+            return self.async_pools[workload]
+
+        settings = get_workload(workload)
+        ingest = workload == DEFAULT_ASYNC_WORKLOAD
+        min_size = min(max(settings.pool_min, ASYNC_POOL_WARM_SIZE), settings.pool_max) if ingest else settings.pool_min
         try:
             # Try with direct parameters
-            logger.info(f"Attempting to connect to database: {DB_NAME}")
-            self.async_pool = await asyncpg.create_pool(
+            logger.info(f"Attempting to connect to database: {DB_NAME} ({workload})")
+            async_pool = await asyncpg.create_pool(
                 host=DB_HOST,
                 port=int(DB_PORT),
                 user=DB_USER,
                 password=DB_PASSWORD,
                 database=DB_NAME,
-                min_size=MIN_CONNECTIONS,
-                max_size=MAX_CONNECTIONS,
+                min_size=min_size,
+                max_size=max(settings.pool_max, 1),
+                max_inactive_connection_lifetime=ASYNC_POOL_MAX_INACTIVE,
+                connection_class=RegistryConnection,
+                init=self._prepare_statements if ingest else None,
                 command_timeout=60.0,
                 server_settings={
                     'client_encoding': 'utf8',
-                    'application_name': 'db_manager'
+                    **settings.server_settings()
                 }
             )
             logger.info("Asynchronous database pool created successfully")
             
             # Test the connection
-            async with self.async_pool.acquire() as conn:
+            async with async_pool.acquire() as conn:
                 await conn.fetchval("SELECT 1")
             
-            return self.async_pool
+            self.async_pools[workload] = async_pool
+            return async_pool
             
         except Exception as e:
             logger.error(f"Failed to create asynchronous database pool: {e}")
             logger.error(f"Error type: {type(e).__name__}")
             logger.error(f"Error details: {str(e)}")
             return None
+
+    async def _replica_async_pool(self, workload, replica):
+        key = (workload, replica.dsn)
+        if key not in self.replica_async_pools:
+            settings = get_workload(workload)
+            try:
+                self.replica_async_pools[key] = await asyncpg.create_pool(
+                    **asyncpg_params(replica.dsn, self._primary_params()),
+                    min_size=0,
+                    max_size=max(settings.pool_max, 1),
+                    command_timeout=60.0,
+                    server_settings={'client_encoding': 'utf8', **settings.server_settings()}
+                )
+                logger.info(f"Replica pool created for {workload} on {replica.label}")
+            except Exception as e:
+                logger.warning(f"Replica {replica.label} unavailable, using the primary: {e}")
+                replica_router.mark_failed(replica)
+                return None
+        return self.replica_async_pools[key]
+
+    async def close_replica_pools(self):
+        """Close the async replica pools (call from the application's shutdown hook)"""
+        pools, self.replica_async_pools = self.replica_async_pools, {}
+        for replica_pool in pools.values():
+            await replica_pool.close()
+
+    @asynccontextmanager
+    async def acquire(self, workload=None, read_only=False, max_lag=None):
+        """
+        Async pool connection of a workload class, taken through its admission gate.
+
+        Use as `async with db_manager.acquire('analytics') as conn`.
+
+        Args:
+            workload (str, optional): Class name (defaults to ingest)
+            read_only (bool): Serve from a replica within max_lag when one qualifies
+            max_lag (float, optional): Replica lag bound in seconds (defaults to DB_REPLICA_MAX_LAG)
+
+        Raises:
+            AdmissionError: If the class stayed full for its admission timeout
+        """
+        workload = workload or DEFAULT_ASYNC_WORKLOAD
+        pool = await self.init_async_pool(workload)
+        if not pool:
+            raise Exception("Asynchronous database pool not available")
+
+        gate = get_workload(workload)
+        if not await gate.admit_async():
+            raise AdmissionError(f"{workload} workload busy")
+        if read_only and replica_router.replicas:
+            # Lag checks use a blocking connection; keep them off the event loop
+            replica = await asyncio.to_thread(replica_router.choose, self._primary_params(), max_lag)
+            pool = (await self._replica_async_pool(workload, replica) if replica else None) or pool
+        try:
+            async with pool.acquire() as conn:
+                yield conn
+        except asyncpg.QueryCanceledError:
+            gate.record_statement_timeout()
+            raise
+        finally:
+            gate.release_async()
+
+    def workload_stats(self):
+        """
+        Per-class admission counters plus the size of each pool opened in this process.
+
+        Returns:
+            dict: {class name: {counter: value, 'sync_pool_open': n, 'async_pool_size': n, ...}}
+        """
+        stats = workload_stats()
+        for name, entry in stats.items():
+            sync_pool = self.sync_pools.get(name)
+            if sync_pool is not None:
+                entry['sync_pool_open'] = len(sync_pool._used) + len(sync_pool._pool)
+                entry['sync_pool_in_use'] = len(sync_pool._used)
+            async_pool = self.async_pools.get(name)
+            if async_pool is not None:
+                entry['async_pool_size'] = async_pool.get_size()
+                entry['async_pool_idle'] = async_pool.get_idle_size()
+        return stats
+
+    async def warm_async_pool(self, size=None):
+        """
+        Open `size` connections at once and run a prepared statement on each, so the
+        first requests find connected, prepared connections instead of paying for them.
+
+        Returns:
+            int: Number of connections warmed
+        """
+        pool = await self.init_async_pool()
+        if not pool:
+            return 0
+
+        size = min(size or ASYNC_POOL_WARM_SIZE, get_workload(DEFAULT_ASYNC_WORKLOAD).pool_max)
+
+        async def warm_one():
+            async with pool.acquire() as conn:
+                # Statements skipped at connect time (tables created since) are prepared here
+                for name in self.statements:
+                    try:
+                        await self.statement(conn, name)
+                    except Exception as e:
+                        logger.warning(f"Could not prepare statement '{name}': {e}")
+                await (await self.statement(conn, 'ping')).fetchval()
+
+        results = await asyncio.gather(*(warm_one() for _ in range(size)), return_exceptions=True)
+        warmed = sum(1 for result in results if not isinstance(result, Exception))
+        logger.info(f"Warmed {warmed}/{size} async connections ({len(self.statements)} prepared statements each)")
+        return warmed
     
     def init_db(self):
         """Initialize the database with schema from schema.sql"""
@@ -293,8 +610,7 @@ class DatabaseManager:
             
             logger.info(f"Tables in database: {', '.join(tables)}")
             
-            required_tables = ['patient_trials', 'live_patient_data', 'trial_temp', 'sensor_data']
-            missing_tables = [table for table in required_tables if table not in tables]
+            missing_tables = [table for table in REQUIRED_TABLES if table not in tables]
             
             if missing_tables:
                 logger.error(f"Schema initialization incomplete. Missing tables: {', '.join(missing_tables)}")
@@ -325,23 +641,17 @@ class DatabaseManager:
         
         try:
             async with pool.acquire() as conn:
-                # Check if required tables exist
-                tables_exist = True
-                required_tables = ['patient_trials', 'live_patient_data', 'trial_temp', 'sensor_data']
+                # Check every required table in one catalog round trip
+                missing = await conn.fetchval("""
+                    SELECT COALESCE(array_agg(t), '{}')
+                    FROM unnest($1::text[]) AS t
+                    WHERE to_regclass(t) IS NULL
+                """, REQUIRED_TABLES)
                 
-                for table in required_tables:
-                    exists = await conn.fetchval(f"""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables 
-                            WHERE table_name = '{table}'
-                        )
-                    """)
-                    
-                    if not exists:
-                        tables_exist = False
-                        logger.warning(f"Table '{table}' does not exist")
+                for table in missing:
+                    logger.warning(f"Table '{table}' does not exist")
                 
-                if not tables_exist:
+                if missing:
                     logger.info("Required tables don't exist. Initializing database schema...")
                     # We need to initialize the schema
                     # Since we're in an async context, we'll run the sync init_db in a thread
@@ -374,10 +684,16 @@ class DatabaseManager:
     
     def cleanup_temp_tables(self):
         """Clean up old data from temporary tables"""
-        pool = self.init_sync_pool()
+        # Bulk deletes: the analytics class's longer statement_timeout, never an interactive slot
+        pool = self.init_sync_pool('analytics')
         if not pool:
             logger.error("Cannot clean up temp tables: database pool not available")
             return
+
+        gate = get_workload('analytics')
+        if not gate.admit():
+            logger.warning("Skipping temp table cleanup: analytics workload busy")
+            return
         
         conn = pool.getconn()
         try:
@@ -418,6 +734,7 @@ class DatabaseManager:
         finally:
             # Return the connection to the pool
             pool.putconn(conn)
+            gate.release()
     
     def start_cleanup_thread(self):
         """Start a background thread to periodically clean up temp tables"""
@@ -458,10 +775,12 @@ class DatabaseManager:
         if self.cleanup_thread and self.cleanup_thread.is_alive():
             self.cleanup_thread.join(timeout=5)
         
-        # Close the sync pool
-        if self.sync_pool:
-            self.sync_pool.closeall()
-            logger.info("Closed synchronous connection pool")
+        # Close the sync pools
+        for workload, sync_pool in self.sync_pools.items():
+            sync_pool.closeall()
+            logger.info(f"Closed synchronous connection pool ({workload})")
+        for sync_pool in self.replica_sync_pools.values():
+            sync_pool.closeall()
         
         # Close the async pool (needs to be done in an async context)
         # This will be handled by the application shutdown
@@ -498,6 +817,26 @@ async def get_async_pool():
     
     return pool
 
+async def warm_async_pool(size=None):
+    """Pre-open and prepare async pool connections (see DatabaseManager.warm_async_pool)"""
+    return await db_manager.warm_async_pool(size)
+
+async def get_statement(conn, name):
+    """Registered prepared statement on an async pool connection"""
+    return await db_manager.statement(conn, name)
+
+def register_statement(name, query):
+    """Add a statement to the prepared-statement registry"""
+    db_manager.register_statement(name, query)
+
+def get_workload_stats():
+    """Per-workload-class admission counters and pool sizes of this process"""
+    return db_manager.workload_stats()
+
+def configure_replicas(dsns):
+    """Set the read-replica DSNs used for read-only calls (see DatabaseManager.configure_replicas)"""
+    db_manager.configure_replicas(dsns)
+
 def init_database():
     """Initialize the database (can be called explicitly)"""
     return db_manager.init_db()
@@ -0,0 +1,219 @@
+import os
+import time
+import logging
+import threading
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger('replicas')
+
+# Streaming replicas for read-only calls: comma-separated libpq DSNs or URIs, e.g.
+#   DB_REPLICA_DSNS="host=replica1 port=5432,postgresql://replica2:5433"
+# Parameters a DSN leaves out (database, user, password) come from the primary's.
+DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv("DB_REPLICA_DSNS", "").split(",") if dsn.strip()]
+
+# Largest replay lag (seconds) at which ordinary reads may use a replica
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+
+# Tighter bound for live windows, whose whole point is the last few seconds
+DB_REPLICA_LIVE_MAX_LAG = float(os.getenv("DB_REPLICA_LIVE_MAX_LAG", "1"))
+
+# Seconds a measured lag (or a failed replica) is trusted before it is checked again
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+
+# Connect timeout for replicas (seconds), so a dead one costs little before falling back
+DB_REPLICA_CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", "2"))
+
+# Replay lag: zero when the WAL receiver is streaming and everything received has been
+# replayed (an idle primary sends nothing, so the last replay timestamp alone would make
+# an idle replica look stale); otherwise, while streaming, the age of the last replayed
+# transaction. A receiver that is not streaming has lost its upstream: its receive LSN
+# no longer moves, so "caught up" means nothing and the replica counts as infinitely
+# stale. pg_stat_wal_receiver.status is only visible to superusers and members of
+# pg_read_all_stats, so the checking role needs that grant for replicas to be used.
+# Not in recovery: not a replica (NULL).
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN NULL
+        WHEN COALESCE((SELECT status FROM pg_stat_wal_receiver), '') <> 'streaming' THEN 'Infinity'::float8
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+def replica_params(dsn, base):
+    """
+    Connection parameters for a replica: the primary's `base` keyword arguments with
+    whatever the DSN sets (host, port, ...) taking precedence.
+    """
+    params = dict(base)
+    if 'database' in params:
+        params['dbname'] = params.pop('database')
+    params.update(psycopg2.extensions.parse_dsn(dsn))
+    params.setdefault('connect_timeout', DB_REPLICA_CONNECT_TIMEOUT)
+    return params
+
+class Replica:
+    __slots__ = ('dsn', 'lag', 'checked_at', 'healthy')
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.lag = None
+        self.checked_at = 0.0
+        self.healthy = True
+
+    @property
+    def label(self):
+        """DSN without credentials, for logs and stats"""
+        params = psycopg2.extensions.parse_dsn(self.dsn)
+        return f"{params.get('host', '?')}:{params.get('port', '5432')}"
+
+class ReplicaRouter:
+    """
+    Picks a replica for a read-only call, or None for "use the primary".
+
+    Each replica's lag is measured at most once per DB_REPLICA_CHECK_INTERVAL, or per
+    half the caller's bound when that is tighter (by whichever caller finds it stale),
+    and cached. The age of the cached sample is added to it before comparing with the
+    bound, so a replica cannot exceed the bound between checks. Replicas that fail to
+    connect, stop being replicas or lag beyond the caller's bound are skipped until the
+    next check.
+    Eligible replicas are used round-robin.
+    """
+
+    def __init__(self, dsns=None):
+        self.lock = threading.Lock()
+        self.replicas = [Replica(dsn) for dsn in (DB_REPLICA_DSNS if dsns is None else dsns)]
+        self._next = 0
+        self.routed = 0
+        self.fallbacks = 0
+
+    def configure(self, dsns):
+        with self.lock:
+            self.replicas = [Replica(dsn) for dsn in dsns]
+            self._next = 0
+
+    def _measure(self, replica, base):
+        try:
+            conn = psycopg2.connect(**replica_params(replica.dsn, base))
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(LAG_QUERY)
+                    lag = cursor.fetchone()[0]
+            finally:
+                conn.close()
+        except psycopg2.Error as e:
+            logger.warning(f"Replica {replica.label} unavailable: {e}")
+            return None, False
+        if lag is None:
+            logger.warning(f"Replica {replica.label} is not in recovery; not routing reads to it")
+            return None, False
+        lag = float(lag)
+        if lag == float('inf'):
+            logger.warning(f"Replica {replica.label} is not streaming from the primary; treating it as stale")
+        return lag, True
+
+    def _refresh(self, replica, base, max_lag):
+        now = time.monotonic()
+        # A bound tighter than the check interval needs fresher samples: a lag cached
+        # for 5 s says little about a 1 s bound. Failed replicas keep the full interval.
+        interval = DB_REPLICA_CHECK_INTERVAL if not replica.healthy else min(DB_REPLICA_CHECK_INTERVAL, max_lag / 2)
+        if now - replica.checked_at < interval:
+            return
+        # Claim the check so concurrent callers keep using the cached value meanwhile
+        replica.checked_at = now
+        replica.lag, replica.healthy = self._measure(replica, base)
+
+    def choose(self, base, max_lag=None):
+        """
+        A replica whose lag is within `max_lag` seconds.
+
+        Args:
+            base (dict): The primary's connection keyword arguments (used for lag checks)
+            max_lag (float, optional): Bound in seconds (defaults to DB_REPLICA_MAX_LAG)
+
+        Returns:
+            Replica or None: None when no replica qualifies
+        """
+        if not self.replicas:
+            return None
+        max_lag = DB_REPLICA_MAX_LAG if max_lag is None else max_lag
+        with self.lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+            ordered = self.replicas[start:] + self.replicas[:start]
+
+        for replica in ordered:
+            self._refresh(replica, base, max_lag)
+            # The replica may have fallen behind since the sample: count its age as lag
+            if (replica.healthy and replica.lag is not None
+                    and replica.lag + (time.monotonic() - replica.checked_at) <= max_lag):
+                with self.lock:
+                    self.routed += 1
+                return replica
+        with self.lock:
+            self.fallbacks += 1
+        return None
+
+    def mark_failed(self, replica):
+        """A connection to `replica` failed: skip it until the next check"""
+        replica.healthy = False
+        replica.checked_at = time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'routed': self.routed,
+                'fallbacks': self.fallbacks,
+                'replicas': [{'replica': r.label, 'healthy': r.healthy, 'lag_seconds': r.lag} for r in self.replicas],
+            }
+
+# Process-wide router shared by the page connection provider and DatabaseManager
+replica_router = ReplicaRouter()
+
+def connect_read_only(connect_fn, base, max_lag=None):
+    """
+    Open a connection on a replica within `max_lag`, or return None to use the primary.
+
+    Args:
+        connect_fn: Callable taking connection keyword arguments (psycopg2.connect or a wrapper)
+        base (dict): The primary's connection keyword arguments
+        max_lag (float, optional): Bound in seconds (defaults to DB_REPLICA_MAX_LAG)
+    """
+    replica = replica_router.choose(base, max_lag)
+    if replica is None:
+        return None
+    try:
+        conn = connect_fn(**replica_params(replica.dsn, base))
+    except psycopg2.OperationalError as e:
+        logger.warning(f"Replica {replica.label} connection failed, using the primary: {e}")
+        replica_router.mark_failed(replica)
+        return None
+    if conn is not None:
+        conn.set_session(readonly=True)
+    return conn
+
+def routed(connect_fn, read_only=False, max_lag=None):
+    """
+    Wrap `connect_fn` so read-only calls go to a replica within `max_lag` when one
+    qualifies and to the primary otherwise. Writes (read_only=False) are untouched.
+    """
+    if not read_only or not replica_router.replicas:
+        return connect_fn
+
+    def connect(**kwargs):
+        conn = connect_read_only(connect_fn, kwargs, max_lag)
+        return conn if conn is not None else connect_fn(**kwargs)
+    return connect
+
+def asyncpg_params(dsn, base):
+    """asyncpg.create_pool keyword arguments for a replica (asyncpg takes no key=value DSNs)"""
+    params = replica_params(dsn, base)
+    return {
+        'host': params.get('host'),
+        'port': int(params.get('port', 5432)),
+        'user': params.get('user'),
+        'password': params.get('password'),
+        'database': params.get('dbname'),
+        'timeout': float(params.get('connect_timeout', DB_REPLICA_CONNECT_TIMEOUT)),
+    }
@@ -0,0 +1,233 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import weakref
+import psycopg2.extensions
+
+logger = logging.getLogger('workloads')
+
+# Workload classes sharing the one Postgres server. Each gets its own connections,
+# application_name (visible in pg_stat_activity), statement_timeout and admission gate:
+#   ingest       websocket ingest writes; never gated beyond its own pool
+#   interactive  dashboard pages, polling and short listings
+#   analytics    admin scans and whole-trial analysis; few at a time, yields to interactive
+# Lower priority number wins: a class waits while any higher-priority class has waiters.
+# Settings can be overridden per class, e.g. DB_ANALYTICS_MAX_CONCURRENT=4.
+WORKLOAD_DEFAULTS = {
+    'ingest': {
+        'priority': 0,
+        'pool_min': int(os.getenv("DB_MIN_CONNECTIONS", "1")),
+        'pool_max': int(os.getenv("DB_MAX_CONNECTIONS", "10")),
+        'statement_timeout_ms': 5000,
+        'max_concurrent': 0,
+        'admission_timeout': 0.0,
+    },
+    'interactive': {
+        'priority': 1,
+        'pool_min': 1,
+        'pool_max': 8,
+        'statement_timeout_ms': 30000,
+        'max_concurrent': 32,
+        'admission_timeout': 10.0,
+    },
+    'analytics': {
+        'priority': 2,
+        'pool_min': 0,
+        'pool_max': 2,
+        'statement_timeout_ms': 120000,
+        'max_concurrent': 2,
+        'admission_timeout': 30.0,
+    },
+}
+
+# Poll period of a gated class waiting for higher-priority waiters to clear (seconds)
+ADMISSION_YIELD_INTERVAL = 0.05
+
+class AdmissionError(Exception):
+    """A workload class had no free slot within its admission timeout"""
+
+def _setting(name, key, default):
+    value = os.getenv(f"DB_{name.upper()}_{key.upper()}")
+    return default if value is None else type(default)(value)
+
+class Workload:
+    """
+    Settings, admission gate and counters of one workload class.
+
+    max_concurrent of 0 means ungated (bounded only by the class's pool). The sync gate
+    serves psycopg2 callers (Streamlit threads); the async gate serves asyncpg callers
+    on the event loop. Counters are per process.
+    """
+
+    def __init__(self, name, settings):
+        self.name = name
+        for key, default in settings.items():
+            setattr(self, key, _setting(name, key, default))
+        self.application_name = f"fyp_{name}"
+        self.lock = threading.Lock()
+        self._sync_gate = threading.BoundedSemaphore(self.max_concurrent) if self.max_concurrent else None
+        self._async_gate = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.statement_timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+    def server_settings(self):
+        """asyncpg server_settings for this class"""
+        return {'application_name': self.application_name, 'statement_timeout': str(self.statement_timeout_ms)}
+
+    def libpq_settings(self):
+        """psycopg2.connect keyword arguments for this class"""
+        return {'application_name': self.application_name,
+                'options': f"-c statement_timeout={self.statement_timeout_ms}"}
+
+    def _outranked(self):
+        return any(other.waiting for other in _workloads.values() if other.priority < self.priority)
+
+    def _admitted(self, waited):
+        with self.lock:
+            self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            self.wait_seconds += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def _rejected(self):
+        with self.lock:
+            self.waiting -= 1
+            self.rejected += 1
+        logger.warning(f"{self.name} workload busy: no slot within {self.admission_timeout:.1f} s")
+
+    def admit(self):
+        """
+        Take a slot, blocking up to admission_timeout (sync callers).
+
+        Returns:
+            bool: False if no slot became free in time
+        """
+        start = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+        if self._sync_gate is None:
+            self._admitted(0.0)
+            return True
+
+        deadline = start + self.admission_timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not self._sync_gate.acquire(timeout=remaining):
+                self._rejected()
+                return False
+            if not self._outranked():
+                self._admitted(time.perf_counter() - start)
+                return True
+            # A higher-priority class is queueing: hand the slot back and let it go first
+            self._sync_gate.release()
+            time.sleep(min(ADMISSION_YIELD_INTERVAL, max(0.0, deadline - time.perf_counter())))
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+        if self._sync_gate is not None:
+            self._sync_gate.release()
+
+    async def admit_async(self):
+        """Async counterpart of admit(); same counters, an asyncio.Semaphore as the gate"""
+        start = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+        if not self.max_concurrent:
+            self._admitted(0.0)
+            return True
+        if self._async_gate is None:
+            self._async_gate = asyncio.Semaphore(self.max_concurrent)
+
+        deadline = start + self.admission_timeout
+        while True:
+            try:
+                await asyncio.wait_for(self._async_gate.acquire(), max(0.0, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                self._rejected()
+                return False
+            if not self._outranked():
+                self._admitted(time.perf_counter() - start)
+                return True
+            self._async_gate.release()
+            await asyncio.sleep(ADMISSION_YIELD_INTERVAL)
+
+    def release_async(self):
+        with self.lock:
+            self.active -= 1
+        if self._async_gate is not None:
+            self._async_gate.release()
+
+    def record_statement_timeout(self):
+        with self.lock:
+            self.statement_timeouts += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'priority': self.priority,
+                'statement_timeout_ms': self.statement_timeout_ms,
+                'max_concurrent': self.max_concurrent,
+                'active': self.active,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'statement_timeouts': self.statement_timeouts,
+                'mean_wait_ms': self.wait_seconds / self.admitted * 1000 if self.admitted else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+
+_workloads = {name: Workload(name, settings) for name, settings in WORKLOAD_DEFAULTS.items()}
+
+def get_workload(name):
+    """Workload by class name; unknown names raise KeyError"""
+    return _workloads[name]
+
+def workload_stats():
+    """{class name: counters} for this process"""
+    return {name: workload.stats() for name, workload in _workloads.items()}
+
+class WorkloadConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that hands its admission slot back when closed (or collected)"""
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            release = getattr(self, 'release_slot', None)
+            if release is not None:
+                release()
+
+def open_connection(connect_fn, workload='interactive', **kwargs):
+    """
+    Open a psycopg2 connection for `workload`: wait for admission, then connect with
+    the class's application_name and statement_timeout. The slot is held until the
+    connection is closed.
+
+    Args:
+        connect_fn: psycopg2.connect or a wrapper taking the same keyword arguments
+        workload (str): Workload class name
+        **kwargs: Connection parameters
+
+    Returns:
+        WorkloadConnection or None: None if the class stayed full for its admission timeout
+    """
+    gate = get_workload(workload)
+    if not gate.admit():
+        return None
+    try:
+        conn = connect_fn(connection_factory=WorkloadConnection, **gate.libpq_settings(), **kwargs)
+    except Exception:
+        gate.release()
+        raise
+    # Runs once: on close(), or when a connection that was never closed is collected
+    conn.release_slot = weakref.finalize(conn, gate.release)
+    return conn
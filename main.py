@@ -3,7 +3,8 @@ import streamlit as st
 from backend_auth import get_db_connection
 from dotenv import load_dotenv
 import os
-import base64
+from utils.static_assets import asset_url
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 # Load .env from common locations
 env_files = [
@@ -27,16 +28,18 @@ st.set_page_config(
     page_icon="🏥"
 )
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("main")
+
 # Function to add background image
-def add_bg_from_local(image_file):
-    with open(image_file, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
-    
+def add_bg_from_local(image_name):
+    image_url = asset_url(image_name)
+
     st.markdown(
         f"""
         <style>
         .stApp {{
-            background-image: url("data:image/png;base64,{encoded_string}");
+            background-image: url("{image_url}");
             background-size: cover;
             background-repeat: no-repeat;
             background-attachment: fixed;
@@ -125,7 +128,7 @@ def add_pattern_background(pattern_type="circles"):
 # Uncomment ONE of these lines to use:
 try:
     # Option 1: Use a doggie background image
-    add_bg_from_local("frontend/static/puppy_attack_doctor.png")
+    add_bg_from_local("puppy_attack_doctor.png")
     
     # Option 2: Use a pattern background instead (comment the above line and uncomment below)
     # add_pattern_background("circles")  # options: "circles", "grid", "diagonal"
@@ -223,17 +226,15 @@ st.markdown("""
     </p>
 </div>
 """, unsafe_allow_html=True)
-# Read image and encode
+# Image URL (served statically, or encoded once per process)
 try:
-    with open("frontend/static/puppy_attack_doctor.png", "rb") as f:
-        data = f.read()
-        encoded = base64.b64encode(data).decode()
+    image_url = asset_url("puppy_attack_doctor.png")
 
     # Animated image display
     st.markdown(
         f"""
         <div style="text-align:center; margin-bottom: 30px;">
-            <img src="data:image/png;base64,{encoded}" alt="Puppy Attack!" width="300" 
+            <img src="{image_url}" alt="Puppy Attack!" width="300" 
                  style="border-radius: 10px; box-shadow: 0 4px 8px rgba(0,0,0,0.1); animation: wiggle 2s ease-in-out infinite;">
         </div>
 
@@ -310,3 +311,5 @@ st.markdown("""
      </footer>
 
 """, unsafe_allow_html=True)
+
+render_profile_overlay()
@@ -3,7 +3,7 @@ import asyncio
 import websockets
 import json
 import random
-from datetime import datetime
+from datetime import datetime, timezone
 import sys
 import argparse
 
@@ -50,7 +50,7 @@ class MedicalDevice:
                         data = {
                             "patient_id": self.patient_id,
                             "sensor_data": self.generate_data(),
-                            "timestamp": datetime.now().isoformat(),
+                            "timestamp": datetime.now(timezone.utc).isoformat(),
                             "device_info": {
                                 "wifi_address": self.wifi_address,
                                 "device_type": "ESP32_SIMULATOR"
@@ -7,10 +7,15 @@ import numpy as np
 from backend_patient_info import get_data_instance
 from backend_auth import get_db_connection
 from utils.security import require_admin_auth, is_admin_authenticated
+from utils.figure_cache import figure_key, cached_figure
 from datetime import datetime
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 st.set_page_config(page_title="Multi-Patient Data Comparison", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("Admin_multi_data")
+
 # Check authentication
 if not is_admin_authenticated():
     st.error("⚠️ Access Denied: Admin authentication required")
@@ -24,7 +29,7 @@ def get_all_patients():
     import psycopg2
     from backend_patient_info import get_db_connection
     
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT patient_id, username 
@@ -38,7 +43,10 @@ def get_all_patients():
 
 def get_data_instance(data_id: str):
     """Get a single data instance with all details"""
-    conn = get_db_connection()
+    # Whole-trial load for admin analysis: analytics class
+    conn = get_db_connection(workload='analytics', read_only=True)
+    if not conn:
+        return None
     cursor = conn.cursor()
     cursor.execute("""
         SELECT pd.*, p.username, pc.comment
@@ -57,7 +65,7 @@ def get_data_instance(data_id: str):
 # Function to get patient data IDs
 def get_patient_data_ids(patient_id):
     """Get all data IDs for the patient"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT data_id, created_at 
@@ -483,55 +491,64 @@ viz_type = st.radio(
 if viz_type == "Line Charts":
     # One chart per parameter
     for param in selected_params:
-        fig = go.Figure()
-        
-        for data_id, df in data_frames.items():
-            if param in df.columns:
-                # Determine x-axis values based on user preference
-                if use_normalized_time and 'time_seconds' in df.columns:
-                    x_values = df['time_seconds']
-                    x_title = "Time (seconds from start)"
-                elif 'timestamps' in df.columns:
-                    x_values = df['timestamps']
-                    x_title = "Timestamp"
-                else:
-                    x_values = df.index
-                    x_title = "Data Point"
-                
-                fig.add_trace(go.Scatter(
-                    x=x_values,
-                    y=df[param],
-                    mode='lines+markers',
-                    name=f"Data ID: {data_id}"
-                ))
+        def build_line_chart(param=param):
+            fig = go.Figure()
+            
+            for data_id, df in data_frames.items():
+                if param in df.columns:
+                    # Determine x-axis values based on user preference
+                    if use_normalized_time and 'time_seconds' in df.columns:
+                        x_values = df['time_seconds']
+                        x_title = "Time (seconds from start)"
+                    elif 'timestamps' in df.columns:
+                        x_values = df['timestamps']
+                        x_title = "Timestamp"
+                    else:
+                        x_values = df.index
+                        x_title = "Data Point"
+                    
+                    fig.add_trace(go.Scatter(
+                        x=x_values,
+                        y=df[param],
+                        mode='lines+markers',
+                        name=f"Data ID: {data_id}"
+                    ))
+            
+            fig.update_layout(
+                title=f"{param} Comparison",
+                xaxis_title=x_title,
+                yaxis_title=param,
+                legend_title="Data ID"
+            )
+            return fig
         
-        fig.update_layout(
-            title=f"{param} Comparison",
-            xaxis_title=x_title,
-            yaxis_title=param,
-            legend_title="Data ID"
+        fig = cached_figure(
+            figure_key("multi_data_line_chart", data_frames, [param], extra=use_normalized_time),
+            build_line_chart
         )
         st.plotly_chart(fig, use_container_width=True)
 
 elif viz_type == "Box Plots":
-    # Create a combined dataframe for box plots
-    combined_data = []
-    
-    for param in selected_params:
-        for data_id, df in data_frames.items():
-            if param in df.columns:
-                param_data = df[param].dropna()
-                temp_df = pd.DataFrame({
-                    'Parameter': [param] * len(param_data),
-                    'Value': param_data,
-                    'Data ID': [f"Data ID: {data_id}"] * len(param_data)
-                })
-                combined_data.append(temp_df)
-    
-    if combined_data:
-        combined_df = pd.concat(combined_data, ignore_index=True)
+    def build_box_plot():
+        # Create a combined dataframe for box plots
+        combined_data = []
+        
+        for param in selected_params:
+            for data_id, df in data_frames.items():
+                if param in df.columns:
+                    param_data = df[param].dropna()
+                    temp_df = pd.DataFrame({
+                        'Parameter': [param] * len(param_data),
+                        'Value': param_data,
+                        'Data ID': [f"Data ID: {data_id}"] * len(param_data)
+                    })
+                    combined_data.append(temp_df)
         
-        fig = px.box(
+        if not combined_data:
+            return None
+        
+        combined_df = pd.concat(combined_data, ignore_index=True)
+        return px.box(
             combined_df, 
             x='Parameter', 
             y='Value', 
@@ -539,29 +556,34 @@ elif viz_type == "Box Plots":
             title="Parameter Distribution Comparison",
             points="all"
         )
+    
+    fig = cached_figure(figure_key("multi_data_box_plot", data_frames, selected_params), build_box_plot)
+    if fig:
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No valid data for box plots")
 
 elif viz_type == "Violin Plots":
-    # Create a combined dataframe for violin plots
-    combined_data = []
-    
-    for param in selected_params:
-        for data_id, df in data_frames.items():
-            if param in df.columns:
-                param_data = df[param].dropna()
-                temp_df = pd.DataFrame({
-                    'Parameter': [param] * len(param_data),
-                    'Value': param_data,
-                    'Data ID': [f"Data ID: {data_id}"] * len(param_data)
-                })
-                combined_data.append(temp_df)
-    
-    if combined_data:
-        combined_df = pd.concat(combined_data, ignore_index=True)
+    def build_violin_plot():
+        # Create a combined dataframe for violin plots
+        combined_data = []
+        
+        for param in selected_params:
+            for data_id, df in data_frames.items():
+                if param in df.columns:
+                    param_data = df[param].dropna()
+                    temp_df = pd.DataFrame({
+                        'Parameter': [param] * len(param_data),
+                        'Value': param_data,
+                        'Data ID': [f"Data ID: {data_id}"] * len(param_data)
+                    })
+                    combined_data.append(temp_df)
         
-        fig = px.violin(
+        if not combined_data:
+            return None
+        
+        combined_df = pd.concat(combined_data, ignore_index=True)
+        return px.violin(
             combined_df, 
             x='Parameter', 
             y='Value', 
@@ -569,6 +591,9 @@ elif viz_type == "Violin Plots":
             box=True,
             title="Parameter Distribution Comparison"
         )
+    
+    fig = cached_figure(figure_key("multi_data_violin_plot", data_frames, selected_params), build_violin_plot)
+    if fig:
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("No valid data for violin plots")
@@ -784,3 +809,5 @@ if col3.button("← Back to Dashboard"):
     st.switch_page("pages/_admin_dashboard.py")
 if col4.button ("More analysis tools?"):
     st.switch_page("pages/admin_advanced_anal.py")
+
+render_profile_overlay()
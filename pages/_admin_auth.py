@@ -2,13 +2,17 @@
 import streamlit as st
 from backend_auth import login, register_admin
 from utils.security import set_admin_auth
+from utils.static_assets import inject_css
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 # Page configuration
 st.set_page_config(page_title="Admin Authentication", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("_admin_auth")
+
 # Apply custom CSS
-with open("frontend/static/enhanced_style.css", "r") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+inject_css("enhanced_style.css")
 
 # Add a subtle background pattern
 st.markdown("""
@@ -139,3 +143,5 @@ st.markdown("""
     Medical Monitoring System v1.0 | © 2025 
 </div>
 """, unsafe_allow_html=True)
+
+render_profile_overlay()
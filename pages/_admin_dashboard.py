@@ -4,9 +4,13 @@ from admin_dashboard_backend import get_pending_comments, get_pending_comment_ca
 from utils.security import require_admin_auth, is_admin_authenticated, set_admin_auth
 from utils.admin_ui import load_admin_css, create_metric_card, dashboard_card, format_button, show_toast, optimize_streamlit
 import math
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 st.set_page_config(page_title="Admin Dashboard", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("_admin_dashboard")
+
 # Load custom CSS
 load_admin_css()
 
@@ -46,6 +50,12 @@ with st.sidebar:
     if st.button("💬 Patient Comments", key="nav_patient_comments"): 
              st.switch_page("pages/_admin_patient_comments.py")
 
+    if st.button("🏥 Ward View", key="nav_ward_view"):
+             st.switch_page("pages/admin_ward_view.py")
+
+    if st.button("⏱️ Latency", key="nav_latency"):
+             st.switch_page("pages/admin_latency.py")
+
     # Logout Button with Confirmation
     if st.button("🚪 Logout"):
                 if st.session_state.get("logout_confirmed", False):
@@ -217,3 +227,5 @@ if st.session_state["refresh_clicked"]:
     st.write("Data has been refreshed!")
     # Reset the state after handling
     st.session_state["refresh_clicked"] = False
+
+render_profile_overlay()
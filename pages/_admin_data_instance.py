@@ -7,9 +7,13 @@ from backend_patient_info import get_data_instance
 from utils.security import require_admin_auth, is_admin_authenticated
 from utils.admin_ui import load_admin_css, dashboard_card, create_metric_card, format_button, optimize_streamlit
 from datetime import datetime
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 st.set_page_config(page_title="Data Instance View", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("_admin_data_instance")
+
 # Load custom CSS
 load_admin_css()
 
@@ -323,3 +327,5 @@ with col2:
 with col3:
     if st.button ("← Back to Dashboard", key="back_dashboard", type="secondary"):
         st.switch_page("pages/_admin_dashboard.py")
+
+render_profile_overlay()
@@ -6,9 +6,13 @@ from datetime import datetime
 from utils.security import require_admin_auth, is_admin_authenticated
 from admin_dashboard_backend import get_pending_comments, add_comment, get_pending_comment_cases
 from backend_auth import get_db_connection
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 st.set_page_config(page_title="Patient Comments Editor", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("_admin_patient_comments")
+
 # Check authentication
 if not is_admin_authenticated():
     st.error("⚠️ Access Denied: Admin authentication required")
@@ -20,7 +24,8 @@ if not is_admin_authenticated():
 # Function to get patient data with comments
 def get_patient_data_with_comments():
     """Get all patient data with their comments"""
-    conn = get_db_connection()
+    # Full scan of patient_data: analytics class, so it can't crowd out interactive reads
+    conn = get_db_connection(workload='analytics', read_only=True)
     if not conn:
         st.error("Database connection error!")
         return []
@@ -49,7 +54,7 @@ def get_patient_data_with_comments():
 # Function to get data for a specific patient
 def get_patient_data_by_id(patient_id):
     """Get data for a specific patient with comments"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if not conn:
         st.error("Database connection error!")
         return []
@@ -144,7 +149,7 @@ def delete_comment(data_id):
 # Function to get all patients
 def get_all_patients():
     """Get all patients"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if not conn:
         st.error("Database connection error!")
         return []
@@ -349,4 +354,6 @@ if col1.button("← Back to Patient Data"):
 if col2.button("← Back to Patient List"):
     st.switch_page("pages/_admin_patient_info.py")
 if col3.button("← Back to Dashboard"):
-    st.switch_page("pages/_admin_dashboard.py")
\ No newline at end of file
+    st.switch_page("pages/_admin_dashboard.py")
+
+render_profile_overlay()
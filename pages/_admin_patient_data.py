@@ -1,9 +1,13 @@
 import streamlit as st
 from backend_patient_info import get_patient_data
 from utils.security import require_admin_auth, is_admin_authenticated
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 st.set_page_config(page_title="Patient Data", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("_admin_patient_data")
+
 # Check authentication
 if not is_admin_authenticated():
     st.error("⚠️ Access Denied: Admin authentication required")
@@ -51,4 +55,6 @@ col1, col2 = st.columns(2)
 if col1.button("← Back to Patient List"):
     st.switch_page("pages/_admin_patient_info.py")
 if col2.button("🔄 Refresh Data"):
-    st.rerun()
\ No newline at end of file
+    st.rerun()
+
+render_profile_overlay()
@@ -2,6 +2,7 @@ import streamlit as st
 from backend_patient_info import get_all_patients, update_patient_password, get_patient_data_count
 from utils.security import require_admin_auth, is_admin_authenticated
 import pandas as pd
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 # ✅ FUTURE WORK: Uncomment for encryption
 # from cryptography.fernet import Fernet
@@ -10,6 +11,9 @@ import pandas as pd
 
 st.set_page_config(page_title="Patient Information", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("_admin_patient_info")
+
 # Check authentication
 if not is_admin_authenticated():
     st.error("⚠️ Access Denied: Admin authentication required")
@@ -319,4 +323,6 @@ if st.sidebar.button("🔄 Refresh Data", key="refresh_sidebar"):
 # ✅ Back to Admin Dashboard Button in Sidebar (Unique Key)
 if st.sidebar.button("👩🏻‍💻 Back To Admin Dashboard", key="back_sidebar"):
     st.switch_page("pages/_admin_dashboard.py")
-    st.stop()
\ No newline at end of file
+    st.stop()
+
+render_profile_overlay()
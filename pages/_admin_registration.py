@@ -3,9 +3,13 @@ import streamlit as st
 from backend_auth import login, register_admin
 from utils.security import require_admin_auth, is_admin_authenticated, set_admin_auth
 from utils.admin_ui import load_admin_css, format_button, show_toast, optimize_streamlit
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 st.set_page_config(page_title="Admin Registration", layout="centered")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("_admin_registration")
+
 # Load custom CSS
 load_admin_css()
 
@@ -192,3 +196,5 @@ else:
                     st.switch_page("main.py")
         
         st.markdown('</div>', unsafe_allow_html=True)
+
+render_profile_overlay()
@@ -4,7 +4,6 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import json
 from datetime import datetime, timedelta
 import time
@@ -12,12 +11,26 @@ from utils.multi_data_backend import (
     get_patient_data_ids, get_all_patients, load_data,
     normalize_timestamps, align_multiple_datasets, merge_time_series,
     create_fft_analysis, create_trend_analysis, detect_outliers, calculate_cross_correlation,
+    hrv_archive_tasks, hrv_summary_frame,
+    DEFAULT_TREND_WINDOW, DEFAULT_OUTLIER_THRESHOLD,
+    BACKGROUND_VIZ_TYPES, analysis_tasks, create_visualization_cached, visualization_cache_key,
     reset_selections, load_selected_data, get_numeric_columns, get_datetime_columns, create_visualization,
 )
+from utils.trend_engine import TREND_METHODS
+from utils.job_runner import submit_job, get_job, cancel_job
+from utils.figure_cache import get_figure, put_figure, cache_stats
+from streamlit_autorefresh import st_autorefresh
+from utils.time_alignment import ALIGNMENT_METHODS
+from utils.dtw import DTW_MODES
+from utils.trial_moments import load_patient_moments, load_cohort_moments, fill_missing_moments
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 # Set page configuration
 st.set_page_config(page_title="Multi-Data Analysis", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("admin_advanced_anal")
+
 # Initialize session state variables if they don't exist
 if 'selected_data_ids' not in st.session_state:
     st.session_state.selected_data_ids = []
@@ -76,6 +89,15 @@ with st.sidebar:
 
     if st.button ("Return to Dashboard"):
         st.switch_page("pages/_admin_dashboard.py")
+    
+    # Figure cache is shared by every session on this server
+    figure_stats = cache_stats()
+    st.caption(
+        f"Figure cache: {figure_stats['entries']} figures, "
+        f"{figure_stats['hit_rate']:.0%} hit rate "
+        f"({figure_stats['hits']} hits / {figure_stats['misses']} misses, "
+        f"{figure_stats['evictions']} evicted)"
+    )
 
 # Main content area
 if st.session_state.selected_data_ids and st.session_state.loaded_data:
@@ -117,7 +139,8 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
         # Select visualization type
         viz_type = st.selectbox(
             "Select Visualization Type",
-            options=["Line Chart", "Scatter Plot", "Box Plot", "Histogram", "Correlation Heatmap"]
+            options=["Line Chart", "Scatter Plot", "Box Plot", "Histogram", "Correlation Heatmap",
+                     "Pooled Correlation Heatmap", "Pooled Distribution"]
         )
         
         # Parameter selection for each dataset
@@ -157,10 +180,46 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
                     options=["RdBu_r", "Viridis", "Plasma", "Inferno", "Magma"],
                     index=0
                 )
+            
+            elif viz_type == "Pooled Correlation Heatmap":
+                pooled_scope = st.selectbox(
+                    "Pool Over",
+                    options=["Selected trials", "All trials for this patient", "All patients"],
+                    index=0,
+                    help="Pooled from per-trial summaries stored when each trial ended"
+                )
+                options['colorscale'] = st.selectbox(
+                    "Color Scale",
+                    options=["RdBu_r", "Viridis", "Plasma", "Inferno", "Magma"],
+                    index=0
+                )
+                
+                if pooled_scope == "All trials for this patient":
+                    options['moments'] = fill_missing_moments(
+                        load_patient_moments(selected_patient), st.session_state.loaded_data
+                    )
+                elif pooled_scope == "All patients":
+                    options['moments'] = fill_missing_moments(
+                        load_cohort_moments(), st.session_state.loaded_data
+                    )
+            
+            elif viz_type == "Pooled Distribution":
+                distribution_scope = st.selectbox(
+                    "Pool Over",
+                    options=["Selected trials", "All trials for this patient", "All patients"],
+                    index=0,
+                    help="Merged from per-trial quantile sketches stored when each trial ended"
+                )
+                options['bins'] = st.slider("Number of Bins", min_value=5, max_value=100, value=30)
+                
+                if distribution_scope == "All trials for this patient":
+                    options['sketch_scope'] = {'patient_ids': [selected_patient]}
+                elif distribution_scope == "All patients":
+                    options['sketch_scope'] = {'data_ids': None}
         
         # Create and display visualization
         if params:
-            fig = create_visualization(viz_type, st.session_state.loaded_data, params, options=options)
+            fig = create_visualization_cached(viz_type, st.session_state.loaded_data, params, options=options)
             if fig:
                 st.plotly_chart(fig, use_container_width=True)
             else:
@@ -176,8 +235,8 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
         adv_viz_type = st.selectbox(
             "Select Advanced Visualization Type",
             options=[
-                "FFT Analysis", "Trend Analysis", "Outlier Detection", 
-                "Cross-Correlation", "3D Scatter Plot"
+                "FFT Analysis", "Spectrogram", "HRV Analysis", "Trend Analysis", "Outlier Detection", 
+                "Cross-Correlation", "Cross-Correlation Matrix", "3D Scatter Plot"
             ]
         )
         
@@ -209,9 +268,37 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
                     "Smoothing Window Size", 
                     min_value=3, 
                     max_value=50, 
-                    value=10,
+                    value=DEFAULT_TREND_WINDOW,
                     help="Larger values create smoother trends"
                 )
+                adv_options['trend_method'] = st.selectbox(
+                    "Smoothing Method",
+                    options=TREND_METHODS,
+                    index=0,
+                    help="Auto uses exact LOWESS for short series and binned LOWESS for long ones"
+                )
+            
+            elif adv_viz_type == "Spectrogram":
+                adv_options['window_seconds'] = st.slider(
+                    "Window Length (seconds)",
+                    min_value=0.5,
+                    max_value=60.0,
+                    value=2.0,
+                    step=0.5,
+                    help="Longer windows resolve frequency better, shorter ones resolve time better"
+                )
+                adv_options['overlap'] = st.slider(
+                    "Window Overlap",
+                    min_value=0.0,
+                    max_value=0.9,
+                    value=0.5,
+                    step=0.1
+                )
+                adv_options['colorscale'] = st.selectbox(
+                    "Color Scale",
+                    options=["Viridis", "Plasma", "Inferno", "Magma", "RdBu_r"],
+                    index=0
+                )
             
             elif adv_viz_type == "Outlier Detection":
                 adv_options['outlier_method'] = st.selectbox(
@@ -224,12 +311,12 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
                     "Outlier Threshold", 
                     min_value=1.0, 
                     max_value=5.0, 
-                    value=3.0,
+                    value=DEFAULT_OUTLIER_THRESHOLD,
                     step=0.1,
                     help="Lower values detect more outliers"
                 )
             
-            elif adv_viz_type == "Cross-Correlation":
+            elif adv_viz_type in ("Cross-Correlation", "Cross-Correlation Matrix"):
                 adv_options['max_lag'] = st.slider(
                     "Maximum Lag", 
                     min_value=5, 
@@ -239,14 +326,70 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
                 )
         
         # Create and display advanced visualization
-        if adv_params:
-            fig = create_visualization(adv_viz_type, st.session_state.loaded_data, adv_params, options=adv_options)
+        adv_cache_key = visualization_cache_key(adv_viz_type, st.session_state.loaded_data, adv_params,
+                                                options=adv_options)
+        cached_adv_fig = get_figure(adv_cache_key) if adv_params else None
+        if cached_adv_fig is not None:
+            st.plotly_chart(cached_adv_fig, use_container_width=True)
+        elif adv_params and adv_viz_type in BACKGROUND_VIZ_TYPES:
+            # Heavy analyses run on the worker pool; identical in-flight requests share one job
+            tasks, job_id = analysis_tasks(adv_viz_type, st.session_state.loaded_data, adv_params, adv_options)
+            cancelled_jobs = st.session_state.setdefault('cancelled_jobs', set())
+            
+            if job_id in cancelled_jobs:
+                st.info("Analysis cancelled")
+                if st.button("Run Analysis Again"):
+                    cancelled_jobs.discard(job_id)
+                    st.rerun()
+            else:
+                job = get_job(submit_job(adv_viz_type, tasks, job_id))
+
+                if job.status == 'running':
+                    st.progress(job.progress, text=f"Running {adv_viz_type} ({int(job.progress * 100)}%)")
+                    if st.button("Cancel Analysis"):
+                        cancel_job(job_id)
+                        cancelled_jobs.add(job_id)
+                        st.rerun()
+                    st_autorefresh(interval=1000, key=f"analysis_job_{job_id}")
+                else:
+                    if job.status == 'done':
+                        adv_options['precomputed'] = job.results()
+                    else:
+                        st.warning(f"Background analysis failed ({job.error}); computing here instead")
+
+                    fig = create_visualization(adv_viz_type, st.session_state.loaded_data, adv_params, options=adv_options)
+                    put_figure(adv_cache_key, fig)
+                    if fig:
+                        st.plotly_chart(fig, use_container_width=True)
+                    else:
+                        st.warning("Could not create visualization with selected parameters")
+        elif adv_params:
+            fig = create_visualization_cached(adv_viz_type, st.session_state.loaded_data, adv_params, options=adv_options)
             if fig:
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.warning("Could not create visualization with selected parameters")
         else:
             st.warning("Please select at least one parameter")
+        
+        if adv_viz_type == "HRV Analysis" and selected_patient:
+            with st.expander("HRV Across All Trials of This Patient"):
+                ecg_param = st.text_input("ECG Column", value=next(iter(adv_params.values()), "ecg_voltage"))
+                if st.button("Run HRV Over Patient Archive"):
+                    archive_ids = [str(d[0]) for d in get_patient_data_ids(selected_patient)]
+                    tasks, job_id = hrv_archive_tasks(archive_ids, ecg_param)
+                    st.session_state['hrv_archive_job'] = submit_job("HRV archive", tasks, job_id)
+                
+                archive_job = get_job(st.session_state.get('hrv_archive_job'))
+                if archive_job is not None:
+                    if archive_job.status == 'running':
+                        st.progress(archive_job.progress, text=f"Analysing trials ({int(archive_job.progress * 100)}%)")
+                        st_autorefresh(interval=1000, key=f"hrv_archive_{archive_job.job_id}")
+                    elif archive_job.status == 'failed':
+                        st.error(f"HRV archive run failed: {archive_job.error}")
+                    else:
+                        summary = hrv_summary_frame({key[1]: result for key, result in archive_job.results().items()})
+                        st.dataframe(summary.round(2), use_container_width=True)
     
     # Tab 4: Time Series Analysis
     with tabs[3]:
@@ -327,7 +470,7 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
         
         ts_viz_type = st.selectbox(
             "Select Time Series Analysis Type",
-            options=["Normalized Time Series", "Merged Time Series"]
+            options=["Normalized Time Series", "Merged Time Series", "DTW Alignment"]
         )
         
         with st.expander("Time Series Options"):
@@ -357,9 +500,9 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
             elif ts_viz_type == "Merged Time Series":
                 ts_options['resample_method'] = st.selectbox(
                     "Resampling Method",
-                    options=["interpolate", "ffill", "nearest"],
+                    options=ALIGNMENT_METHODS,
                     index=0,
-                    help="Method to fill gaps in merged time series"
+                    help="Method to fill gaps in merged time series (mean averages readings per interval)"
                 )
                 
                 ts_options['resample_freq'] = st.selectbox(
@@ -369,6 +512,28 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
                     help="Time frequency for resampling"
                 )
         
+            elif ts_viz_type == "DTW Alignment":
+                ts_options['reference_id'] = st.selectbox(
+                    "Reference Trial",
+                    options=list(value_columns.keys()) or ["None"],
+                    help="Other trials are warped onto this trial's time axis"
+                )
+                ts_options['band'] = st.slider(
+                    "Sakoe-Chiba Band",
+                    min_value=0.01,
+                    max_value=0.5,
+                    value=0.1,
+                    step=0.01,
+                    help="Largest allowed time shift, as a fraction of the trial length"
+                )
+                ts_options['dtw_mode'] = st.selectbox(
+                    "Alignment Mode",
+                    options=DTW_MODES,
+                    index=0,
+                    help="Multiscale aligns a downsampled copy first and refines near its path; auto uses it for long trials"
+                )
+                ts_options['normalize'] = st.checkbox("Z-normalize before aligning", value=True)
+        
         # Create and display time series visualization
         if timestamp_columns and value_columns:
             # Normalize timestamps if needed
@@ -411,6 +576,21 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
                 else:
                     st.warning("Could not create time series visualization")
             
+            elif ts_viz_type == "DTW Alignment":
+                with st.spinner("Aligning trials..."):
+                    fig = create_visualization_cached(
+                        ts_viz_type,
+                        st.session_state.loaded_data,
+                        value_columns,
+                        timestamp_cols=timestamp_columns,
+                        options=ts_options
+                    )
+                
+                if fig:
+                    st.plotly_chart(fig, use_container_width=True)
+                else:
+                    st.warning("Could not align the selected trials")
+            
             elif ts_viz_type == "Merged Time Series":
                 # Merge time series
                 merged_df = merge_time_series(
@@ -448,3 +628,5 @@ if st.session_state.selected_data_ids and st.session_state.loaded_data:
             st.warning("Please select timestamp and value columns for time series analysis")
 else:
     st.info("Please select and load data from the sidebar to begin analysis")
+
+render_profile_overlay()
@@ -0,0 +1,91 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from utils.security import is_admin_authenticated
+from utils.latency_trace import STAGES, LATENCY_WINDOW_SECONDS
+from backend_latency import get_latency_breakdown, get_latency_history
+from database.workloads import workload_stats
+from database.replicas import replica_router
+from utils.query_profiler import start_page_profile, render_profile_overlay
+
+st.set_page_config(page_title="Latency", layout="wide")
+
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("admin_latency")
+
+# Check authentication
+if not is_admin_authenticated():
+    st.error("⚠️ Access Denied: Admin authentication required")
+    st.warning("Please log in to access data.")
+    if st.button("Go to Login"):
+        st.switch_page("pages/_admin_auth.py")
+    st.stop()
+
+st.title("⏱️ Sensor-to-Screen Latency")
+st.caption(
+    "Each reading carries its device time, the ingest server's receive time and its DB commit time; "
+    "dashboards add the time it first reached the screen. Stages are summarized every "
+    f"{LATENCY_WINDOW_SECONDS:.0f} s per process into the latency_metrics table. "
+    "device→receive includes any clock difference between device and server."
+)
+
+with st.sidebar:
+    st.header("Latency Settings")
+    hours = st.slider("Look-back (hours)", min_value=1, max_value=48, value=1)
+    if st.button("⬅️ Back to Dashboard"):
+        st.switch_page("pages/_admin_dashboard.py")
+
+# Admission counters of this Streamlit process (the ingest server exports its own at /metrics)
+with st.expander("Database workload classes (this dashboard process)"):
+    workloads = pd.DataFrame.from_dict(workload_stats(), orient='index')
+    st.dataframe(workloads.style.format({'mean_wait_ms': "{:.1f}", 'max_wait_ms': "{:.1f}"}), use_container_width=True)
+    replicas = replica_router.stats()
+    if replicas['replicas']:
+        st.caption(f"Read-only calls routed to a replica: {replicas['routed']}, "
+                   f"fell back to the primary: {replicas['fallbacks']}")
+        st.dataframe(pd.DataFrame(replicas['replicas']), hide_index=True, use_container_width=True)
+
+breakdown = get_latency_breakdown(hours)
+if breakdown.empty:
+    st.info("No latency data yet. It appears once the ingest server and dashboards have run for a full window.")
+    st.stop()
+
+# Stage summary, in pipeline order
+st.subheader("Breakdown by Stage")
+st.dataframe(
+    breakdown.style.format({'mean_ms': "{:.1f}", 'p50_ms': "{:.1f}", 'p95_ms': "{:.1f}", 'max_ms': "{:.1f}"}),
+    use_container_width=True, hide_index=True
+)
+
+# Where the time goes: per-hop stages only (device_to_render is their total)
+hops = breakdown[breakdown['stage'] != 'device_to_render']
+fig = go.Figure()
+for column, label in [('p50_ms', 'p50'), ('p95_ms', 'p95')]:
+    fig.add_trace(go.Bar(
+        x=hops['stage'] + " (" + hops['source'] + ")",
+        y=hops[column],
+        name=label,
+        hovertemplate="%{x}<br>%{y:.1f} ms<extra>" + label + "</extra>"
+    ))
+fig.update_layout(barmode='group', height=350, yaxis_title="ms", margin=dict(l=0, r=0, t=30, b=0))
+st.plotly_chart(fig, use_container_width=True)
+
+total = breakdown[breakdown['stage'] == 'device_to_render']
+if not total.empty:
+    cols = st.columns(len(total))
+    for col, (_, row) in zip(cols, total.iterrows()):
+        col.metric(f"Device → screen ({row['source']}), p50", f"{row['p50_ms'] / 1000:.2f} s",
+                   help=f"p95 {row['p95_ms'] / 1000:.2f} s, max {row['max_ms'] / 1000:.2f} s")
+
+# Trend per window
+st.subheader("p95 Over Time")
+history = get_latency_history(hours)
+if not history.empty:
+    history['series'] = history['stage'] + " (" + history['source'] + ")"
+    fig = px.line(history, x='window_start', y='p95_ms', color='series',
+                  category_orders={'stage': STAGES}, labels={'window_start': '', 'p95_ms': 'p95 (ms)'})
+    fig.update_layout(height=350, margin=dict(l=0, r=0, t=10, b=0))
+    st.plotly_chart(fig, use_container_width=True)
+
+render_profile_overlay()
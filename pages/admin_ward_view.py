@@ -0,0 +1,99 @@
+import streamlit as st
+import plotly.graph_objects as go
+from datetime import datetime, timezone
+from utils.security import is_admin_authenticated
+from backend_ward_view import WARD_PARAMETERS, get_ward_snapshot, get_monitored_patients
+from backend_latency import record_render
+from utils.query_profiler import start_page_profile, render_profile_overlay
+
+st.set_page_config(page_title="Ward View", layout="wide")
+
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("admin_ward_view")
+
+# Check authentication
+if not is_admin_authenticated():
+    st.error("⚠️ Access Denied: Admin authentication required")
+    st.warning("Please log in to access data.")
+    if st.button("Go to Login"):
+        st.switch_page("pages/_admin_auth.py")
+    st.stop()
+
+st.title("🏥 Ward View")
+
+with st.sidebar:
+    st.header("Ward Settings")
+    param = st.selectbox("Parameter", options=WARD_PARAMETERS, index=0)
+    window_minutes = st.slider("Sparkline Window (minutes)", min_value=1, max_value=60, value=10)
+    columns = st.slider("Tiles per Row", min_value=2, max_value=8, value=4)
+    refresh_seconds = st.slider("Refresh Interval (seconds)", min_value=1, max_value=30, value=5)
+
+    monitored = get_monitored_patients()
+    patient_names = {patient_id: username for patient_id, username in monitored}
+    selected_patients = st.multiselect(
+        "Patients",
+        options=list(patient_names.keys()),
+        format_func=lambda patient_id: patient_names[patient_id],
+        help="Leave empty to show every patient that streamed in the last hour"
+    )
+
+    if st.button("⬅️ Back to Dashboard"):
+        st.switch_page("pages/_admin_dashboard.py")
+
+def sparkline(series):
+    """Compact axis-less line for a tile"""
+    fig = go.Figure(go.Scatter(
+        x=series.index,
+        y=series.values,
+        mode='lines',
+        line=dict(width=1.5),
+        hovertemplate="%{x|%H:%M:%S}: %{y:.1f}<extra></extra>"
+    ))
+    fig.update_layout(
+        height=70,
+        margin=dict(l=0, r=0, t=0, b=0),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        showlegend=False
+    )
+    return fig
+
+@st.fragment(run_every=refresh_seconds)
+def ward_grid():
+    """All tiles from a single snapshot query; only this fragment reruns on each refresh"""
+    snapshot = get_ward_snapshot(param, window_seconds=window_minutes * 60, patient_ids=selected_patients or None)
+    if not snapshot:
+        st.info("No patients are streaming right now.")
+        return
+
+    now = datetime.now(timezone.utc)
+    st.caption(f"{len(snapshot)} patients · updated {now.strftime('%H:%M:%S')} UTC")
+    
+    # Sensor-to-screen latency of each patient's newest reading, counted once per session
+    rendered = st.session_state.setdefault('ward_rendered_readings', {})
+
+    for start in range(0, len(snapshot), columns):
+        for column, tile in zip(st.columns(columns), snapshot[start:start + columns]):
+            with column.container(border=True):
+                latest = tile['latest'].get(param)
+                previous = tile['series'].iloc[-2] if len(tile['series']) > 1 else None
+                age = (now - tile['latest_at']).total_seconds() if tile['latest_at'] else None
+
+                st.metric(
+                    label=f"{tile['username']} (ID {tile['patient_id']})",
+                    value="—" if latest is None else f"{latest:.1f}",
+                    delta=None if latest is None or previous is None else f"{latest - previous:+.1f}"
+                )
+                if len(tile['series']) > 1:
+                    st.plotly_chart(sparkline(tile['series']), use_container_width=True,
+                                    config={'displayModeBar': False}, key=f"spark_{tile['patient_id']}")
+                if age is not None:
+                    st.caption(f"last reading {age:.0f}s ago")
+                
+                if tile['latest_at'] is not None and rendered.get(tile['patient_id']) != tile['latest_at']:
+                    rendered[tile['patient_id']] = tile['latest_at']
+                    record_render('ward_view', tile['latest_at'], tile['device_time'])
+
+ward_grid()
+
+render_profile_overlay()
@@ -6,6 +6,7 @@ import os
 from dotenv import load_dotenv
 import socketio
 from auth.security import require_jwt
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +16,9 @@ sio = socketio.Client()
 
 st.set_page_config(page_title="Device Management", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("device_management")
+
 @require_jwt
 def init_page():
     st.title("Device Management")
@@ -104,3 +108,5 @@ def init_page():
 
 if __name__ == "__main__":
     init_page()
+
+render_profile_overlay()
@@ -8,13 +8,23 @@ import json
 from datetime import datetime, timedelta
 from backend_auth import get_db_connection
 from backend_patient_dashboard import *
+from utils.trial_moments import (
+    load_trial_moments, load_patient_moments, fill_missing_moments, merge_moments, pooled_statistics,
+)
+from utils.quantile_sketch import merged_sketches
+from utils.plot_budget import budget_trace, trace_budget
+from utils.figure_cache import figure_key, cached_figure
+from utils.static_assets import inject_css
+from utils.query_profiler import start_page_profile, profile_section, render_profile_overlay
 
 # Page configuration with wider layout
 st.set_page_config(page_title="Patient Data Comparison", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("historic_data")
+
 # Apply custom CSS
-with open("frontend/static/enhanced_style.css", "r") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+inject_css("enhanced_style.css")
 
 # Add background patterns
 st.markdown("""
@@ -62,7 +72,7 @@ with st.container():
 # Helper functions (keeping existing functions)
 def get_data_instance(data_id: str):
     # ... keep existing code
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT pd.*, p.username, pc.comment
@@ -79,7 +89,7 @@ def get_data_instance(data_id: str):
 
 def get_patient_data_ids(patient_id):
     # ... keep existing code
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT data_id, created_at 
@@ -271,15 +281,16 @@ if not data_ids:
 
 # Collect data info for the table
 data_info_list = []
-for d_id, created_at in data_ids:
-    data_info = get_data_info(d_id, created_at)
-    data_info_list.append(data_info)
-    
-    # Format data IDs for the multiselect
-    all_data_ids[d_id] = {
-        'display': f"Data ID: {d_id} (Created: {data_info['Timestamp']})",
-        'created_at': data_info['Timestamp']
-    }
+with profile_section("Data set table"):
+    for d_id, created_at in data_ids:
+        data_info = get_data_info(d_id, created_at)
+        data_info_list.append(data_info)
+
+        # Format data IDs for the multiselect
+        all_data_ids[d_id] = {
+            'display': f"Data ID: {d_id} (Created: {data_info['Timestamp']})",
+            'created_at': data_info['Timestamp']
+        }
 
 # Display data info table
 st.markdown("<p>Available data sets:</p>", unsafe_allow_html=True)
@@ -338,7 +349,7 @@ data_id_numeric_cols = {}  # Track numeric columns per data ID
 common_numeric_cols = None
 timestamp_cols = set()
 
-with st.spinner("Loading data..."):
+with st.spinner("Loading data..."), profile_section("Load selected data"):
     for data_id in selected_data_ids:
         df = load_data(data_id)
         if df is not None:
@@ -506,72 +517,106 @@ with st.container():
     st.markdown("</div>", unsafe_allow_html=True)  # Close the card div
 
 # Create visualizations based on selected type
-with st.container():
+with st.container(), profile_section("Visualizations"):
     if viz_type == "Line Charts":
         # One chart per parameter
+        per_trace = trace_budget(len(data_frames))
         for param in selected_params:
-            fig = go.Figure()
-            
-            for data_id, df in data_frames.items():
-                if param in df.columns:
-                    # Determine x-axis values based on user preference
-                    if use_normalized_time and 'time_seconds' in df.columns:
-                        x_values = df['time_seconds']
-                        x_title = "Time (seconds from start)"
-                    elif 'timestamps' in df.columns:
-                        x_values = df['timestamps']
-                        x_title = "Timestamp"
-                    else:
-                        x_values = df.index
-                        x_title = "Data Point"
-                    
-                    fig.add_trace(go.Scatter(
-                        x=x_values,
-                        y=df[param],
-                        mode='lines+markers',
-                        name=f"Data ID: {data_id}",
-                        line=dict(width=2),
-                        marker=dict(size=5)
-                    ))
-            
-            fig.update_layout(
-                title=f"{param} Comparison",
-                xaxis_title=x_title,
-                yaxis_title=param,
-                legend_title="Data ID",
-                height=400,
-                template="plotly_white",
-                margin=dict(l=10, r=10, t=40, b=10),
-                legend=dict(
-                    yanchor="top", 
-                    y=0.99, 
-                    xanchor="right", 
-                    x=0.99,
-                    bgcolor="rgba(255,255,255,0.8)",
-                    bordercolor="rgba(0,0,0,0.1)",
-                    borderwidth=1
+            def build_line_chart(param=param):
+                fig = go.Figure()
+                
+                for data_id, df in data_frames.items():
+                    if param in df.columns:
+                        # Determine x-axis values based on user preference
+                        if use_normalized_time and 'time_seconds' in df.columns:
+                            x_values = df['time_seconds']
+                            x_title = "Time (seconds from start)"
+                        elif 'timestamps' in df.columns:
+                            x_values = df['timestamps']
+                            x_title = "Timestamp"
+                        else:
+                            x_values = df.index
+                            x_title = "Data Point"
+                        
+                        fig.add_trace(budget_trace(
+                            x_values,
+                            df[param],
+                            max_points=per_trace,
+                            mode='lines+markers',
+                            name=f"Data ID: {data_id}",
+                            line=dict(width=2),
+                            marker=dict(size=5)
+                        ))
+                
+                fig.update_layout(
+                    title=f"{param} Comparison",
+                    xaxis_title=x_title,
+                    yaxis_title=param,
+                    legend_title="Data ID",
+                    height=400,
+                    template="plotly_white",
+                    margin=dict(l=10, r=10, t=40, b=10),
+                    legend=dict(
+                        yanchor="top", 
+                        y=0.99, 
+                        xanchor="right", 
+                        x=0.99,
+                        bgcolor="rgba(255,255,255,0.8)",
+                        bordercolor="rgba(0,0,0,0.1)",
+                        borderwidth=1
+                    )
                 )
+                return fig
+            
+            fig = cached_figure(
+                figure_key("historic_line_chart", data_frames, [param], extra=use_normalized_time),
+                build_line_chart
             )
             st.plotly_chart(fig, use_container_width=True)
     elif viz_type == "Box Plots":
-        # Create a combined dataframe for box plots
-        combined_data = []
+        box_scope = st.radio(
+            "Distribution scope",
+            options=["Each selected data set", "Pooled: all my data sets"],
+            horizontal=True
+        )
         
-        for param in selected_params:
-            for data_id, df in data_frames.items():
-                if param in df.columns:
-                    param_data = df[param].dropna()
-                    temp_df = pd.DataFrame({
-                        'Parameter': [param] * len(param_data),
-                        'Value': param_data,
-                        'Data ID': [f"Data ID: {data_id}"] * len(param_data)
-                    })
-                    combined_data.append(temp_df)
+        if box_scope == "Pooled: all my data sets":
+            # Merge the per-trial quantile sketches instead of loading every raw sample
+            sketches, trial_count = merged_sketches(selected_params, patient_ids=[patient_id], data_frames=data_frames)
+            fig = go.Figure()
+            for param, sketch in sketches.items():
+                if sketch.count:
+                    fig.add_trace(go.Box(name=param, **{key: [value] for key, value in sketch.box_stats().items()}))
+            
+            if fig.data:
+                fig.update_layout(
+                    title=f"Parameter Distribution - {trial_count} data sets (approximate)",
+                    showlegend=False
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.warning("No valid data for box plots")
         
-        if combined_data:
-            combined_df = pd.concat(combined_data, ignore_index=True)
+        def build_box_plot():
+            # Create a combined dataframe for box plots
+            combined_data = []
+            
+            for param in selected_params:
+                for data_id, df in data_frames.items():
+                    if param in df.columns:
+                        param_data = df[param].dropna()
+                        temp_df = pd.DataFrame({
+                            'Parameter': [param] * len(param_data),
+                            'Value': param_data,
+                            'Data ID': [f"Data ID: {data_id}"] * len(param_data)
+                        })
+                        combined_data.append(temp_df)
             
-            fig = px.box(
+            if not combined_data:
+                return None
+            
+            combined_df = pd.concat(combined_data, ignore_index=True)
+            return px.box(
                 combined_df, 
                 x='Parameter', 
                 y='Value', 
@@ -579,29 +624,35 @@ with st.container():
                 title="Parameter Distribution Comparison",
                 points="all"
             )
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.warning("No valid data for box plots")
+        
+        if box_scope == "Each selected data set":
+            fig = cached_figure(figure_key("historic_box_plot", data_frames, selected_params), build_box_plot)
+            if fig:
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.warning("No valid data for box plots")
 
     elif viz_type == "Violin Plots":
-        # Create a combined dataframe for violin plots
-        combined_data = []
-        
-        for param in selected_params:
-            for data_id, df in data_frames.items():
-                if param in df.columns:
-                    param_data = df[param].dropna()
-                    temp_df = pd.DataFrame({
-                        'Parameter': [param] * len(param_data),
-                        'Value': param_data,
-                        'Data ID': [f"Data ID: {data_id}"] * len(param_data)
-                    })
-                    combined_data.append(temp_df)
-        
-        if combined_data:
-            combined_df = pd.concat(combined_data, ignore_index=True)
+        def build_violin_plot():
+            # Create a combined dataframe for violin plots
+            combined_data = []
             
-            fig = px.violin(
+            for param in selected_params:
+                for data_id, df in data_frames.items():
+                    if param in df.columns:
+                        param_data = df[param].dropna()
+                        temp_df = pd.DataFrame({
+                            'Parameter': [param] * len(param_data),
+                            'Value': param_data,
+                            'Data ID': [f"Data ID: {data_id}"] * len(param_data)
+                        })
+                        combined_data.append(temp_df)
+            
+            if not combined_data:
+                return None
+            
+            combined_df = pd.concat(combined_data, ignore_index=True)
+            return px.violin(
                 combined_df, 
                 x='Parameter', 
                 y='Value', 
@@ -609,6 +660,9 @@ with st.container():
                 box=True,
                 title="Parameter Distribution Comparison"
             )
+        
+        fig = cached_figure(figure_key("historic_violin_plot", data_frames, selected_params), build_violin_plot)
+        if fig:
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.warning("No valid data for violin plots")
@@ -684,8 +738,40 @@ with st.container():
                 st.warning("No data frames contain all the selected parameters for scatter matrix")
 
     elif viz_type == "Heatmap":
+        heatmap_scope = st.radio(
+            "Correlation scope",
+            options=["Each selected data set", "Pooled: selected data sets", "Pooled: all my data sets"],
+            horizontal=True
+        )
+        
+        if heatmap_scope != "Each selected data set":
+            # Pool per-trial moments instead of concatenating raw columns
+            if heatmap_scope == "Pooled: all my data sets":
+                stored_moments = load_patient_moments(patient_id)
+            else:
+                stored_moments = load_trial_moments(list(data_frames.keys()))
+            moments_by_id = fill_missing_moments(stored_moments, data_frames)
+            merged_moments = merge_moments(list(moments_by_id.values()))
+            
+            if merged_moments is None:
+                st.warning("No data available for a pooled correlation heatmap")
+            else:
+                counts, means, variances, corr_matrix = pooled_statistics(merged_moments, selected_params)
+                
+                if len(corr_matrix) >= 2:
+                    fig = px.imshow(
+                        corr_matrix,
+                        text_auto=".2f",
+                        color_continuous_scale='RdBu_r',
+                        zmin=-1, zmax=1,
+                        title=f"Pooled Correlation Matrix - {len(moments_by_id)} data sets, {int(counts.max())} samples"
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+                else:
+                    st.warning("Not enough valid parameters for a pooled correlation heatmap")
+        
         # Calculate correlation matrices for each dataset
-        for data_id, df in data_frames.items():
+        for data_id, df in (data_frames.items() if heatmap_scope == "Each selected data set" else []):
             # Filter to only include selected parameters that exist in this dataframe
             valid_params = [param for param in selected_params if param in df.columns]
             
@@ -715,15 +801,17 @@ if use_normalized_time and any('time_seconds' in df.columns for df in data_frame
         if selected_params:
             time_param = st.selectbox("Select parameter for time analysis", options=selected_params)
             
-            # Create a combined plot with normalized time
+            # Create a combined plot with normalized time (raw + smoothed trace per data set)
             fig = go.Figure()
+            per_trace = trace_budget(2 * len(data_frames))
             
             for data_id, df in data_frames.items():
                 if time_param in df.columns and 'time_seconds' in df.columns:
                     # Add the raw data
-                    fig.add_trace(go.Scatter(
-                        x=df['time_seconds'],
-                        y=df[time_param],
+                    fig.add_trace(budget_trace(
+                        df['time_seconds'],
+                        df[time_param],
+                        max_points=per_trace,
                         mode='lines',
                         name=f"Data ID: {data_id} (raw)",
                         line=dict(width=1)
@@ -735,9 +823,10 @@ if use_normalized_time and any('time_seconds' in df.columns for df in data_frame
                         window_size = max(5, len(df) // 20)  # Use 5% of data points or at least 5
                         smoothed = df[time_param].rolling(window=window_size, center=True).mean()
                         
-                        fig.add_trace(go.Scatter(
-                            x=df['time_seconds'],
-                            y=smoothed,
+                        fig.add_trace(budget_trace(
+                            df['time_seconds'],
+                            smoothed,
+                            max_points=per_trace,
                             mode='lines',
                             name=f"Data ID: {data_id} (smoothed)",
                             line=dict(width=3)
@@ -767,9 +856,10 @@ if use_normalized_time and any('time_seconds' in df.columns for df in data_frame
                     window_size = max(5, len(df) // 20)
                     smoothed_rate = df['rate'].rolling(window=window_size, center=True).mean()
                     
-                    rate_fig.add_trace(go.Scatter(
-                        x=df['time_seconds'],
-                        y=smoothed_rate,
+                    rate_fig.add_trace(budget_trace(
+                        df['time_seconds'],
+                        smoothed_rate,
+                        max_points=trace_budget(len(data_frames)),
                         mode='lines',
                         name=f"Data ID: {data_id}"
                     ))
@@ -784,7 +874,7 @@ if use_normalized_time and any('time_seconds' in df.columns for df in data_frame
             st.plotly_chart(rate_fig, use_container_width=True)
 
 # Statistical comparison
-with st.expander("Statistical Comparison"):
+with st.expander("Statistical Comparison"), profile_section("Statistical comparison"):
     st.subheader("Parameter Statistics")
     
     # Create a table of statistics for each parameter and dataset
@@ -814,6 +904,18 @@ with st.expander("Statistical Comparison"):
         st.dataframe(stats_df)
     else:
         st.warning("No valid data for statistical comparison")
+    
+    if st.checkbox("Include pooled statistics across all my data sets"):
+        # Percentiles are approximate: merged from per-trial quantile sketches
+        sketches, trial_count = merged_sketches(selected_params, patient_ids=[patient_id], data_frames=data_frames)
+        pooled_rows = [
+            {'Parameter': param, 'Data ID': f"All ({trial_count})", **sketch.summary()}
+            for param, sketch in sketches.items() if sketch.count
+        ]
+        if pooled_rows:
+            st.dataframe(pd.DataFrame(pooled_rows))
+        else:
+            st.warning("No pooled statistics available")
 
 # Navigation
 st.markdown("""
@@ -824,3 +926,5 @@ if st.button("← Back to Dashboard", use_container_width=True):
     st.switch_page("pages/patient_dashboard.py")
 
 st.markdown("</div>", unsafe_allow_html=True)
+
+render_profile_overlay()
@@ -7,15 +7,20 @@ from streamlit_autorefresh import st_autorefresh
 from datetime import datetime
 import json
 from backend_auth import get_db_connection
-import base64
+from database.replicas import DB_REPLICA_LIVE_MAX_LAG
+from utils.trial_finalization import run_trial_finalizers, queue_trial_precompute, trial_frame_from_series
+from utils.static_assets import inject_css
 import time
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 # Page configuration with wider layout
 st.set_page_config(page_title="Trial Recording", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("new_trial")
+
 # Apply custom CSS
-with open("frontend/static/enhanced_style.css", "r") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+inject_css("enhanced_style.css")
 
 # Helper function to add a background image
 def add_bg_image():
@@ -84,7 +89,7 @@ class DateTimeEncoder(json.JSONEncoder):
 def get_live_data():
     """Get the most recent data from live_patient_data table"""
     # ... keep existing code
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True, max_lag=DB_REPLICA_LIVE_MAX_LAG)
     if not conn:
         return None
     
@@ -343,7 +348,13 @@ def end_trial():
             cursor.execute("""
                 INSERT INTO patient_data (patient_id, data, file_data)
                 VALUES (%s, %s::json, %s)
+                RETURNING data_id
             """, (patient_id, json_data, binary_metadata))
+            data_id = cursor.fetchone()[0]
+            
+            # Precompute mergeable per-trial summaries for pooled analytics
+            trial_frame = trial_frame_from_series(simple_data)
+            run_trial_finalizers(cursor, data_id, patient_id, trial_frame)
             
             # Update trial end time
             cursor.execute("""
@@ -357,6 +368,9 @@ def end_trial():
             
             conn.commit()
             
+            # Default analyses run in the background once the trial is committed (opt-in)
+            queue_trial_precompute(data_id, trial_frame)
+            
             # Clear session
             if "current_trial_id" in st.session_state:
                 del st.session_state.current_trial_id
@@ -602,3 +616,5 @@ if st.button("← Return to Dashboard", use_container_width=True):
     st.switch_page("pages/patient_dashboard.py")
 
 st.markdown("</div>", unsafe_allow_html=True)  # Close the flex container
+
+render_profile_overlay()
@@ -2,8 +2,12 @@
 import streamlit as st
 from backend_auth import login, register_user, update_user_password, user_exists, get_patient_id, get_db_connection
 import json
+from utils.query_profiler import start_page_profile, render_profile_overlay
 st.set_page_config(page_title="Patient Authentication")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("patient_auth")
+
 # Apply custom CSS for consistent styling with main page
 st.markdown("""
 <style>
@@ -163,3 +167,5 @@ st.markdown("</div>", unsafe_allow_html=True)
 # **Home Button**
 if st.button("🏠 Home"):
     st.switch_page("main.py")  # Redirect to main.py
+
+render_profile_overlay()
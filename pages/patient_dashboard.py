@@ -1,36 +1,41 @@
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 from streamlit_autorefresh import st_autorefresh
 from backend_auth import get_db_connection
+from database.replicas import DB_REPLICA_LIVE_MAX_LAG
+from utils.plot_budget import budget_trace, trace_budget
+from utils.trend_engine import StreamingEMA
+from utils.static_assets import inject_css, asset_url
+from utils.query_profiler import start_page_profile, render_profile_overlay
+from backend_latency import record_render, reading_latency
 from datetime import datetime
-import base64
 from io import BytesIO
+from collections import deque
 import time
 
 # Page configuration with wider layout
 st.set_page_config(page_title="Patient Dashboard", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("patient_dashboard")
+
 # Apply custom CSS
-with open("frontend/static/enhanced_style.css", "r") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+inject_css("enhanced_style.css")
 
 # Helper function to add a background image
-def add_bg_image(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
-    
+def add_bg_image(image_name):
     bg_image = f"""
     <div class="background-container" 
-         style="background-image: url(data:image/png;base64,{encoded_string})">
+         style="background-image: url({asset_url(image_name)})">
     </div>
     """
     st.markdown(bg_image, unsafe_allow_html=True)
 
 # Try to add the background image
 try:
-    add_bg_image("static/puppy_attack_doctor.png")
+    add_bg_image("puppy_attack_doctor.png")
 except Exception as e:
     st.write("")  # Silent fail for background image
 
@@ -154,14 +159,14 @@ st.divider()
 # Function to get live data
 def get_live_data(patient_id, limit=60):
     """Get live streaming data"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True, max_lag=DB_REPLICA_LIVE_MAX_LAG)
     if not conn:
         return None
     
     try:
         with conn.cursor() as cursor:
             cursor.execute("""
-                SELECT sensor_data, timestamp 
+                SELECT sensor_data, timestamp, device_time, received_at
                 FROM live_patient_data 
                 WHERE patient_id = %s 
                 ORDER BY timestamp DESC 
@@ -174,11 +179,14 @@ def get_live_data(patient_id, limit=60):
                 
             data = []
             for row in rows:
-                sensor_data, timestamp = row
+                sensor_data, timestamp, device_time, received_at = row
                 entry = {"timestamp": timestamp, **sensor_data}
                 data.append(entry)
             
-            return pd.DataFrame(data)
+            df = pd.DataFrame(data)
+            # Trip timestamps of the newest reading, for the data-age readout
+            df.attrs['latest_times'] = {'committed_at': rows[0][1], 'device_time': rows[0][2], 'received_at': rows[0][3]}
+            return df
             
     except Exception as e:
         st.error(f"Error fetching live data: {str(e)}")
@@ -186,6 +194,31 @@ def get_live_data(patient_id, limit=60):
     finally:
         conn.close()
 
+def live_trends(df, param_columns, window=5, keep=60):
+    """
+    Per-parameter EMA trend of the live stream, kept across reruns in session state.
+
+    Only readings newer than the last rerun's are folded in, so each refresh costs
+    O(new readings) whatever the window shown.
+
+    Returns:
+        dict: {param: deque of (timestamp, trend value)}, oldest first
+    """
+    state = st.session_state.setdefault('live_trends', {'last': None, 'ema': {}, 'points': {}})
+    rows = df.sort_values('timestamp')
+    if state['last'] is not None:
+        rows = rows[rows['timestamp'] > state['last']]
+    for param in param_columns:
+        ema = state['ema'].setdefault(param, StreamingEMA(window))
+        points = state['points'].setdefault(param, deque(maxlen=keep))
+        for timestamp, value in zip(rows['timestamp'], rows[param]):
+            trend = ema.update(value)
+            if trend is not None:
+                points.append((timestamp, trend))
+    if not rows.empty:
+        state['last'] = rows['timestamp'].iloc[-1]
+    return state['points']
+
 # Live Data Section
 st.markdown(f"""
 <div class="card live-data">
@@ -200,6 +233,7 @@ df = get_live_data(patient_id)
 if df is not None and not df.empty:
     # Get numerical columns
     param_columns = [col for col in df.columns if col != 'timestamp' and pd.api.types.is_numeric_dtype(df[col])]
+    trends = live_trends(df, param_columns)
     
     # Create dashboard layout with columns for charts
     chart_cols = st.columns(min(2, len(param_columns)))
@@ -208,14 +242,18 @@ if df is not None and not df.empty:
     for i, param in enumerate(param_columns):
         col_idx = i % len(chart_cols)
         with chart_cols[col_idx]:
-            fig = px.line(
-                df,
-                x='timestamp',
-                y=param,
-                title=f"{param.replace('_', ' ').title()}"
-            )
+            # Raw reading + EMA trend share the figure's point budget
+            fig = go.Figure(budget_trace(
+                df['timestamp'],
+                df[param],
+                max_points=trace_budget(2),
+                mode='lines',
+                name=param,
+                hovertemplate="%{x}<br>%{y}<extra></extra>"
+            ))
             
             fig.update_layout(
+                title=f"{param.replace('_', ' ').title()}",
                 height=250,
                 margin=dict(l=0, r=0, t=40, b=0),
                 xaxis_title=None,
@@ -229,13 +267,16 @@ if df is not None and not df.empty:
                 title_font=dict(size=18, family='Arial', color='#2980b9')
             )
             
-            # Add rolling average
-            fig.add_scatter(
-                x=df['timestamp'],
-                y=df[param].rolling(window=5).mean(),
-                name=f"{param} (5s avg)",
+            # Add the streaming EMA trend
+            trend_points = list(trends[param])
+            fig.add_trace(budget_trace(
+                [timestamp for timestamp, _ in trend_points],
+                [value for _, value in trend_points],
+                max_points=trace_budget(2),
+                mode='lines',
+                name=f"{param} (5s EMA)",
                 line=dict(color='#e74c3c', width=2, dash='dot')
-            )
+            ))
             
             st.plotly_chart(fig, use_container_width=True)
             
@@ -252,6 +293,21 @@ if df is not None and not df.empty:
                 label=f"Average {param.replace('_', ' ').title()}", 
                 value=f"{avg_value:.1f}" if isinstance(avg_value, (int, float)) else avg_value
             )
+    
+    # How old the newest reading is now that it's on screen, and where that time went
+    latest = df.attrs.get('latest_times', {})
+    stages = reading_latency(latest.get('device_time'), latest.get('received_at'), latest.get('committed_at'))
+    age_ms = stages['device_to_render'] if stages['device_to_render'] is not None else stages['commit_to_render']
+    if age_ms is not None:
+        parts = [f"{label} {stages[stage]:.0f} ms" for stage, label in
+                 [('device_to_receive', 'device→server'), ('receive_to_commit', 'server→DB'), ('commit_to_render', 'DB→screen')]
+                 if stages[stage] is not None]
+        st.caption(f"Newest reading is {age_ms / 1000:.1f} s old ({', '.join(parts)})")
+    
+    # Count each reading once per session: the time until it first reached this screen
+    if latest.get('committed_at') is not None and st.session_state.get('last_rendered_reading') != latest['committed_at']:
+        st.session_state['last_rendered_reading'] = latest['committed_at']
+        record_render('patient_dashboard', latest['committed_at'], latest.get('device_time'))
 else:
     st.info("No live data available. Waiting for sensor readings...")
     
@@ -308,3 +364,5 @@ st.markdown(f"""
     Patient ID: {patient_id} | Session started: {datetime.now().strftime('%Y-%m-%d %H:%M')}
 </div>
 """, unsafe_allow_html=True)
+
+render_profile_overlay()
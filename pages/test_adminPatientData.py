@@ -3,9 +3,13 @@ import pandas as pd
 from backend_patient_info import get_patient_data, get_patient_summary
 from utils.security import is_admin_authenticated
 import numpy as np
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 st.set_page_config(page_title="Patient Data", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("test_adminPatientData")
+
 # ✅ Authentication Check
 if not is_admin_authenticated():
     st.error("⚠️ Access Denied: Admin authentication required")
@@ -591,4 +595,6 @@ if st.sidebar.button("🔙 Show All Data", key="sidebar_show_all"):
 if st.sidebar.button("📊 Back to Patient List", key="sidebar_back"):
     st.switch_page("pages/_admin_patient_info.py")
 if st.sidebar.button ("🏠 Back to Dashboard", key="sidebar_dashboard"):
-    st.switch_page("pages/_admin_dashboard.py")
\ No newline at end of file
+    st.switch_page("pages/_admin_dashboard.py")
+
+render_profile_overlay()
@@ -2,9 +2,13 @@ import streamlit as st
 import pandas as pd
 from backend_patient_info import get_patient_data, get_patient_summary
 from utils.security import is_admin_authenticated
+from utils.query_profiler import start_page_profile, render_profile_overlay
 
 st.set_page_config(page_title="Patient Data", layout="wide")
 
+# Debug query profile of this rerun (QUERY_PROFILER=1); no-op otherwise
+start_page_profile("test_adminPatientData1")
+
 # ✅ Authentication Check
 if not is_admin_authenticated():
     st.error("⚠️ Access Denied: Admin authentication required")
@@ -492,5 +496,5 @@ if st.sidebar.button("🔙 Show All Data", key = "refresh_sidebar"):
     st.rerun()
 if st.sidebar.button("🏠 Back to Patient List",key="back_main"):
     st.switch_page("pages/_admin_patient_info.py")
-       
- 
\ No newline at end of file
+
+render_profile_overlay()
@@ -1,10 +1,10 @@
 
 import streamlit as st
+from utils.static_assets import inject_css
 
 def load_admin_css():
     """Load the shared admin CSS styles"""
-    with open("./frontend/static/admin_custom.css") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    inject_css("admin_custom.css")
 
 def create_toast(message, type="info"):
     """Create a toast notification
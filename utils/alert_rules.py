@@ -0,0 +1,286 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+import operator
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from utils.batch_writer import BatchWriter
+
+logger = logging.getLogger('alert_rules')
+
+# Seconds between reloads of the alert_rules table
+ALERT_RULES_REFRESH = float(os.getenv("ALERT_RULES_REFRESH", "30"))
+
+# Alert writer batching
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "200"))
+ALERT_FLUSH_INTERVAL = float(os.getenv("ALERT_FLUSH_INTERVAL", "1.0"))
+
+ALERT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_rules (
+    rule_id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    conditions JSONB NOT NULL,
+    duration_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    severity TEXT NOT NULL DEFAULT 'warning',
+    patient_id INTEGER,
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    id BIGSERIAL PRIMARY KEY,
+    rule_id INTEGER NOT NULL,
+    patient_id INTEGER NOT NULL,
+    rule_name TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    readings JSONB NOT NULL,
+    started_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    fired_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_patient_fired ON alerts(patient_id, fired_at DESC);
+"""
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+# Short names accepted in rule text
+PARAMETER_ALIASES = {
+    'spo2': 'oxygen_saturation',
+    'hr': 'heart_rate',
+    'systolic': 'blood_pressure_systolic',
+    'diastolic': 'blood_pressure_diastolic',
+    'rr': 'respiratory_rate',
+    'temp': 'temperature',
+    'glucose': 'glucose_level'
+}
+
+_CLAUSE = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(<=|>=|==|!=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$")
+_DURATION = re.compile(r"\s+for\s+(\d+(?:\.\d+)?)\s*(s|sec|secs|seconds|m|min|mins|minutes)\s*$", re.IGNORECASE)
+
+def parse_rule(text):
+    """
+    Parse rule text such as "SpO2 < 92 for 30 s" or "HR > 130 and systolic < 90".
+
+    Clauses are joined with 'and'; an optional trailing "for N s|min" sets the duration.
+
+    Returns:
+        dict: {'conditions': [{'param', 'op', 'value'}], 'duration_seconds'}
+
+    Raises:
+        ValueError: If a clause can't be parsed
+    """
+    duration = 0.0
+    match = _DURATION.search(text)
+    if match:
+        duration = float(match.group(1)) * (60 if match.group(2).lower().startswith('m') else 1)
+        text = text[:match.start()]
+
+    conditions = []
+    for clause in re.split(r"\s+and\s+", text.strip(), flags=re.IGNORECASE):
+        parsed = _CLAUSE.match(clause)
+        if not parsed:
+            raise ValueError(f"Can't parse condition: {clause!r}")
+        param, op, value = parsed.groups()
+        conditions.append({'param': PARAMETER_ALIASES.get(param.lower(), param), 'op': op, 'value': float(value)})
+
+    return {'conditions': conditions, 'duration_seconds': duration}
+
+def _usable(value):
+    """Numeric, finite reading value; anything else counts as the parameter being absent"""
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and math.isfinite(value)
+
+class CompiledRule:
+    """A rule reduced to (parameter, operator function, threshold) clauses"""
+    __slots__ = ('rule_id', 'name', 'severity', 'duration', 'patient_id', 'clauses')
+
+    def __init__(self, rule_id, name, conditions, duration_seconds=0.0, severity='warning', patient_id=None):
+        self.rule_id = rule_id
+        self.name = name
+        self.severity = severity
+        self.duration = float(duration_seconds or 0.0)
+        self.patient_id = patient_id
+        self.clauses = tuple((c['param'], OPERATORS[c['op']], float(c['value'])) for c in conditions)
+
+    def matches(self, reading):
+        """True/False, or None when the reading lacks one of the rule's parameters (or it is not finite)"""
+        result = True
+        for param, op, threshold in self.clauses:
+            value = reading.get(param)
+            if not _usable(value):
+                return None
+            result = result and op(value, threshold)
+        return result
+
+class AlertEngine:
+    """
+    Evaluates alert rules against the readings of every patient stream.
+
+    Rules are compiled into per-parameter, per-operator sorted threshold lists. For a
+    reading, a bisection per (parameter, operator) yields exactly the clauses it satisfies,
+    so the cost follows the number of satisfied clauses rather than the number of rules;
+    a rule matches when all of its clauses are satisfied.
+
+    Each (patient, rule) pair that is currently true holds a two-slot state: when the
+    condition started holding and whether it has already fired. A rule fires once its
+    condition has held for duration_seconds, and re-arms when it turns false.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = {}
+        self.index = {}
+        self.equality = {}
+        self.active = {}
+        self.loaded_at = 0.0
+        self.compile(rules)
+
+    def compile(self, rules):
+        """Replace the rule set (CompiledRule objects) and rebuild the threshold index"""
+        self.rules = {rule.rule_id: rule for rule in rules}
+
+        ordered = {}
+        equality = {}
+        for rule in self.rules.values():
+            for param, op, threshold in rule.clauses:
+                if op in (operator.eq, operator.ne):
+                    equality.setdefault(param, []).append((op, threshold, rule))
+                else:
+                    ordered.setdefault(param, {}).setdefault(op, []).append((threshold, rule))
+
+        # {param: [(operator, sorted thresholds, rules in the same order)]}
+        self.index = {}
+        for param, by_op in ordered.items():
+            self.index[param] = []
+            for op, entries in by_op.items():
+                entries.sort(key=lambda entry: entry[0])
+                self.index[param].append((op, [e[0] for e in entries], [e[1] for e in entries]))
+        self.equality = equality
+
+        # Forget state of rules that were removed or disabled
+        for patient_id, states in list(self.active.items()):
+            self.active[patient_id] = {rule_id: state for rule_id, state in states.items() if rule_id in self.rules}
+
+    async def load(self, pool):
+        """(Re)load enabled rules from the alert_rules table"""
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(ALERT_SCHEMA)
+                rows = await conn.fetch("""
+                    SELECT rule_id, name, conditions, duration_seconds, severity, patient_id
+                    FROM alert_rules
+                    WHERE enabled
+                """)
+        except Exception as e:
+            logger.error(f"Failed to load alert rules: {e}")
+            return
+
+        rules = []
+        for row in rows:
+            conditions = row['conditions']
+            try:
+                rules.append(CompiledRule(
+                    row['rule_id'], row['name'],
+                    json.loads(conditions) if isinstance(conditions, str) else conditions,
+                    row['duration_seconds'], row['severity'], row['patient_id']
+                ))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Skipping invalid alert rule {row['name']!r}: {e}")
+
+        self.compile(rules)
+        self.loaded_at = time.monotonic()
+        logger.info(f"Loaded {len(rules)} alert rules")
+
+    async def refresh(self, pool):
+        """Reload the rules if ALERT_RULES_REFRESH seconds have passed"""
+        if time.monotonic() - self.loaded_at >= ALERT_RULES_REFRESH:
+            await self.load(pool)
+
+    def satisfied(self, patient_id, reading):
+        """Rules (applying to this patient) whose every clause the reading satisfies"""
+        hits = {}
+        for param, value in reading.items():
+            # NaN would bisect to "every threshold" for <= and >=
+            if not _usable(value):
+                continue
+
+            for op, thresholds, rules in self.index.get(param, ()):
+                # value < t for t above value, value > t for t below it, and so on
+                if op is operator.lt:
+                    matched = rules[bisect_right(thresholds, value):]
+                elif op is operator.le:
+                    matched = rules[bisect_left(thresholds, value):]
+                elif op is operator.gt:
+                    matched = rules[:bisect_left(thresholds, value)]
+                else:
+                    matched = rules[:bisect_right(thresholds, value)]
+                for rule in matched:
+                    hits[rule] = hits.get(rule, 0) + 1
+
+            for op, threshold, rule in self.equality.get(param, ()):
+                if op(value, threshold):
+                    hits[rule] = hits.get(rule, 0) + 1
+
+        return [rule for rule, count in hits.items()
+                if count == len(rule.clauses) and (rule.patient_id is None or rule.patient_id == patient_id)]
+
+    def evaluate(self, patient_id, reading, now=None):
+        """
+        Run one reading through the compiled rules.
+
+        Args:
+            patient_id (int): Patient the reading belongs to
+            reading (dict): {parameter: value}
+            now (float, optional): Reading time in epoch seconds, so durations follow the
+                reading clock (defaults to time.time())
+
+        Returns:
+            list: Alert rows (rule_id, patient_id, rule_name, severity, readings JSON, started_at, fired_at)
+        """
+        now = time.time() if now is None else now
+        matched = self.satisfied(patient_id, reading)
+        states = self.active.get(patient_id)
+
+        # Pending/fired rules that no longer hold re-arm (unless the reading lacks their parameters)
+        if states:
+            matched_ids = {rule.rule_id for rule in matched}
+            for rule_id in [r for r in states if r not in matched_ids]:
+                if all(_usable(reading.get(param)) for param, _, _ in self.rules[rule_id].clauses):
+                    del states[rule_id]
+
+        alerts = []
+        for rule in matched:
+            if states is None:
+                states = self.active[patient_id] = {}
+            state = states.get(rule.rule_id)
+            if state is None:
+                state = states[rule.rule_id] = [now, False]
+            if not state[1] and now - state[0] >= rule.duration:
+                state[1] = True
+                values = {p: reading[p] for p, _, _ in rule.clauses}
+                alerts.append((
+                    rule.rule_id, patient_id, rule.name, rule.severity, json.dumps(values),
+                    datetime.fromtimestamp(state[0], timezone.utc), datetime.fromtimestamp(now, timezone.utc)
+                ))
+
+        return alerts
+
+class AlertWriter(BatchWriter):
+    """Buffers fired alerts and writes them to the alerts table in batches"""
+
+    def __init__(self, pool, batch_size=None, flush_interval=None):
+        super().__init__(
+            pool, ALERT_SCHEMA,
+            """
+            INSERT INTO alerts (rule_id, patient_id, rule_name, severity, readings, started_at, fired_at)
+            VALUES ($1, $2, $3, $4, $5::jsonb, $6, $7)
+            """,
+            batch_size or ALERT_BATCH_SIZE, flush_interval or ALERT_FLUSH_INTERVAL, name='alerts'
+        )
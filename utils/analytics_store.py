@@ -0,0 +1,136 @@
+import io
+import json
+import hashlib
+import numpy as np
+from backend_auth import get_db_connection
+
+# Bump when an analysis algorithm changes so stale stored results stop matching
+ANALYTICS_VERSION = 1
+
+ANALYTICS_RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_results (
+    data_id INTEGER NOT NULL,
+    parameter TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    options_hash TEXT NOT NULL,
+    result BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (data_id, parameter, analysis, options_hash)
+);
+"""
+
+def series_fingerprint(values):
+    """Content fingerprint (length + digest of the values in order) so edited trials don't hit stale results"""
+    values = np.ascontiguousarray(values, dtype=float)
+    return {'n': int(len(values)),
+            'digest': hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest()}
+
+def options_hash(options):
+    """Stable hash of an analysis' options (including the input fingerprint)"""
+    payload = json.dumps({'version': ANALYTICS_VERSION, **options}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def _encode(arrays):
+    """Serialize {name: array} to compressed npz bytes"""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **{name: np.asarray(value) for name, value in arrays.items()})
+    return buffer.getvalue()
+
+def _decode(blob):
+    """Deserialize bytes from _encode back to {name: array}"""
+    with np.load(io.BytesIO(bytes(blob)), allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
+
+def save_result(data_id, param, analysis, options, arrays, cursor=None):
+    """
+    Store an analysis result.
+
+    Args:
+        data_id: Trial the result belongs to
+        param (str): Analysed parameter
+        analysis (str): Analysis name ('fft', 'trend', 'outliers', ...)
+        options (dict): Options the result was computed with
+        arrays (dict): Result arrays {name: np.ndarray}
+        cursor: Optional open cursor (e.g. the finalization transaction); the caller commits.
+                Without one a short-lived connection is used.
+    """
+    args = (int(data_id), param, analysis, options_hash(options), _encode(arrays))
+    query = """
+        INSERT INTO analytics_results (data_id, parameter, analysis, options_hash, result)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (data_id, parameter, analysis, options_hash) DO UPDATE
+        SET result = EXCLUDED.result, created_at = NOW()
+    """
+
+    if cursor is not None:
+        cursor.execute(ANALYTICS_RESULTS_SCHEMA)
+        cursor.execute(query, args)
+        return
+
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(ANALYTICS_RESULTS_SCHEMA)
+            cursor.execute(query, args)
+        conn.commit()
+    except Exception as e:
+        print(f"Error saving analytics result: {str(e)}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+def load_result(data_id, param, analysis, options):
+    """
+    Fetch a stored analysis result.
+
+    Returns:
+        dict: Result arrays {name: np.ndarray}, or None if nothing is stored
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT result FROM analytics_results
+                WHERE data_id = %s AND parameter = %s AND analysis = %s AND options_hash = %s
+            """, (int(data_id), param, analysis, options_hash(options)))
+            row = cursor.fetchone()
+    except Exception as e:
+        # Missing table on a fresh database is the common case here
+        print(f"Error loading analytics result: {str(e)}")
+        return None
+    finally:
+        conn.close()
+
+    return _decode(row[0]) if row else None
+
+def cached_analysis(data_id, param, analysis, options, compute):
+    """
+    Return a stored result if there is one, otherwise compute and store it.
+
+    Args:
+        data_id: Trial id, or None to skip the store entirely
+        param (str): Analysed parameter
+        analysis (str): Analysis name
+        options (dict): Options (must include the input fingerprint)
+        compute (callable): Zero-argument function returning {name: np.ndarray} or None
+
+    Returns:
+        dict: Result arrays, or None if compute returned None
+    """
+    if data_id is None:
+        return compute()
+
+    result = load_result(data_id, param, analysis, options)
+    if result is not None:
+        return result
+
+    result = compute()
+    if result is not None:
+        save_result(data_id, param, analysis, options, result)
+    return result
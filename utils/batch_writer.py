@@ -0,0 +1,87 @@
+import asyncio
+import inspect
+import logging
+
+logger = logging.getLogger('batch_writer')
+
+class BatchWriter:
+    """
+    Buffers rows produced on the ingest path and writes them with one executemany per batch.
+
+    A batch is written as soon as batch_size rows are queued, and otherwise by the
+    periodic flush loop, so rows never wait longer than flush_interval.
+    """
+
+    def __init__(self, pool, schema, insert_query, batch_size, flush_interval, name='rows'):
+        self.pool = pool
+        self.schema = schema
+        self.insert_query = insert_query
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self.buffer = []
+        self.schema_ready = False
+        self._task = None
+        # The event loop only keeps weak references to tasks: hold them until they finish
+        self._flushes = set()
+
+    def add(self, rows):
+        """Queue rows; a full batch is flushed in the background"""
+        if not rows:
+            return
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.batch_size:
+            task = asyncio.ensure_future(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        """Forget a finished task and log whatever it raised"""
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"{self.name} task failed: {task.exception()!r}")
+
+    async def flush(self):
+        """Write everything buffered in one executemany; failed rows are re-queued"""
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+
+        try:
+            async with self.pool.acquire() as conn:
+                if not self.schema_ready:
+                    await conn.execute(self.schema)
+                    self.schema_ready = True
+                await conn.executemany(self.insert_query, batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} {self.name}: {e}")
+            # Keep the newest rows if the database stays unavailable
+            self.buffer = (batch + self.buffer)[-10 * self.batch_size:]
+
+    async def run(self, *housekeeping):
+        """Periodic flush loop; each housekeeping callable (sync or async) runs after every flush"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            for task in housekeeping:
+                try:
+                    result = task()
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"{self.name} housekeeping failed: {e}")
+
+    def start(self, *housekeeping):
+        """Start the flush loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run(*housekeeping))
+            self._task.add_done_callback(self._task_done)
+
+    async def stop(self):
+        """Cancel the flush loop and write whatever is left"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,198 @@
+import os
+import numpy as np
+
+# Series longer than this are aligned coarse-to-fine instead of in one banded pass
+DTW_COARSE_POINTS = int(os.getenv("DTW_COARSE_POINTS", "1000"))
+
+# Finest resolution a multiscale alignment is refined to (longer series are block-averaged first)
+DTW_MAX_POINTS = int(os.getenv("DTW_MAX_POINTS", "20000"))
+
+# Extra cells kept on each side of the projected path when refining a level
+DTW_REFINE_RADIUS = int(os.getenv("DTW_REFINE_RADIUS", "8"))
+
+DTW_MODES = ["auto", "exact", "multiscale"]
+
+def block_mean(values, length):
+    """Average a series down to `length` nearly equal blocks (returned unchanged if already short enough)"""
+    values = np.asarray(values, dtype=float)
+    if length >= len(values):
+        return values
+    edges = np.linspace(0, len(values), length + 1).astype(int)
+    return np.add.reduceat(values, edges[:-1]) / np.diff(edges)
+
+def sakoe_chiba_window(n, m, band):
+    """
+    Per-row column ranges [lo, hi) of a Sakoe-Chiba band around the (scaled) diagonal.
+
+    Args:
+        n (int): Rows (length of the first series)
+        m (int): Columns (length of the second series)
+        band (float or int): Half-width as a fraction of m (< 1) or in columns (>= 1)
+
+    Returns:
+        tuple: (lo, hi) int arrays of length n
+    """
+    width = int(np.ceil(band * m)) if band < 1 else int(band)
+    # The band must at least cover the diagonal's slope, or the corner is unreachable
+    width = max(width, int(np.ceil(m / max(n, 1))))
+    centre = np.round(np.arange(n) * (m - 1) / max(n - 1, 1)).astype(int)
+    return np.clip(centre - width, 0, m), np.clip(centre + width + 1, 0, m)
+
+def _connect(lo, hi, m):
+    """Make a window passable: first row starts at 0, last row ends at m, rows overlap diagonally"""
+    lo, hi = lo.copy(), hi.copy()
+    lo[0], hi[-1] = 0, m
+    lo = np.minimum.accumulate(lo[::-1])[::-1]
+    hi = np.maximum.accumulate(hi)
+    lo[1:] = np.minimum(lo[1:], hi[:-1])
+    return lo, np.maximum(hi, lo + 1)
+
+def windowed_dtw(x, y, lo, hi):
+    """
+    DTW restricted to a per-row window, with every row solved in one vectorized step.
+
+    Within a row, D[j] = min(t[j], c[j] + D[j - 1]) where t combines the diagonal and
+    vertical predecessors. Unrolled, that is D[j] = C[j] + min_{k<=j}(t[k] - C[k]) with C
+    the row's cumulative cost, so a cumsum and a minimum.accumulate replace the inner loop.
+
+    Args:
+        x (np.ndarray): First series (rows)
+        y (np.ndarray): Second series (columns)
+        lo (np.ndarray): First column of each row's window
+        hi (np.ndarray): One past the last column of each row's window
+
+    Returns:
+        tuple: (distance, path_i, path_j)
+    """
+    n = len(x)
+    widths = hi - lo
+    offsets = np.concatenate([[0], np.cumsum(widths)])
+    D = np.empty(offsets[-1])
+
+    for i in range(n):
+        a, b = lo[i], hi[i]
+        cost = np.abs(x[i] - y[a:b])
+        if i == 0:
+            t = np.full(b - a, np.inf)
+            t[0] = cost[0]
+        else:
+            # Previous row over columns [a - 1, b), inf outside its window
+            pa, pb = lo[i - 1], hi[i - 1]
+            prev = np.full(b - a + 1, np.inf)
+            s, e = max(pa, a - 1), min(pb, b)
+            if s < e:
+                prev[s - a + 1:e - a + 1] = D[offsets[i - 1] + s - pa:offsets[i - 1] + e - pa]
+            t = cost + np.minimum(prev[1:], prev[:-1])
+        cumulative = np.cumsum(cost)
+        D[offsets[i]:offsets[i + 1]] = cumulative + np.minimum.accumulate(t - cumulative)
+
+    # Backtrack from the corner, always stepping to the cheapest admissible predecessor
+    def cell(i, j):
+        if i < 0 or j < lo[i] or j >= hi[i]:
+            return np.inf
+        return D[offsets[i] + j - lo[i]]
+
+    i, j = n - 1, len(y) - 1
+    path = [(i, j)]
+    while i > 0 or j > 0:
+        candidates = ((cell(i - 1, j - 1), i - 1, j - 1), (cell(i - 1, j), i - 1, j), (cell(i, j - 1), i, j - 1))
+        _, i, j = min(candidates, key=lambda c: c[0])
+        path.append((i, j))
+
+    path = np.array(path[::-1])
+    return float(cell(n - 1, len(y) - 1)), path[:, 0], path[:, 1]
+
+def _project_path(path_i, path_j, n_coarse, m_coarse, n_fine, m_fine, radius):
+    """Window at the finer level covering the coarse path, widened by radius cells"""
+    row_lo = np.full(n_coarse, m_coarse)
+    row_hi = np.zeros(n_coarse, dtype=int)
+    np.minimum.at(row_lo, path_i, path_j)
+    np.maximum.at(row_hi, path_i, path_j + 1)
+
+    coarse_row = np.minimum(np.arange(n_fine) * n_coarse // n_fine, n_coarse - 1)
+    lo = row_lo[coarse_row] * m_fine // m_coarse
+    hi = -(-row_hi[coarse_row] * m_fine // m_coarse)
+
+    # Widen vertically (neighbouring rows) and horizontally
+    padded_lo = np.pad(lo, radius, mode='edge')
+    padded_hi = np.pad(hi, radius, mode='edge')
+    window = 2 * radius + 1
+    lo = np.lib.stride_tricks.sliding_window_view(padded_lo, window).min(axis=1) - radius
+    hi = np.lib.stride_tricks.sliding_window_view(padded_hi, window).max(axis=1) + radius
+    return np.clip(lo, 0, m_fine), np.clip(hi, 0, m_fine)
+
+def dtw(x, y, band=0.1, mode='auto', max_points=None, radius=None):
+    """
+    Dynamic time warping with a Sakoe-Chiba band.
+
+    'exact' runs banded DTW directly at the working resolution. 'multiscale' solves a
+    coarse version (at most DTW_COARSE_POINTS) inside the band, then repeatedly doubles
+    the resolution and re-solves only near the projected path. Series longer than
+    max_points are block-averaged to that length first.
+
+    Args:
+        x (np.ndarray): Reference series
+        y (np.ndarray): Series to warp onto the reference
+        band (float or int): Sakoe-Chiba half-width (fraction of the length if < 1)
+        mode (str): One of DTW_MODES; 'auto' picks exact for short series
+        max_points (int, optional): Working resolution cap (defaults to DTW_MAX_POINTS)
+        radius (int, optional): Refinement radius (defaults to DTW_REFINE_RADIUS)
+
+    Returns:
+        dict: {'distance', 'path_i', 'path_j' (at working resolution), 'x', 'y' (working series),
+               'x_step', 'y_step' (original samples per working point)}
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    max_points = max_points or DTW_MAX_POINTS
+    radius = radius or DTW_REFINE_RADIUS
+
+    xw = block_mean(x, max_points)
+    yw = block_mean(y, max_points)
+    n, m = len(xw), len(yw)
+
+    if mode == 'auto':
+        mode = 'exact' if max(n, m) <= DTW_COARSE_POINTS else 'multiscale'
+
+    if mode == 'exact':
+        lo, hi = _connect(*sakoe_chiba_window(n, m, band), m)
+        distance, path_i, path_j = windowed_dtw(xw, yw, lo, hi)
+    else:
+        # Resolutions from finest to coarsest, halving until under DTW_COARSE_POINTS
+        sizes = [(n, m)]
+        while max(sizes[-1]) > DTW_COARSE_POINTS:
+            sizes.append((max(2, -(-sizes[-1][0] // 2)), max(2, -(-sizes[-1][1] // 2))))
+
+        nc, mc = sizes[-1]
+        lo, hi = _connect(*sakoe_chiba_window(nc, mc, band), mc)
+        distance, path_i, path_j = windowed_dtw(block_mean(xw, nc), block_mean(yw, mc), lo, hi)
+
+        for (nf, mf), (nc, mc) in zip(sizes[-2::-1], sizes[:0:-1]):
+            lo, hi = _project_path(path_i, path_j, nc, mc, nf, mf, radius)
+            band_lo, band_hi = sakoe_chiba_window(nf, mf, band)
+            lo, hi = _connect(np.maximum(lo, band_lo), np.minimum(hi, band_hi), mf)
+            distance, path_i, path_j = windowed_dtw(block_mean(xw, nf), block_mean(yw, mf), lo, hi)
+
+    return {
+        'distance': distance,
+        'path_i': path_i,
+        'path_j': path_j,
+        'x': xw,
+        'y': yw,
+        'x_step': len(x) / n,
+        'y_step': len(y) / m
+    }
+
+def warp_onto_reference(result):
+    """
+    The second series resampled onto the reference's axis along the warping path.
+
+    Where the path maps several y points to one x point they are averaged.
+
+    Returns:
+        np.ndarray: Same length as result['x']
+    """
+    n = len(result['x'])
+    sums = np.bincount(result['path_i'], weights=result['y'][result['path_j']], minlength=n)
+    counts = np.bincount(result['path_i'], minlength=n)
+    return sums / np.maximum(counts, 1)
@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+import plotly.io as pio
+
+# Process-wide limits: shared by every session of this Streamlit server
+FIGURE_CACHE_MAX_ENTRIES = int(os.getenv("FIGURE_CACHE_MAX_ENTRIES", "128"))
+FIGURE_CACHE_MAX_BYTES = int(os.getenv("FIGURE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_cache = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+_lock = threading.Lock()
+
+def frame_version(df):
+    """
+    Content version of a dataframe: shape, column names and a digest of every value.
+
+    The digest is taken over pandas' vectorised per-row hashes (index included) in row
+    order, so any edited value of any dtype, a reordering or an appended or dropped row
+    changes it.
+    """
+    if df is None:
+        return None
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=True)
+    except TypeError:
+        # Unhashable cells (lists, dicts from JSON columns): hash their text instead
+        row_hashes = pd.util.hash_pandas_object(df.astype(str), index=True)
+    digest = hashlib.blake2b(row_hashes.to_numpy().tobytes(), digest_size=16).hexdigest()
+    return (df.shape, tuple(map(str, df.columns)), digest)
+
+def figure_key(viz_type, data_frames, params, options=None, extra=None):
+    """
+    Fingerprint of everything a figure is built from.
+
+    Args:
+        viz_type (str): Visualization type
+        data_frames (dict): {data_id: dataframe}; only the trials in params are versioned
+        params: Selected parameters (dict {data_id: param} or a list)
+        options (dict, optional): Figure options; values must be JSON-serializable or repr-stable
+        extra (optional): Anything else the figure depends on (page toggles etc.)
+
+    Returns:
+        str: Cache key
+    """
+    data_ids = list(params.keys()) if isinstance(params, dict) else list(data_frames.keys())
+    payload = {
+        'viz_type': viz_type,
+        'params': sorted((str(k), str(v)) for k, v in params.items()) if isinstance(params, dict) else list(params),
+        'versions': sorted((str(d), frame_version(data_frames.get(d))) for d in data_ids),
+        'options': options or {},
+        'extra': extra
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=repr)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+def get_figure(key):
+    """Cached figure for a key (a fresh copy), or None; updates the hit/miss counters"""
+    with _lock:
+        serialized = _cache.get(key)
+        if serialized is None:
+            _stats['misses'] += 1
+            return None
+        _cache.move_to_end(key)
+        _stats['hits'] += 1
+    return pio.from_json(serialized, skip_invalid=True)
+
+def put_figure(key, fig):
+    """Store a figure's JSON under a key, evicting least recently used entries beyond the limits"""
+    if fig is None:
+        return
+    serialized = fig.to_json()
+
+    with _lock:
+        if key in _cache:
+            _stats['bytes'] -= len(_cache.pop(key))
+        _cache[key] = serialized
+        _stats['bytes'] += len(serialized)
+
+        while _cache and (len(_cache) > FIGURE_CACHE_MAX_ENTRIES or _stats['bytes'] > FIGURE_CACHE_MAX_BYTES):
+            _, evicted = _cache.popitem(last=False)
+            _stats['bytes'] -= len(evicted)
+            _stats['evictions'] += 1
+
+def cached_figure(key, build):
+    """
+    Return the cached figure for key, building and caching it on a miss.
+
+    Args:
+        key (str): From figure_key
+        build (callable): Zero-argument function returning a plotly figure (or None)
+
+    Returns:
+        Figure or None
+    """
+    fig = get_figure(key)
+    if fig is None:
+        fig = build()
+        put_figure(key, fig)
+    return fig
+
+def cache_stats():
+    """Hit/miss/eviction counters, hit rate, entry count and bytes held"""
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_cache)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+def clear_figure_cache():
+    """Drop every cached figure (counters are kept)"""
+    with _lock:
+        _cache.clear()
+        _stats['bytes'] = 0
@@ -0,0 +1,165 @@
+import os
+import numpy as np
+
+# Seconds of ECG filtered and searched per chunk (plus a small overlap margin)
+HRV_CHUNK_SECONDS = float(os.getenv("HRV_CHUNK_SECONDS", "300"))
+
+# Lowest ECG sampling rate HRV is computed for: below ~100 Hz the QRS complex is a sample
+# or two wide, peaks cannot be located to the few ms RMSSD and pNN50 depend on
+HRV_MIN_FS = float(os.getenv("HRV_MIN_FS", "100"))
+
+# Physiological RR limits in seconds (200 bpm .. 30 bpm)
+RR_MIN_SECONDS = 0.3
+RR_MAX_SECONDS = 2.0
+
+# Order of the values in the stored metrics array
+HRV_METRICS = ["beats", "mean_hr_bpm", "mean_rr_ms", "sdnn_ms", "rmssd_ms", "pnn50_pct",
+               "lf_power", "hf_power", "lf_hf_ratio"]
+
+def _qrs_envelope(signal, fs):
+    """Band-pass to the QRS band (5-15 Hz, capped below Nyquist), square the derivative and integrate over 150 ms"""
+    high = min(15.0, 0.45 * fs)
+    if high <= 5.0:
+        filtered = signal - np.mean(signal)
+    else:
+        from scipy.signal import butter, sosfiltfilt
+        sos = butter(2, [5.0, high], btype='bandpass', fs=fs, output='sos')
+        filtered = sosfiltfilt(sos, signal)
+    width = max(1, int(0.15 * fs))
+    energy = np.convolve(np.gradient(filtered) ** 2, np.ones(width) / width, mode='same')
+    return filtered, energy
+
+def detect_r_peaks(signal, fs, chunk_seconds=None):
+    """
+    Find R-peak sample positions with a vectorized find_peaks detector.
+
+    The signal is processed in overlapping chunks so memory stays bounded on long
+    recordings. Each chunk is band-passed, turned into an energy envelope, and searched
+    with an adaptive height (35% of the envelope's 99th percentile) and a refractory distance of
+    RR_MIN_SECONDS. Peaks found in the overlap margins are kept only once.
+
+    Args:
+        signal (np.ndarray): Evenly sampled ECG
+        fs (float): Sampling rate in Hz
+        chunk_seconds (float, optional): Chunk length (defaults to HRV_CHUNK_SECONDS)
+
+    Returns:
+        np.ndarray: Sorted R-peak sample indices
+    """
+    from scipy.signal import find_peaks
+    signal = np.asarray(signal, dtype=float)
+    n = len(signal)
+    chunk = max(int((chunk_seconds or HRV_CHUNK_SECONDS) * fs), int(10 * fs))
+    margin = int(2 * fs)
+    distance = max(1, int(RR_MIN_SECONDS * fs))
+
+    peaks = []
+    for core_start in range(0, n, chunk):
+        core_end = min(n, core_start + chunk)
+        start, end = max(0, core_start - margin), min(n, core_end + margin)
+        segment = signal[start:end]
+        if len(segment) < max(distance * 2, 16):
+            continue
+
+        filtered, envelope = _qrs_envelope(segment, fs)
+        found, _ = find_peaks(envelope, height=0.35 * np.percentile(envelope, 99), distance=distance)
+
+        # Snap each envelope peak to the largest |filtered| sample within 100 ms
+        half = max(1, int(0.1 * fs))
+        offsets = np.arange(-half, half + 1)
+        windows = np.clip(found[:, None] + offsets, 0, len(segment) - 1)
+        snapped = windows[np.arange(len(found)), np.argmax(np.abs(filtered[windows]), axis=1)]
+
+        absolute = snapped + start
+        peaks.append(absolute[(absolute >= core_start) & (absolute < core_end)])
+
+    if not peaks:
+        return np.array([], dtype=int)
+    peaks = np.unique(np.concatenate(peaks))
+
+    # Chunk seams can leave two detections closer than the refractory period
+    keep = np.concatenate([[True], np.diff(peaks) >= distance])
+    return peaks[keep]
+
+def clean_rr(rr):
+    """
+    Drop physiologically implausible RR intervals and ectopic jumps (>20% from the local median).
+
+    Args:
+        rr (np.ndarray): RR intervals in seconds
+
+    Returns:
+        np.ndarray: Boolean mask of intervals to keep
+    """
+    rr = np.asarray(rr, dtype=float)
+    valid = (rr >= RR_MIN_SECONDS) & (rr <= RR_MAX_SECONDS)
+    if valid.sum() < 5:
+        return valid
+
+    # Rolling median over 5 beats via a strided view
+    padded = np.pad(rr, 2, mode='edge')
+    local_median = np.median(np.lib.stride_tricks.sliding_window_view(padded, 5), axis=1)
+    return valid & (np.abs(rr - local_median) <= 0.2 * local_median)
+
+def frequency_domain_hrv(beat_times, rr, resample_hz=4.0):
+    """
+    LF (0.04-0.15 Hz) and HF (0.15-0.4 Hz) power of the RR tachogram.
+
+    The unevenly spaced RR series is interpolated at resample_hz before a Welch PSD.
+    Needs about two minutes of clean beats; returns NaNs otherwise.
+
+    Returns:
+        tuple: (lf_power, hf_power) in ms^2
+    """
+    if len(rr) < 4 or beat_times[-1] - beat_times[0] < 120:
+        return np.nan, np.nan
+
+    from scipy.signal import welch
+    from scipy.integrate import trapezoid
+    grid = np.arange(beat_times[0], beat_times[-1], 1.0 / resample_hz)
+    tachogram = np.interp(grid, beat_times, rr * 1000.0)
+    freqs, psd = welch(tachogram - tachogram.mean(), fs=resample_hz,
+                       nperseg=min(len(grid), int(256 * resample_hz / 4)))
+
+    def band_power(low, high):
+        band = (freqs >= low) & (freqs < high)
+        return float(trapezoid(psd[band], freqs[band])) if band.sum() > 1 else np.nan
+
+    return band_power(0.04, 0.15), band_power(0.15, 0.4)
+
+def hrv_metrics(peaks, fs):
+    """
+    Standard time- and frequency-domain HRV metrics from R-peak positions.
+
+    Args:
+        peaks (np.ndarray): R-peak sample indices
+        fs (float): Sampling rate in Hz
+
+    Returns:
+        tuple: (metrics dict keyed by HRV_METRICS, beat times in s, RR intervals in s, clean mask)
+    """
+    beat_times = np.asarray(peaks, dtype=float) / fs
+    rr = np.diff(beat_times)
+    keep = clean_rr(rr)
+    clean = rr[keep]
+    clean_times = beat_times[1:][keep]
+
+    metrics = dict.fromkeys(HRV_METRICS, np.nan)
+    metrics['beats'] = float(len(peaks))
+    if len(clean) >= 2:
+        # Successive differences only between adjacent intervals that were both kept;
+        # differencing `clean` would pair intervals on either side of a dropped ectopic beat
+        successive = np.diff(rr)[keep[:-1] & keep[1:]] * 1000.0
+        metrics.update({
+            'mean_rr_ms': float(clean.mean() * 1000.0),
+            'mean_hr_bpm': float(60.0 / clean.mean()),
+            'sdnn_ms': float(clean.std(ddof=1) * 1000.0),
+            'rmssd_ms': float(np.sqrt(np.mean(successive ** 2))) if len(successive) else np.nan,
+            'pnn50_pct': float(np.mean(np.abs(successive) > 50.0) * 100.0) if len(successive) else np.nan
+        })
+
+        lf, hf = frequency_domain_hrv(clean_times, clean)
+        metrics['lf_power'], metrics['hf_power'] = lf, hf
+        metrics['lf_hf_ratio'] = lf / hf if hf and not np.isnan(hf) else np.nan
+
+    return metrics, beat_times, rr, keep
@@ -0,0 +1,282 @@
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+
+logger = logging.getLogger('ingest_metrics')
+
+# Seconds of history behind the *_rate gauges
+METRICS_RATE_WINDOW = int(os.getenv("METRICS_RATE_WINDOW", "10"))
+
+# Event-loop monitor: heartbeat period and the lag that counts as a blocked loop (seconds)
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+
+# Also run asyncio in debug mode so the slow callbacks themselves are logged (costly)
+LOOP_DEBUG = os.getenv("LOOP_DEBUG", "0") == "1"
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# All metric updates happen on the event-loop thread, so they are plain attribute updates
+# with no locks; scrapes run on the same thread and see a consistent snapshot.
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+class Counter:
+    """Monotonic counter, optionally split by one label"""
+    __slots__ = ('name', 'help', 'label', 'values')
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}
+
+    def inc(self, value=None, amount=1):
+        self.values[value] = self.values.get(value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for value, count in sorted(self.values.items(), key=lambda item: str(item[0])):
+            labels = ((self.label, value),) if self.label else ()
+            lines.append(f"{self.name}{_format_labels(labels)} {count}")
+        return lines
+
+class RateCounter(Counter):
+    """
+    Counter that also keeps per-second buckets for the last METRICS_RATE_WINDOW seconds,
+    so a `<name>_rate` gauge (events per second) is available without a Prometheus query.
+    """
+    __slots__ = ('window', 'buckets')
+
+    def __init__(self, name, help, label=None, window=None):
+        super().__init__(name, help, label)
+        self.window = window or METRICS_RATE_WINDOW
+        # {label value: [[second, count] * window]}
+        self.buckets = {}
+
+    def inc(self, value=None, amount=1):
+        self.values[value] = self.values.get(value, 0) + amount
+        second = int(time.monotonic())
+        ring = self.buckets.get(value)
+        if ring is None:
+            ring = self.buckets[value] = [[0, 0] for _ in range(self.window)]
+        slot = ring[second % self.window]
+        if slot[0] != second:
+            slot[0], slot[1] = second, 0
+        slot[1] += amount
+
+    def rate(self, value=None):
+        """Events per second over the last full window (the current second excluded)"""
+        now = int(time.monotonic())
+        ring = self.buckets.get(value, ())
+        total = sum(count for second, count in ring if now - self.window <= second < now)
+        return total / (self.window - 1) if self.window > 1 else float(total)
+
+    def render(self):
+        lines = super().render()
+        name = f"{self.name.removesuffix('_total')}_rate"
+        lines += [f"# HELP {name} {self.help} (per second, last {self.window}s)", f"# TYPE {name} gauge"]
+        for value in sorted(self.values, key=str):
+            labels = ((self.label, value),) if self.label else ()
+            lines.append(f"{name}{_format_labels(labels)} {self.rate(value):.3f}")
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time, so the hot path never touches it"""
+    __slots__ = ('name', 'help', 'read', 'type')
+
+    def __init__(self, name, help, read, type="gauge"):
+        self.name = name
+        self.help = help
+        # read() -> number, or -> {label tuple: number}
+        self.read = read
+        # "counter" for totals kept elsewhere and only read here
+        self.type = type
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.debug(f"Gauge {self.name} unavailable: {e}")
+            return lines
+        if isinstance(value, dict):
+            for labels, number in value.items():
+                lines.append(f"{self.name}{_format_labels(labels)} {number}")
+        elif value is not None:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisection and three increments"""
+    __slots__ = ('name', 'help', 'bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum:.6f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+class TimedAcquire:
+    """pool.acquire() wrapper that records the wait and how many callers are waiting"""
+    __slots__ = ('metrics', 'context', 'started')
+
+    def __init__(self, metrics, pool):
+        self.metrics = metrics
+        self.context = pool.acquire()
+        self.started = 0.0
+
+    async def __aenter__(self):
+        self.started = time.perf_counter()
+        self.metrics.acquire_waiting += 1
+        try:
+            return await self.context.__aenter__()
+        finally:
+            self.metrics.acquire_waiting -= 1
+            self.metrics.acquire_wait.observe(time.perf_counter() - self.started)
+
+    async def __aexit__(self, *exc_info):
+        return await self.context.__aexit__(*exc_info)
+
+class LoopMonitor:
+    """
+    Detects event-loop blocking with a heartbeat task.
+
+    The task sleeps LOOP_MONITOR_INTERVAL and measures how late it wakes up; lateness
+    beyond LOOP_BLOCK_THRESHOLD means some callback held the loop that long. With
+    LOOP_DEBUG=1 asyncio's debug mode is also enabled so the slow callbacks are named
+    in the log.
+    """
+
+    def __init__(self, interval=None, threshold=None):
+        self.interval = interval or LOOP_MONITOR_INTERVAL
+        self.threshold = threshold or LOOP_BLOCK_THRESHOLD
+        self.lag = Histogram("ingest_event_loop_lag_seconds", "Event-loop wake-up lateness of the heartbeat task")
+        self.blocks = Counter("ingest_event_loop_blocked_total", "Heartbeats late by more than the block threshold")
+        self.max_lag = 0.0
+        self._task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self.blocks.inc()
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def start(self):
+        if self._task is None:
+            loop = asyncio.get_running_loop()
+            if LOOP_DEBUG:
+                loop.set_debug(True)
+                loop.slow_callback_duration = self.threshold
+            self._task = loop.create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+class IngestMetrics:
+    """
+    Metrics of the websocket ingest server, rendered in the Prometheus text format.
+
+    Gauges (connections, pool, queue depths) are bound to callbacks with bind_* and read
+    only when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self.frames = RateCounter("ingest_frames_total", "Frames by outcome", label="result")
+        self.receive_to_ack = Histogram("ingest_receive_to_ack_seconds", "Frame received until acknowledgement sent")
+        self.db_insert = Histogram("ingest_db_insert_seconds", "Database statements for one frame")
+        self.acquire_wait = Histogram("ingest_pool_acquire_wait_seconds", "Wait for a pooled connection")
+        self.acquire_waiting = 0
+        self.loop = LoopMonitor()
+        self.gauges = [
+            Gauge("ingest_pool_acquire_waiters", "Callers waiting for a pooled connection", lambda: self.acquire_waiting)
+        ]
+        self.started_at = time.time()
+
+    def acquire(self, pool):
+        """Use as `async with metrics.acquire(pool) as conn` to time the acquire"""
+        return TimedAcquire(self, pool)
+
+    def bind_connections(self, connections):
+        self.gauges.append(Gauge("ingest_active_connections", "Open device websocket connections",
+                                 lambda: len(connections)))
+
+    def bind_pool(self, pool):
+        """asyncpg pool size, idle connections and bounds"""
+        self.gauges += [
+            Gauge("ingest_pool_size", "Open pooled connections", pool.get_size),
+            Gauge("ingest_pool_idle", "Idle pooled connections", pool.get_idle_size),
+            Gauge("ingest_pool_max_size", "Pool size limit", pool.get_max_size),
+        ]
+
+    def bind_queues(self, writers):
+        """Rows buffered in each BatchWriter ({label: writer or None})"""
+        self.gauges.append(Gauge(
+            "ingest_queue_depth", "Rows buffered for the next batch write",
+            lambda: {(("queue", name),): len(writer.buffer) for name, writer in writers().items() if writer is not None}
+        ))
+
+    def bind_workloads(self, stats):
+        """Per-class admission counters and pool sizes, from stats() -> {class: {counter: value}}"""
+        def read(key):
+            return lambda: {(("workload", name),): entry[key] for name, entry in stats().items() if key in entry}
+
+        self.gauges += [
+            Gauge("db_workload_active", "Connections held per workload class", read('active')),
+            Gauge("db_workload_waiting", "Callers waiting for admission per workload class", read('waiting')),
+            Gauge("db_workload_admitted_total", "Admissions per workload class", read('admitted'), type="counter"),
+            Gauge("db_workload_rejected_total", "Admission timeouts per workload class", read('rejected'), type="counter"),
+            Gauge("db_workload_statement_timeouts_total", "Statements cancelled by statement_timeout",
+                  read('statement_timeouts'), type="counter"),
+            Gauge("db_workload_max_wait_seconds", "Longest admission wait per workload class",
+                  lambda: {(("workload", name),): entry['max_wait_ms'] / 1000 for name, entry in stats().items()}),
+            Gauge("db_workload_pool_size", "Open async pool connections per workload class", read('async_pool_size')),
+            Gauge("db_workload_pool_idle", "Idle async pool connections per workload class", read('async_pool_idle')),
+        ]
+
+    def render(self):
+        lines = []
+        for metric in (self.frames, self.receive_to_ack, self.db_insert, self.acquire_wait,
+                       self.loop.lag, self.loop.blocks, *self.gauges):
+            lines += metric.render()
+        lines += [
+            "# HELP ingest_event_loop_max_lag_seconds Largest heartbeat lateness since start",
+            "# TYPE ingest_event_loop_max_lag_seconds gauge",
+            f"ingest_event_loop_max_lag_seconds {self.loop.max_lag:.6f}",
+            "# HELP ingest_uptime_seconds Seconds since the server started",
+            "# TYPE ingest_uptime_seconds gauge",
+            f"ingest_uptime_seconds {time.time() - self.started_at:.0f}",
+        ]
+        return "\n".join(lines) + "\n"
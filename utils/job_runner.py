@@ -0,0 +1,160 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Worker processes for analysis jobs (defaults to one per core)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 2)))
+
+# Finished jobs kept around so identical requests on later reruns are served instantly
+MAX_FINISHED_JOBS = int(os.getenv("MAX_FINISHED_JOBS", "64"))
+
+# 'spawn' keeps workers clear of the threads Streamlit runs in the parent
+ANALYSIS_START_METHOD = os.getenv("ANALYSIS_START_METHOD", "spawn")
+
+_executor = None
+_jobs = {}
+_lock = threading.Lock()
+
+class Job:
+    """A group of analysis tasks submitted together and tracked as one unit"""
+
+    def __init__(self, job_id, label, futures):
+        self.job_id = job_id
+        self.label = label
+        self.futures = futures
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return all(future.done() for future in self.futures.values())
+
+    @property
+    def progress(self):
+        """Fraction of tasks finished, in [0, 1]"""
+        if not self.futures:
+            return 1.0
+        return sum(future.done() for future in self.futures.values()) / len(self.futures)
+
+    @property
+    def error(self):
+        """First task exception, if any task failed"""
+        for future in self.futures.values():
+            if future.done() and not future.cancelled() and future.exception() is not None:
+                return future.exception()
+        return None
+
+    @property
+    def status(self):
+        """'running', 'failed' or 'done'"""
+        if not self.done:
+            return 'running'
+        if self.finished_at is None:
+            self.finished_at = time.time()
+        return 'failed' if self.error is not None or any(f.cancelled() for f in self.futures.values()) else 'done'
+
+    def results(self):
+        """
+        Task results keyed by task key (call once status is 'done').
+
+        Returns:
+            dict: {task_key: result}
+        """
+        return {key: future.result() for key, future in self.futures.items()}
+
+def _get_executor():
+    """Create the shared process pool on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, ANALYSIS_WORKERS),
+            mp_context=multiprocessing.get_context(ANALYSIS_START_METHOD)
+        )
+    return _executor
+
+def _reset_executor():
+    """
+    Drop a pool broken by a worker dying (OOM kill, segfault); the next _get_executor
+    starts a fresh one. Futures of the broken pool have already failed. Caller holds the lock.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _submit_all(tasks):
+    executor = _get_executor()
+    return {
+        task_key: executor.submit(function, *args, **(kwargs or {}))
+        for task_key, (function, args, kwargs) in tasks.items()
+    }
+
+def job_key(*parts):
+    """Deterministic job id from anything that identifies the work (inputs, options, ...)"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+def _prune_finished():
+    """Drop the oldest finished jobs beyond MAX_FINISHED_JOBS (caller holds the lock)"""
+    finished = [job for job in _jobs.values() if job.done]
+    finished.sort(key=lambda job: job.submitted_at)
+    for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        _jobs.pop(job.job_id, None)
+
+def submit_job(label, tasks, job_id=None):
+    """
+    Queue a group of tasks on the process pool, reusing an identical job if one exists.
+
+    Args:
+        label (str): Human-readable job description
+        tasks (dict): {task_key: (function, args, kwargs)}; functions and arguments must be
+                      picklable (module-level functions, dataframes, plain values)
+        job_id (str, optional): Identity of the work (see job_key); a random id is used if omitted,
+                                which disables de-duplication
+
+    Returns:
+        str: Job id to poll with get_job
+    """
+    job_id = job_id or uuid.uuid4().hex[:16]
+
+    with _lock:
+        existing = _jobs.get(job_id)
+        if existing is not None and existing.status != 'failed':
+            return job_id
+
+        try:
+            futures = _submit_all(tasks)
+        except BrokenProcessPool:
+            print("[WARN] Analysis worker pool was broken (a worker died); restarting it")
+            _reset_executor()
+            futures = _submit_all(tasks)
+        _jobs[job_id] = Job(job_id, label, futures)
+        _prune_finished()
+
+    return job_id
+
+def get_job(job_id):
+    """Look up a job by id (None if unknown or pruned)"""
+    with _lock:
+        return _jobs.get(job_id)
+
+def cancel_job(job_id):
+    """Cancel the job's tasks that have not started yet and forget it"""
+    with _lock:
+        job = _jobs.pop(job_id, None)
+    if job is not None:
+        for future in job.futures.values():
+            future.cancel()
+
+def list_jobs():
+    """Snapshot of all tracked jobs, newest first"""
+    with _lock:
+        return sorted(_jobs.values(), key=lambda job: job.submitted_at, reverse=True)
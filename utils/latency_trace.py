@@ -0,0 +1,152 @@
+import os
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from utils.batch_writer import BatchWriter
+
+# Seconds of samples aggregated into one latency_metrics row per (source, stage)
+LATENCY_WINDOW_SECONDS = float(os.getenv("LATENCY_WINDOW_SECONDS", "60"))
+
+# Samples kept per stage and window (reservoir) for the percentiles
+LATENCY_RESERVOIR = int(os.getenv("LATENCY_RESERVOIR", "2048"))
+
+# Stages of a reading's trip from the sensor to the screen, in order
+STAGES = ["device_to_receive", "receive_to_commit", "commit_to_render", "device_to_render"]
+
+# Reading timestamp columns on databases created before they existed. ALTER TABLE locks
+# the table, so this runs once at ingest startup rather than with every metrics write.
+LATENCY_COLUMNS_SCHEMA = """
+ALTER TABLE live_patient_data ADD COLUMN IF NOT EXISTS device_time TIMESTAMP WITH TIME ZONE;
+ALTER TABLE live_patient_data ADD COLUMN IF NOT EXISTS received_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE latest_reading ADD COLUMN IF NOT EXISTS device_time TIMESTAMP WITH TIME ZONE;
+ALTER TABLE latest_reading ADD COLUMN IF NOT EXISTS received_at TIMESTAMP WITH TIME ZONE;
+"""
+
+LATENCY_METRICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS latency_metrics (
+    id BIGSERIAL PRIMARY KEY,
+    window_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    window_seconds DOUBLE PRECISION NOT NULL,
+    source TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    mean_ms DOUBLE PRECISION NOT NULL,
+    p50_ms DOUBLE PRECISION NOT NULL,
+    p95_ms DOUBLE PRECISION NOT NULL,
+    max_ms DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_latency_metrics_window ON latency_metrics(window_start DESC);
+"""
+
+LATENCY_SCHEMA = LATENCY_COLUMNS_SCHEMA + LATENCY_METRICS_SCHEMA
+
+LATENCY_INSERT = """
+    INSERT INTO latency_metrics (window_start, window_seconds, source, stage, samples, mean_ms, p50_ms, p95_ms, max_ms)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+"""
+
+def parse_device_time(value):
+    """
+    Device timestamp as an aware UTC datetime.
+
+    Accepts ISO 8601 strings and epoch seconds (or milliseconds). Naive times are taken
+    as the receiving host's local time, which is what the simulator used to send.
+
+    Returns:
+        datetime or None: None if the value is missing or unreadable
+    """
+    if value is None:
+        return None
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            seconds = value / 1000.0 if value > 1e11 else float(value)
+            return datetime.fromtimestamp(seconds, timezone.utc)
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        return (parsed.astimezone() if parsed.tzinfo is None else parsed).astimezone(timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+def elapsed_ms(start, end):
+    """Milliseconds between two aware datetimes, or None if either is missing"""
+    if start is None or end is None:
+        return None
+    return (end - start).total_seconds() * 1000.0
+
+class LatencyAggregator:
+    """
+    Per-stage latency samples of one process, summarized once per window.
+
+    add() is O(1): a count, a sum, a max and a bounded reservoir for the percentiles.
+    Streamlit sessions share an aggregator from several threads, so updates take a lock.
+    """
+
+    def __init__(self, source, window_seconds=None, reservoir=None):
+        self.source = source
+        self.window_seconds = window_seconds or LATENCY_WINDOW_SECONDS
+        self.reservoir = reservoir or LATENCY_RESERVOIR
+        self.lock = threading.Lock()
+        self._reset(time.time())
+
+    def _reset(self, now):
+        self.window_start = now
+        # {stage: [count, sum, max, samples]}
+        self.stats = {}
+
+    def add(self, stage, ms):
+        if ms is None:
+            return
+        with self.lock:
+            if not self.stats:
+                # First sample after an idle spell opens a fresh window
+                self.window_start = time.time()
+            entry = self.stats.get(stage)
+            if entry is None:
+                entry = self.stats[stage] = [0, 0.0, ms, []]
+            entry[0] += 1
+            entry[1] += ms
+            entry[2] = max(entry[2], ms)
+            samples = entry[3]
+            if len(samples) < self.reservoir:
+                samples.append(ms)
+            else:
+                slot = random.randrange(entry[0])
+                if slot < self.reservoir:
+                    samples[slot] = ms
+
+    def drain(self, force=False):
+        """
+        Summary rows for the finished window, or [] while it is still open.
+
+        Returns:
+            list: (window_start, window_seconds, source, stage, samples, mean_ms, p50_ms, p95_ms, max_ms)
+        """
+        now = time.time()
+        with self.lock:
+            if not self.stats or (not force and now - self.window_start < self.window_seconds):
+                return []
+            stats, start = self.stats, self.window_start
+            self._reset(now)
+
+        rows = []
+        window_start = datetime.fromtimestamp(start, timezone.utc)
+        for stage, (count, total, peak, samples) in stats.items():
+            ordered = sorted(samples)
+            rows.append((
+                window_start, now - start, self.source, stage, count, total / count,
+                ordered[int(0.5 * (len(ordered) - 1))], ordered[int(0.95 * (len(ordered) - 1))], peak
+            ))
+        return rows
+
+class LatencyWriter(BatchWriter):
+    """Writes drained LatencyAggregator windows to latency_metrics from the ingest loop"""
+
+    def __init__(self, pool, aggregator):
+        super().__init__(pool, LATENCY_METRICS_SCHEMA, LATENCY_INSERT, batch_size=100,
+                         flush_interval=max(1.0, LATENCY_WINDOW_SECONDS / 4), name='latency metrics')
+        self.aggregator = aggregator
+
+    def collect(self):
+        """Housekeeping hook: queue the aggregator's finished window"""
+        self.add(self.aggregator.drain())
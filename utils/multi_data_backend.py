@@ -6,16 +6,27 @@ from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
 from backend_patient_info import get_data_instance, get_db_connection
-from scipy import stats
-from scipy.signal import find_peaks
-import statsmodels.api as sm
-from statsmodels.nonparametric.smoothers_lowess import lowess
-from plotly.subplots import make_subplots
+from utils.trend_engine import compute_trend, choose_trend_method
+from utils.time_alignment import align_time_series, aligned_to_frame
+from utils.trial_moments import (
+    load_trial_moments, fill_missing_moments, merge_moments, pooled_statistics, get_parameter_columns,
+)
+from utils.quantile_sketch import merged_sketches
+from utils.analytics_store import cached_analysis, save_result, series_fingerprint
+from utils.job_runner import job_key
+from utils.plot_budget import budget_trace, trace_budget, PLOT_POINT_BUDGET
+from utils.figure_cache import figure_key, cached_figure
+from utils.spectral import uniform_signal, chunked_spectrogram
+from utils.hrv import detect_r_peaks, hrv_metrics, HRV_METRICS, HRV_MIN_FS
+from utils.dtw import dtw, warp_onto_reference
+
+# scipy and plotly.subplots are imported in the functions that use them, so pages that
+# import this module for its loaders don't pay for the analytics stack until it's used.
 
 # Functions extracted from Admin_multi_data.py
 def get_patient_data_ids(patient_id):
     """Get all data IDs for a specific patient"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT data_id, created_at 
@@ -30,7 +41,7 @@ def get_patient_data_ids(patient_id):
 
 def get_all_patients():
     """Get all patients"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("""
         SELECT patient_id, username 
@@ -213,88 +224,133 @@ def merge_time_series(data_frames, value_columns, timestamp_columns, method='int
     """
     Merge multiple time series dataframes into a single dataframe.
     
+    All series are sampled onto one common time grid in a single vectorized pass
+    (see utils.time_alignment), so cost grows linearly with the number of datasets.
+    
     Args:
         data_frames (dict): Dictionary of dataframes to merge {data_id: dataframe}
         value_columns (dict): Dictionary of value column names for each dataframe {data_id: column_name}
         timestamp_columns (dict): Dictionary of timestamp column names for each dataframe {data_id: column_name}
-        method (str): Resampling method ('interpolate', 'ffill', 'nearest')
+        method (str): Resampling method ('interpolate', 'ffill', 'nearest', 'mean')
         freq (str): Frequency for resampling
     
     Returns:
         pd.DataFrame: Merged dataframe with aligned timestamps
     """
-    # Create a list to store resampled dataframes
-    resampled_dfs = []
-    
-    # Process each dataframe
-    for data_id, df in data_frames.items():
-        if (data_id in timestamp_columns and timestamp_columns[data_id] in df.columns and 
-            data_id in value_columns and value_columns[data_id] in df.columns):
-            
-            ts_col = timestamp_columns[data_id]
-            val_col = value_columns[data_id]
-            
-            # Create a copy and ensure timestamp is datetime
-            df_copy = df.copy()
-            if not pd.api.types.is_datetime64_any_dtype(df_copy[ts_col]):
-                try:
-                    df_copy[ts_col] = pd.to_datetime(df_copy[ts_col], errors='coerce')
-                except:
-                    continue
-            
-            # Drop rows with invalid timestamps
-            df_copy = df_copy.dropna(subset=[ts_col])
-            
-            if not df_copy.empty:
-                # Set timestamp as index
-                df_copy = df_copy.set_index(ts_col)
-                
-                # Resample to the specified frequency
-                resampled = df_copy[val_col].resample(freq)
-                
-                # Apply the specified method
-                if method == 'interpolate':
-                    resampled = resampled.interpolate(method='time')
-                elif method == 'ffill':
-                    resampled = resampled.ffill()
-                elif method == 'nearest':
-                    resampled = resampled.nearest()
-                else:
-                    resampled = resampled.mean()
-                
-                # Reset index to get timestamp as a column again
-                resampled = resampled.reset_index()
-                
-                # Rename columns for clarity
-                resampled.columns = [ts_col, f"{val_col}_{data_id}"]
-                
-                resampled_dfs.append(resampled)
+    grid, values, columns, tz = align_time_series(
+        data_frames, value_columns, timestamp_columns, method=method, freq=freq
+    )
     
     # If no valid dataframes, return empty dataframe
-    if not resampled_dfs:
+    if grid is None:
         return pd.DataFrame()
     
-    # Merge all resampled dataframes on timestamp
-    result = resampled_dfs[0]
-    for i in range(1, len(resampled_dfs)):
-        result = pd.merge_asof(
-            result.sort_values(resampled_dfs[0].columns[0]),
-            resampled_dfs[i].sort_values(resampled_dfs[i].columns[0]),
-            left_on=resampled_dfs[0].columns[0],
-            right_on=resampled_dfs[i].columns[0],
-            direction='nearest'
-        )
+    # Name the shared timestamp column after the first dataset's timestamp column
+    first_id = columns[0][0]
+    return aligned_to_frame(grid, values, columns, timestamp_columns[first_id], tz)
+
+def dtw_align(ref_df, ref_param, df, param, ref_timestamp_col=None, timestamp_col=None,
+              band=0.1, mode='auto', normalize=True):
+    """
+    Align one trial's parameter to a reference trial with dynamic time warping
     
-    return result
+    Both series are first put on an even grid at their own sampling rate, so trials
+    recorded at different rates or with jitter still compare sample-to-sample in time.
+    
+    Args:
+        ref_df (pd.DataFrame): Reference trial
+        ref_param (str): Reference column
+        df (pd.DataFrame): Trial to warp
+        param (str): Column to warp
+        ref_timestamp_col (str, optional): Reference timestamp column
+        timestamp_col (str, optional): Timestamp column of the warped trial
+        band (float): Sakoe-Chiba half-width as a fraction of the series length
+        mode (str): 'auto', 'exact' or 'multiscale' (downsample then refine)
+        normalize (bool): Z-normalize both series so offsets and scale don't dominate the distance
+    
+    Returns:
+        dict: {'ref_time' (s), 'reference', 'warped' (on the reference time axis), 'time' (s), 'original',
+               'distance', 'normalized_distance' (per path step), 'path_i', 'path_j'} or None
+    """
+    if ref_param not in ref_df.columns or param not in df.columns:
+        return None
+    
+    x, fs_x, _ = uniform_signal(ref_df, ref_param, ref_timestamp_col)
+    y, fs_y, _ = uniform_signal(df, param, timestamp_col)
+    if len(x) < 2 or len(y) < 2:
+        return None
+    
+    if normalize:
+        x = _standardize_series(x)
+        y = _standardize_series(y)
+        if x is None or y is None:
+            return None
+    
+    result = dtw(x, y, band=band, mode=mode)
+    return {
+        'ref_time': np.arange(len(result['x'])) * result['x_step'] / fs_x,
+        'reference': result['x'],
+        'warped': warp_onto_reference(result),
+        'time': np.arange(len(result['y'])) * result['y_step'] / fs_y,
+        'original': result['y'],
+        'distance': result['distance'],
+        'normalized_distance': result['distance'] / len(result['path_i']),
+        'path_i': result['path_i'],
+        'path_j': result['path_j']
+    }
+
+# Defaults of the Advanced Visualization controls; precompute_default_analyses stores these
+DEFAULT_TREND_WINDOW = 10
+DEFAULT_OUTLIER_METHOD = 'zscore'
+DEFAULT_OUTLIER_THRESHOLD = 3.0
 
 # Advanced visualization functions
-def create_fft_analysis(df, param):
+def _fft_result(signal):
+    """FFT magnitude spectrum and its peaks as storable arrays"""
+    n = len(signal)
+    fft_result = np.fft.rfft(signal)
+    fft_freq = np.fft.rfftfreq(n, 1)  # Assuming unit time steps
+    fft_magnitude = np.abs(fft_result)
+    
+    # Find peaks
+    from scipy.signal import find_peaks
+    peaks, _ = find_peaks(fft_magnitude, height=np.max(fft_magnitude)/10)
+    
+    return {'freqs': fft_freq, 'magnitudes': fft_magnitude, 'peaks': peaks}
+
+def _trend_options(y, window, method):
+    """Store key for a trend run; 'auto' is resolved so changing the size cutoff changes the key"""
+    return {
+        **series_fingerprint(y),
+        'window': window,
+        'method': choose_trend_method(len(y), method)
+    }
+
+def _outlier_result(data, method, threshold):
+    """Positions (within the non-null values) of the outliers as a storable array"""
+    if method == 'zscore':
+        from scipy import stats
+        outliers = np.abs(stats.zscore(data.values)) > threshold
+    elif method == 'iqr':
+        q1 = data.quantile(0.25)
+        q3 = data.quantile(0.75)
+        iqr = q3 - q1
+        lower_bound = q1 - threshold * iqr
+        upper_bound = q3 + threshold * iqr
+        outliers = ((data < lower_bound) | (data > upper_bound)).values
+    else:
+        outliers = np.zeros(len(data), dtype=bool)
+    
+    return {'positions': np.flatnonzero(outliers)}
+
+def create_fft_analysis(df, param, data_id=None):
     """
     Perform Fast Fourier Transform analysis on a parameter
     
     Args:
         df (pd.DataFrame): DataFrame containing the data
         param (str): Column name of the parameter to analyze
+        data_id (optional): Trial id; when given, stored results are reused
     
     Returns:
         tuple: (frequencies, magnitudes, peaks)
@@ -308,25 +364,135 @@ def create_fft_analysis(df, param):
     if len(signal) < 4:  # Need at least a few points for FFT
         return None, None, None
     
-    # Compute FFT
-    n = len(signal)
-    fft_result = np.fft.rfft(signal)
-    fft_freq = np.fft.rfftfreq(n, 1)  # Assuming unit time steps
-    fft_magnitude = np.abs(fft_result)
+    result = cached_analysis(data_id, param, 'fft', series_fingerprint(signal), lambda: _fft_result(signal))
+    return result['freqs'], result['magnitudes'], result['peaks']
+
+def _default_timestamp_column(df):
+    """'timestamps' if present, otherwise the first column that parses as datetimes"""
+    if 'timestamps' in df.columns:
+        return 'timestamps'
+    datetime_cols = get_datetime_columns(df)
+    return datetime_cols[0] if datetime_cols else None
+
+def create_spectrogram_analysis(df, param, timestamp_col=None, window_seconds=None, overlap=0.5):
+    """
+    Time-localized spectrum of a parameter at its real sampling rate
     
-    # Find peaks
-    peaks, _ = find_peaks(fft_magnitude, height=np.max(fft_magnitude)/10)
+    Args:
+        df (pd.DataFrame): DataFrame containing the data
+        param (str): Column name of the parameter to analyze
+        timestamp_col (str, optional): Timestamp column used to derive the sampling rate
+                                       (defaults to 'timestamps' or the first datetime column)
+        window_seconds (float, optional): Window length in seconds (defaults to 256 samples)
+        overlap (float): Fraction of each window shared with the next
+    
+    Returns:
+        dict: Spectrogram/Welch result from chunked_spectrogram, or None
+    """
+    if param not in df.columns:
+        return None
+    
+    signal, fs, _ = uniform_signal(df, param, timestamp_col or _default_timestamp_column(df))
+    if len(signal) < 16:
+        return None
     
-    return fft_freq, fft_magnitude, peaks
+    nperseg = int(round(window_seconds * fs)) if window_seconds else 256
+    nperseg = max(8, min(nperseg, len(signal)))
+    return chunked_spectrogram(signal, fs, nperseg=nperseg, noverlap=int(nperseg * overlap))
+
+def _hrv_result(signal, fs):
+    """R-peaks, RR intervals and HRV metrics of one evenly sampled ECG as storable arrays"""
+    metrics, beat_times, rr, clean = hrv_metrics(detect_r_peaks(signal, fs), fs)
+    return {
+        'metrics': np.array([metrics[name] for name in HRV_METRICS], dtype=float),
+        'beat_times': beat_times,
+        'rr': rr,
+        'clean': clean
+    }
 
-def create_trend_analysis(df, param, window=None):
+def create_hrv_analysis(df, param, timestamp_col=None, data_id=None):
     """
-    Perform trend analysis using LOWESS smoothing
+    R-peak detection and heart-rate-variability metrics for an ECG parameter
+    
+    Args:
+        df (pd.DataFrame): DataFrame containing the data
+        param (str): ECG column
+        timestamp_col (str, optional): Timestamp column used to derive the sampling rate
+                                       (defaults to 'timestamps' or the first datetime column)
+        data_id (optional): Trial id; when given, stored results are reused
+    
+    Returns:
+        dict: {'metrics': {name: value}, 'beat_times' (s), 'rr' (s), 'clean' (mask over rr), 'fs'}
+              or None if there is too little signal or it is sampled below HRV_MIN_FS
+    """
+    if param not in df.columns:
+        return None
+    
+    signal, fs, _ = uniform_signal(df, param, timestamp_col or _default_timestamp_column(df))
+    if fs < HRV_MIN_FS:
+        print(f"HRV needs ECG sampled at {HRV_MIN_FS:.0f} Hz or more; {param} is at {fs:.1f} Hz")
+        return None
+    if len(signal) < 4 * fs:  # Need a few beats
+        return None
+    
+    options = {**series_fingerprint(signal), 'fs': round(float(fs), 6)}
+    result = cached_analysis(data_id, param, 'hrv', options, lambda: _hrv_result(signal, fs))
+    return {
+        'metrics': dict(zip(HRV_METRICS, result['metrics'].tolist())),
+        'beat_times': result['beat_times'],
+        'rr': result['rr'],
+        'clean': result['clean'].astype(bool),
+        'fs': fs
+    }
+
+def _archive_hrv(data_id, param):
+    """Load one trial and run its HRV analysis (runs in a worker; only the id is shipped)"""
+    df = load_data(data_id)
+    if df is None:
+        return None
+    return create_hrv_analysis(df, param, data_id=data_id)
+
+def hrv_archive_tasks(data_ids, param='ecg_voltage'):
+    """
+    Background tasks running the HRV analysis over many stored trials in parallel.
+    
+    Each worker loads its own trial, so nothing large is pickled, and every result
+    lands in the analytics store for later views.
+    
+    Args:
+        data_ids (list): Trials to analyse
+        param (str): ECG column
+    
+    Returns:
+        tuple: (tasks {('hrv', data_id): (function, args, kwargs)}, job id)
+    """
+    tasks = {('hrv', data_id): (_archive_hrv, (data_id, param), {}) for data_id in data_ids}
+    return tasks, job_key('hrv_archive', param, sorted(map(str, data_ids)))
+
+def hrv_summary_frame(results):
+    """
+    One row of HRV metrics per trial.
+    
+    Args:
+        results (dict): {data_id: create_hrv_analysis result (or None)}
+    
+    Returns:
+        pd.DataFrame: Indexed by data_id, one column per HRV metric
+    """
+    rows = {data_id: result['metrics'] for data_id, result in results.items() if result is not None}
+    return pd.DataFrame.from_dict(rows, orient='index', columns=HRV_METRICS).rename_axis('data_id')
+
+def create_trend_analysis(df, param, window=None, method='auto', data_id=None):
+    """
+    Perform trend analysis, picking the smoothing algorithm by series size
     
     Args:
         df (pd.DataFrame): DataFrame containing the data
         param (str): Column name of the parameter to analyze
         window (int, optional): Window size for smoothing
+        method (str): 'auto' (exact LOWESS for small series, binned for large),
+                      'lowess', 'binned_lowess', 'savgol' or 'ema'
+        data_id (optional): Trial id; when given, stored results are reused
     
     Returns:
         tuple: (x_values, trend_values)
@@ -343,21 +509,17 @@ def create_trend_analysis(df, param, window=None):
     x = np.arange(len(data))
     y = data.values
     
-    # Determine window size if not provided
-    if window is None:
-        window = max(3, len(data) // 5)
-    
-    # Calculate fraction for LOWESS
-    frac = min(1.0, max(0.1, window / len(data)))
-    
-    # Perform LOWESS smoothing
+    # Perform smoothing
     try:
-        trend = lowess(y, x, frac=frac, it=1, return_sorted=False)
-        return x, trend
+        result = cached_analysis(
+            data_id, param, 'trend', _trend_options(y, window, method),
+            lambda: {'trend': compute_trend(y, x, window=window, method=method)[0]}
+        )
+        return x, result['trend']
     except:
         return None, None
 
-def detect_outliers(df, param, method='zscore', threshold=3.0):
+def detect_outliers(df, param, method='zscore', threshold=3.0, data_id=None):
     """
     Detect outliers in a parameter
     
@@ -366,6 +528,7 @@ def detect_outliers(df, param, method='zscore', threshold=3.0):
         param (str): Column name of the parameter to analyze
         method (str): Method for outlier detection ('zscore', 'iqr')
         threshold (float): Threshold for outlier detection
+        data_id (optional): Trial id; when given, stored results are reused
     
     Returns:
         pd.Series: Boolean series indicating outliers
@@ -378,71 +541,298 @@ def detect_outliers(df, param, method='zscore', threshold=3.0):
     if len(data) < 4:  # Need at least a few points for outlier detection
         return pd.Series(False, index=df.index)
     
-    outliers = pd.Series(False, index=data.index)
-    
-    if method == 'zscore':
-        z_scores = np.abs(stats.zscore(data))
-        outliers = z_scores > threshold
-    elif method == 'iqr':
-        q1 = data.quantile(0.25)
-        q3 = data.quantile(0.75)
-        iqr = q3 - q1
-        lower_bound = q1 - threshold * iqr
-        upper_bound = q3 + threshold * iqr
-        outliers = (data < lower_bound) | (data > upper_bound)
+    options = {**series_fingerprint(data.values), 'method': method, 'threshold': float(threshold)}
+    result = cached_analysis(data_id, param, 'outliers', options, lambda: _outlier_result(data, method, threshold))
     
     # Extend to full dataframe index
     full_outliers = pd.Series(False, index=df.index)
-    full_outliers[outliers.index] = outliers
+    full_outliers[data.index[result['positions']]] = True
     
     return full_outliers
 
-def calculate_cross_correlation(df1, param1, df2, param2, max_lag=None):
+def precompute_default_analyses(cursor, data_id, df):
     """
-    Calculate cross-correlation between two parameters
+    Store FFT, default trend and default outliers for every parameter (and HRV for ECG
+    columns) of a freshly saved trial, so the first Advanced Visualization view of it is a lookup.
     
+    Args:
+        cursor: psycopg2 cursor of the finalization transaction (caller commits)
+        data_id (int): The new patient_data row
+        df (pd.DataFrame): The trial data
+    """
+    for param in get_parameter_columns(df):
+        data = pd.to_numeric(df[param], errors='coerce').dropna()
+        if len(data) < 4:
+            continue
+        y = data.values
+        
+        save_result(data_id, param, 'fft', series_fingerprint(y), _fft_result(y), cursor=cursor)
+        
+        trend, _ = compute_trend(y, np.arange(len(y)), window=DEFAULT_TREND_WINDOW, method='auto')
+        save_result(data_id, param, 'trend', _trend_options(y, DEFAULT_TREND_WINDOW, 'auto'),
+                    {'trend': trend}, cursor=cursor)
+        
+        outlier_options = {
+            **series_fingerprint(y),
+            'method': DEFAULT_OUTLIER_METHOD,
+            'threshold': float(DEFAULT_OUTLIER_THRESHOLD)
+        }
+        save_result(data_id, param, 'outliers', outlier_options,
+                    _outlier_result(data, DEFAULT_OUTLIER_METHOD, DEFAULT_OUTLIER_THRESHOLD), cursor=cursor)
+        
+        if 'ecg' in param.lower():
+            signal, fs, _ = uniform_signal(df, param, _default_timestamp_column(df))
+            if fs >= HRV_MIN_FS and len(signal) >= 4 * fs:
+                save_result(data_id, param, 'hrv', {**series_fingerprint(signal), 'fs': round(float(fs), 6)},
+                            _hrv_result(signal, fs), cursor=cursor)
+
+def _standardize_series(values):
+    """Demean and scale a 1-D array to unit standard deviation (None if constant)"""
+    values = np.asarray(values, dtype=float)
+    std = np.std(values)
+    if not np.isfinite(std) or std == 0:
+        return None
+    return (values - np.mean(values)) / std
+
+def _resolve_max_lag(max_lag, len1, len2):
+    """
+    Clamp the requested max lag to half the shorter series, so every lag keeps at
+    least half of it overlapping (shorter overlaps give noisy, meaningless peaks)
+    """
+    limit = min(len1, len2) // 2
+    if max_lag is None:
+        max_lag = limit
+    return int(max(0, min(int(max_lag), limit)))
+
+def _overlap_counts(lags, len1, len2):
+    """Number of overlapping samples between series 1 shifted by each lag and series 2"""
+    return np.minimum(len2, len1 - lags) - np.maximum(0, -lags)
+
+def _prefix_sums(values):
+    """Cumulative sums of values and values**2 with a leading zero, for O(1) window moments"""
+    values = np.asarray(values, dtype=float)
+    return (np.concatenate(([0.0], np.cumsum(values))),
+            np.concatenate(([0.0], np.cumsum(values * values))))
+
+def _xcorr_from_spectra(spec1, spec2, sums1, sums2, nfft, max_lag):
+    """
+    Turn two precomputed spectra into a Pearson cross-correlation curve.
+
+    The value at lag k is the Pearson correlation of x1[n + k] and x2[n] over the
+    samples that overlap at that lag: the FFT gives the sum of products, and the
+    prefix sums give each overlap's own mean and variance, so every value is in
+    [-1, 1]. Lags where either overlap is constant get 0.
+
+    Args:
+        spec1, spec2 (np.ndarray): rfft of each series at length nfft
+        sums1, sums2 (tuple): _prefix_sums of each series
+        nfft (int): Transform length (at least len1 + len2 - 1)
+        max_lag (int): Largest lag in samples (see _resolve_max_lag)
+    """
+    len1, len2 = len(sums1[0]) - 1, len(sums2[0]) - 1
+    raw = np.fft.irfft(spec1 * np.conj(spec2), nfft)
+    lags = np.arange(-max_lag, max_lag + 1)
+    # Negative lags wrap around to the end of the circular result
+    sxy = raw[lags % nfft]
+    n = _overlap_counts(lags, len1, len2)
+
+    # Overlapping index ranges: x1[start1:start1 + n] against x2[start2:start2 + n]
+    start2 = np.maximum(0, -lags)
+    start1 = start2 + lags
+    sx = sums1[0][start1 + n] - sums1[0][start1]
+    sxx = sums1[1][start1 + n] - sums1[1][start1]
+    sy = sums2[0][start2 + n] - sums2[0][start2]
+    syy = sums2[1][start2 + n] - sums2[1][start2]
+
+    cov = sxy - sx * sy / n
+    var = (sxx - sx * sx / n) * (syy - sy * sy / n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.where(var > 1e-12 * n * n, cov / np.sqrt(var), 0.0)
+    return lags, np.clip(corr, -1.0, 1.0)
+
+def calculate_cross_correlation(df1, param1, df2, param2, max_lag=None):
+    """
+    Calculate cross-correlation between two parameters using FFT
+
     Args:
         df1 (pd.DataFrame): First DataFrame
         param1 (str): Parameter from first DataFrame
         df2 (pd.DataFrame): Second DataFrame
         param2 (str): Parameter from second DataFrame
-        max_lag (int, optional): Maximum lag to consider
-    
+        max_lag (int, optional): Maximum lag to consider (clamped to half the shorter series)
+
     Returns:
-        tuple: (lags, cross_correlation)
+        tuple: (lags, cross_correlation) with the Pearson correlation at each lag
     """
     if param1 not in df1.columns or param2 not in df2.columns:
         return None, None
-    
+
     # Get the data
-    data1 = df1[param1].dropna().values
-    data2 = df2[param2].dropna().values
-    
-    # Ensure both series have data
-    if len(data1) < 2 or len(data2) < 2:
+    data1 = _standardize_series(df1[param1].dropna().values)
+    data2 = _standardize_series(df2[param2].dropna().values)
+
+    # Ensure both series have (non-constant) data
+    if data1 is None or data2 is None or len(data1) < 2 or len(data2) < 2:
         return None, None
-    
-    # Determine max lag if not provided
-    if max_lag is None:
-        max_lag = min(len(data1), len(data2)) // 2
-    
-    # Calculate cross-correlation
+
+    max_lag = _resolve_max_lag(max_lag, len(data1), len(data2))
+
+    # Calculate cross-correlation in O((n + m) log(n + m))
     try:
-        cross_corr = np.correlate(data1 - np.mean(data1), data2 - np.mean(data2), mode='full')
-        # Normalize
-        cross_corr = cross_corr / (np.std(data1) * np.std(data2) * len(data1))
-        
-        # Get lags
-        lags = np.arange(-max_lag, max_lag + 1)
-        mid = len(cross_corr) // 2
-        cross_corr = cross_corr[mid-max_lag:mid+max_lag+1]
-        
-        return lags, cross_corr
-    except:
+        from scipy.fft import next_fast_len
+        nfft = next_fast_len(len(data1) + len(data2) - 1)
+        spec1 = np.fft.rfft(data1, nfft)
+        spec2 = np.fft.rfft(data2, nfft)
+        return _xcorr_from_spectra(spec1, spec2, _prefix_sums(data1), _prefix_sums(data2), nfft, max_lag)
+    except Exception:
         return None, None
 
+def calculate_cross_correlation_matrix(data_frames, params, max_lag=None):
+    """
+    Calculate cross-correlation for every pair of selected parameters.
+
+    Each series is standardized and transformed once; every pair then only
+    costs one inverse FFT on the shared spectra.
+
+    Args:
+        data_frames (dict): Dictionary of dataframes {data_id: dataframe}
+        params (dict): Dictionary of parameters to correlate {data_id: column_name}
+        max_lag (int, optional): Maximum lag to consider (clamped per pair to half the shorter series)
+
+    Returns:
+        dict: {
+            'labels': list of data_ids in matrix order,
+            'peak_lags': np.ndarray (k x k) of lags with the largest |correlation|,
+            'peak_corr': np.ndarray (k x k) of the correlation at that lag,
+            'curves': {(id1, id2): (lags, cross_correlation)} for each i<j pair
+        }
+        or None if fewer than two usable series are available.
+    """
+    series = {}
+    for data_id, param in params.items():
+        if data_id in data_frames and param in data_frames[data_id].columns:
+            values = _standardize_series(data_frames[data_id][param].dropna().values)
+            if values is not None and len(values) >= 2:
+                series[data_id] = values
+
+    if len(series) < 2:
+        return None
+
+    labels = list(series.keys())
+    lengths = {data_id: len(values) for data_id, values in series.items()}
+
+    # One common transform length so the spectra can be multiplied pairwise
+    from scipy.fft import next_fast_len
+    nfft = next_fast_len(2 * max(lengths.values()) - 1)
+    spectra = {data_id: np.fft.rfft(values, nfft) for data_id, values in series.items()}
+    sums = {data_id: _prefix_sums(values) for data_id, values in series.items()}
+
+    k = len(labels)
+    peak_lags = np.zeros((k, k), dtype=int)
+    peak_corr = np.eye(k)
+    curves = {}
+
+    for i in range(k):
+        for j in range(i + 1, k):
+            id1, id2 = labels[i], labels[j]
+            pair_max_lag = _resolve_max_lag(max_lag, lengths[id1], lengths[id2])
+            lags, cross_corr = _xcorr_from_spectra(
+                spectra[id1], spectra[id2],
+                sums[id1], sums[id2],
+                nfft, pair_max_lag
+            )
+            curves[(id1, id2)] = (lags, cross_corr)
+
+            best = np.argmax(np.abs(cross_corr))
+            peak_lags[i, j] = lags[best]
+            peak_lags[j, i] = -lags[best]
+            peak_corr[i, j] = peak_corr[j, i] = cross_corr[best]
+
+    return {
+        'labels': labels,
+        'peak_lags': peak_lags,
+        'peak_corr': peak_corr,
+        'curves': curves
+    }
+
 
 # Helper functions for UI
+# Advanced views whose heavy computation can run as a background job
+BACKGROUND_VIZ_TYPES = ["FFT Analysis", "Spectrogram", "HRV Analysis", "Trend Analysis",
+                        "Outlier Detection", "Cross-Correlation", "Cross-Correlation Matrix"]
+
+def analysis_tasks(viz_type, data_frames, params, options=None):
+    """
+    Split the heavy part of an advanced view into independent, picklable tasks.
+
+    Only the analysed column of each trial is shipped to the workers. The task
+    results go back into create_visualization as options['precomputed'].
+
+    Args:
+        viz_type (str): One of BACKGROUND_VIZ_TYPES
+        data_frames (dict): Dictionary of dataframes {data_id: dataframe}
+        params (dict): Dictionary of parameters {data_id: param}
+        options (dict, optional): The view's options
+
+    Returns:
+        tuple: (tasks {task_key: (function, args, kwargs)}, job id identifying inputs and options)
+    """
+    options = options or {}
+    frames = {
+        data_id: data_frames[data_id][[param]]
+        for data_id, param in params.items()
+        if data_id in data_frames and param in data_frames[data_id].columns
+    }
+    if viz_type in ("Spectrogram", "HRV Analysis"):
+        # These also need each trial's timestamps for the sampling rate
+        for data_id in frames:
+            ts_col = options.get('timestamp_col') or _default_timestamp_column(data_frames[data_id])
+            if ts_col:
+                frames[data_id] = data_frames[data_id][[params[data_id], ts_col]]
+    
+    tasks = {}
+    if viz_type == "FFT Analysis":
+        for data_id, df in frames.items():
+            tasks[('fft', data_id)] = (create_fft_analysis, (df, params[data_id]), {'data_id': data_id})
+    elif viz_type == "Spectrogram":
+        for data_id, df in frames.items():
+            tasks[('spectrogram', data_id)] = (
+                create_spectrogram_analysis,
+                (df, params[data_id], options.get('timestamp_col'),
+                 options.get('window_seconds'), options.get('overlap', 0.5)),
+                {}
+            )
+    elif viz_type == "HRV Analysis":
+        for data_id, df in frames.items():
+            tasks[('hrv', data_id)] = (
+                create_hrv_analysis, (df, params[data_id], options.get('timestamp_col')), {'data_id': data_id}
+            )
+    elif viz_type == "Trend Analysis":
+        for data_id, df in frames.items():
+            tasks[('trend', data_id)] = (
+                create_trend_analysis,
+                (df, params[data_id], options.get('window', None), options.get('trend_method', 'auto')),
+                {'data_id': data_id}
+            )
+    elif viz_type == "Outlier Detection":
+        for data_id, df in frames.items():
+            tasks[('outliers', data_id)] = (
+                detect_outliers,
+                (df, params[data_id], options.get('outlier_method', 'zscore'), options.get('outlier_threshold', 3.0)),
+                {'data_id': data_id}
+            )
+    elif viz_type in ("Cross-Correlation", "Cross-Correlation Matrix") and len(frames) >= 2:
+        tasks[('xcorr', 'all')] = (
+            calculate_cross_correlation_matrix, (frames, params, options.get('max_lag', None)), {}
+        )
+    
+    fingerprints = sorted(
+        (str(data_id), params[data_id], tuple(series_fingerprint(pd.to_numeric(df[params[data_id]], errors='coerce')).values()))
+        for data_id, df in frames.items()
+    )
+    task_options = sorted((key, repr(value)) for key, value in options.items() if key != 'precomputed')
+    return tasks, job_key(viz_type, fingerprints, task_options)
+
 def reset_selections():
     """Reset all selections and loaded data"""
     st.session_state.selected_data_ids = []
@@ -478,6 +868,28 @@ def get_datetime_columns(df):
     
     return datetime_cols
 
+# Views that read session state or the trial summary store, so their inputs can't be fingerprinted here
+UNCACHED_VIZ_TYPES = ["Normalized Time Series", "Merged Time Series",
+                      "Pooled Correlation Heatmap", "Pooled Distribution"]
+
+def visualization_cache_key(viz_type, data_frames, params, timestamp_cols=None, options=None):
+    """Figure cache key for a create_visualization call (job results don't change the figure's inputs)"""
+    options = {key: value for key, value in (options or {}).items() if key != 'precomputed'}
+    return figure_key(viz_type, data_frames, params, options, extra=timestamp_cols)
+
+def create_visualization_cached(viz_type, data_frames, params, timestamp_cols=None, options=None):
+    """
+    create_visualization behind the process-wide figure cache.
+    
+    Identical requests (same trials, data versions, parameters and options) reuse the
+    serialized figure across reruns and sessions instead of rebuilding it.
+    """
+    if viz_type in UNCACHED_VIZ_TYPES or not data_frames or not params:
+        return create_visualization(viz_type, data_frames, params, timestamp_cols, options)
+    
+    key = visualization_cache_key(viz_type, data_frames, params, timestamp_cols, options)
+    return cached_figure(key, lambda: create_visualization(viz_type, data_frames, params, timestamp_cols, options))
+
 def create_visualization(viz_type, data_frames, params, timestamp_cols=None, options=None):
     """Create visualization based on selected type and parameters"""
     if not data_frames or not params:
@@ -486,6 +898,14 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
     if options is None:
         options = {}
     
+    from plotly.subplots import make_subplots
+    
+    # Results computed ahead of time by a background job (see analysis_tasks)
+    precomputed = options.get('precomputed', {})
+    
+    # Every raw-data figure shares one point budget across its traces
+    per_trace = trace_budget(len(params), options.get('point_budget', PLOT_POINT_BUDGET))
+    
     # Basic line chart
     if viz_type == "Line Chart":
         fig = go.Figure()
@@ -500,14 +920,13 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                     x_values = df.index
                 
                 # Add trace with hover data
-                hover_text = [f"Data ID: {data_id}<br>Value: {val}" for val in df[param]]
-                fig.add_trace(go.Scatter(
-                    x=x_values,
-                    y=df[param],
+                fig.add_trace(budget_trace(
+                    x_values,
+                    df[param],
+                    max_points=per_trace,
                     mode='lines+markers',
                     name=f"{param} (ID: {data_id})",
-                    hoverinfo="text",
-                    hovertext=hover_text
+                    hovertemplate=f"Data ID: {data_id}<br>Value: %{{y}}<extra></extra>"
                 ))
         
         fig.update_layout(
@@ -531,9 +950,10 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                 else:
                     x_values = df.index
                 
-                fig.add_trace(go.Scatter(
-                    x=x_values,
-                    y=df[param],
+                fig.add_trace(budget_trace(
+                    x_values,
+                    df[param],
+                    max_points=per_trace,
                     mode='markers',
                     name=f"{param} (ID: {data_id})",
                     marker=dict(size=8)
@@ -595,6 +1015,48 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
         )
         return fig
     
+    # Distribution from merged per-trial quantile sketches (no raw samples needed)
+    elif viz_type == "Pooled Distribution":
+        # Scope comes from the page (patient/cohort) or defaults to the selected trials
+        scope = options.get('sketch_scope') or {'data_ids': list(params.keys())}
+        dist_params = sorted(set(params.values()))
+        sketches, trial_count = merged_sketches(
+            dist_params,
+            data_ids=scope.get('data_ids'),
+            patient_ids=scope.get('patient_ids'),
+            data_frames={data_id: df for data_id, df in data_frames.items() if data_id in params}
+        )
+        sketches = {param: sketch for param, sketch in sketches.items() if sketch.count}
+        if not sketches:
+            return None
+        
+        fig = make_subplots(rows=2, cols=1, subplot_titles=["Quartiles", "Histogram"],
+                            vertical_spacing=0.15)
+        for param, sketch in sketches.items():
+            box = sketch.box_stats()
+            fig.add_trace(go.Box(
+                name=param,
+                **{key: [value] for key, value in box.items()}
+            ), row=1, col=1)
+            
+            counts, edges = sketch.histogram(options.get('bins', 30))
+            fig.add_trace(go.Bar(
+                x=(edges[:-1] + edges[1:]) / 2,
+                y=counts,
+                width=np.diff(edges),
+                name=f"{param} histogram",
+                opacity=0.7
+            ), row=2, col=1)
+        
+        fig.update_layout(
+            title=f"Pooled Distribution ({trial_count} trials, approximate)",
+            barmode='overlay',
+            height=700
+        )
+        fig.update_yaxes(title_text="Value", row=1, col=1)
+        fig.update_yaxes(title_text="Count", row=2, col=1)
+        return fig
+    
     # Heatmap
     elif viz_type == "Correlation Heatmap":
         # Prepare data for correlation
@@ -625,6 +1087,43 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
         )
         return fig
     
+    # Pooled correlation from per-trial moments (no raw samples needed)
+    elif viz_type == "Pooled Correlation Heatmap":
+        # Moments come precomputed from the page (patient/cohort scope) or from the trial store
+        moments_by_id = options.get('moments')
+        if moments_by_id is None:
+            stored = load_trial_moments(list(params.keys()))
+            moments_by_id = fill_missing_moments(
+                stored, {data_id: df for data_id, df in data_frames.items() if data_id in params}
+            )
+        
+        merged = merge_moments(list(moments_by_id.values()))
+        if merged is None:
+            return None
+        
+        # Restrict to the selected parameters when at least two distinct ones are chosen
+        pooled_params = options.get('pooled_params')
+        if pooled_params is None and len(set(params.values())) >= 2:
+            pooled_params = sorted(set(params.values()))
+        
+        counts, means, variances, corr_matrix = pooled_statistics(merged, pooled_params)
+        if len(corr_matrix) < 2:
+            return None
+        
+        fig = px.imshow(
+            corr_matrix,
+            text_auto=".2f",
+            color_continuous_scale=options.get('colorscale', 'RdBu_r'),
+            zmin=-1, zmax=1,
+            title=f"Pooled Correlation Heatmap ({len(moments_by_id)} trials, {int(counts.max())} samples)"
+        )
+        
+        fig.update_layout(
+            xaxis_title="Parameters",
+            yaxis_title="Parameters"
+        )
+        return fig
+    
     # Advanced: FFT Analysis
     elif viz_type == "FFT Analysis":
         fig = make_subplots(rows=len(params), cols=1, 
@@ -637,14 +1136,19 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                 df = data_frames[data_id]
                 
                 # Perform FFT analysis
-                freqs, mags, peaks = create_fft_analysis(df, param)
+                if ('fft', data_id) in precomputed:
+                    freqs, mags, peaks = precomputed[('fft', data_id)]
+                else:
+                    freqs, mags, peaks = create_fft_analysis(df, param, data_id=data_id)
                 
                 if freqs is not None and mags is not None:
                     # Add FFT magnitude trace
                     fig.add_trace(
-                        go.Scatter(
-                            x=freqs,
-                            y=mags,
+                        budget_trace(
+                            freqs,
+                            mags,
+                            max_points=per_trace,
+                            method='minmax',
                             mode='lines',
                             name=f"FFT {param} (ID: {data_id})"
                         ),
@@ -677,6 +1181,130 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
         )
         return fig
     
+    # Advanced: Spectrogram (STFT power over time) with the Welch PSD alongside
+    elif viz_type == "Spectrogram":
+        fig = make_subplots(rows=len(params), cols=2, column_widths=[0.7, 0.3],
+                            horizontal_spacing=0.08,
+                            subplot_titles=[title for data_id, param in params.items()
+                                            for title in (f"Spectrogram - {param} (ID: {data_id})",
+                                                          f"Welch PSD - {param} (ID: {data_id})")])
+        
+        row = 1
+        for data_id, param in params.items():
+            if data_id in data_frames and param in data_frames[data_id].columns:
+                if ('spectrogram', data_id) in precomputed:
+                    result = precomputed[('spectrogram', data_id)]
+                else:
+                    result = create_spectrogram_analysis(
+                        data_frames[data_id], param, options.get('timestamp_col'),
+                        options.get('window_seconds'), options.get('overlap', 0.5)
+                    )
+                
+                if result is not None:
+                    fig.add_trace(
+                        go.Heatmap(
+                            x=result['times'],
+                            y=result['freqs'],
+                            z=10 * np.log10(result['power'] + 1e-20),
+                            colorscale=options.get('colorscale', 'Viridis'),
+                            colorbar=dict(title="dB/Hz", len=1.0 / len(params),
+                                          y=1 - (row - 0.5) / len(params)),
+                            name=f"{param} (ID: {data_id})",
+                            hovertemplate="t=%{x:.1f}s<br>f=%{y:.2f}Hz<br>%{z:.1f} dB/Hz<extra></extra>"
+                        ),
+                        row=row, col=1
+                    )
+                    fig.add_trace(
+                        budget_trace(
+                            result['welch_freqs'],
+                            result['welch_psd'],
+                            max_points=per_trace,
+                            method='minmax',
+                            mode='lines',
+                            name=f"PSD {param} (ID: {data_id})"
+                        ),
+                        row=row, col=2
+                    )
+                    
+                    fig.update_xaxes(title_text="Time (s)", row=row, col=1)
+                    fig.update_yaxes(title_text=f"Frequency (Hz, fs={result['fs']:.3g})", row=row, col=1)
+                    fig.update_xaxes(title_text="Frequency (Hz)", row=row, col=2)
+                    fig.update_yaxes(title_text="PSD", type="log", row=row, col=2)
+                
+                row += 1
+        
+        fig.update_layout(
+            height=350 * len(params),
+            title_text="Spectrogram",
+            showlegend=False
+        )
+        return fig
+    
+    elif viz_type == "HRV Analysis":
+        results = {}
+        for data_id, param in params.items():
+            if data_id in data_frames and param in data_frames[data_id].columns:
+                if ('hrv', data_id) in precomputed:
+                    results[data_id] = precomputed[('hrv', data_id)]
+                else:
+                    results[data_id] = create_hrv_analysis(data_frames[data_id], param, options.get('timestamp_col'),
+                                                           data_id=data_id)
+        
+        titles = []
+        for data_id, param in params.items():
+            metrics = (results.get(data_id) or {}).get('metrics', {})
+            if metrics:
+                summary = (f"HR {metrics['mean_hr_bpm']:.0f} bpm, SDNN {metrics['sdnn_ms']:.0f} ms, "
+                           f"RMSSD {metrics['rmssd_ms']:.0f} ms")
+            elif data_id in data_frames and param in data_frames[data_id].columns:
+                df = data_frames[data_id]
+                _, fs, _ = uniform_signal(df, param, options.get('timestamp_col') or _default_timestamp_column(df))
+                summary = f"sampled at {fs:.1f} Hz, needs {HRV_MIN_FS:.0f} Hz" if fs < HRV_MIN_FS else "no beats"
+            else:
+                summary = "no beats"
+            titles += [f"ECG + R-peaks - {param} (ID: {data_id})", f"RR Tachogram ({summary})"]
+        
+        fig = make_subplots(rows=len(params), cols=2, column_widths=[0.6, 0.4],
+                            horizontal_spacing=0.08, subplot_titles=titles)
+        
+        row = 1
+        for data_id, param in params.items():
+            result = results.get(data_id)
+            if result is not None:
+                df = data_frames[data_id]
+                signal, fs, _ = uniform_signal(df, param, options.get('timestamp_col') or _default_timestamp_column(df))
+                peak_idx = np.clip(np.round(result['beat_times'] * fs).astype(int), 0, len(signal) - 1)
+                
+                fig.add_trace(
+                    budget_trace(np.arange(len(signal)) / fs, signal, max_points=per_trace, method='minmax',
+                                 mode='lines', name=f"{param} (ID: {data_id})"),
+                    row=row, col=1
+                )
+                fig.add_trace(
+                    budget_trace(result['beat_times'], signal[peak_idx], max_points=per_trace, method='minmax',
+                                 mode='markers', marker=dict(color='red', size=5), name="R-peaks"),
+                    row=row, col=1
+                )
+                fig.add_trace(
+                    budget_trace(result['beat_times'][1:][result['clean']], result['rr'][result['clean']] * 1000.0,
+                                 max_points=per_trace, mode='lines+markers', marker=dict(size=3),
+                                 name=f"RR (ID: {data_id})"),
+                    row=row, col=2
+                )
+                
+                fig.update_xaxes(title_text="Time (s)", row=row, col=1)
+                fig.update_xaxes(title_text="Time (s)", row=row, col=2)
+                fig.update_yaxes(title_text="RR (ms)", row=row, col=2)
+            
+            row += 1
+        
+        fig.update_layout(
+            height=350 * len(params),
+            title_text="Heart Rate Variability",
+            showlegend=False
+        )
+        return fig
+    
     # Advanced: Trend Analysis
     elif viz_type == "Trend Analysis":
         fig = make_subplots(rows=len(params), cols=1, 
@@ -694,9 +1322,10 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                 
                 # Add original data trace
                 fig.add_trace(
-                    go.Scatter(
-                        x=x_orig,
-                        y=data.values,
+                    budget_trace(
+                        x_orig,
+                        data.values,
+                        max_points=per_trace,
                         mode='markers',
                         name=f"Data {param} (ID: {data_id})",
                         marker=dict(size=5, opacity=0.5)
@@ -706,14 +1335,19 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                 
                 # Perform trend analysis
                 window = options.get('window', None)
-                x_trend, trend = create_trend_analysis(df, param, window)
+                if ('trend', data_id) in precomputed:
+                    x_trend, trend = precomputed[('trend', data_id)]
+                else:
+                    x_trend, trend = create_trend_analysis(df, param, window, options.get('trend_method', 'auto'),
+                                                           data_id=data_id)
                 
                 if x_trend is not None and trend is not None:
                     # Add trend line
                     fig.add_trace(
-                        go.Scatter(
-                            x=x_trend,
-                            y=trend,
+                        budget_trace(
+                            x_trend,
+                            trend,
+                            max_points=per_trace,
                             mode='lines',
                             name=f"Trend {param} (ID: {data_id})",
                             line=dict(width=2, color='red')
@@ -754,14 +1388,18 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                 # Get data and detect outliers
                 method = options.get('outlier_method', 'zscore')
                 threshold = options.get('outlier_threshold', 3.0)
-                outliers = detect_outliers(df, param, method, threshold)
+                if ('outliers', data_id) in precomputed:
+                    outliers = precomputed[('outliers', data_id)]
+                else:
+                    outliers = detect_outliers(df, param, method, threshold, data_id=data_id)
                 
                 # Add normal points
                 normal_mask = ~outliers
                 fig.add_trace(
-                    go.Scatter(
-                        x=x_values[normal_mask],
-                        y=df[param][normal_mask],
+                    budget_trace(
+                        x_values[normal_mask],
+                        df[param][normal_mask],
+                        max_points=per_trace,
                         mode='markers',
                         name=f"Normal {param} (ID: {data_id})",
                         marker=dict(size=6, color='blue')
@@ -772,9 +1410,10 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                 # Add outlier points
                 if outliers.any():
                     fig.add_trace(
-                        go.Scatter(
-                            x=x_values[outliers],
-                            y=df[param][outliers],
+                        budget_trace(
+                            x_values[outliers],
+                            df[param][outliers],
+                            max_points=per_trace,
                             mode='markers',
                             name=f"Outliers {param} (ID: {data_id})",
                             marker=dict(size=10, color='red', symbol='x')
@@ -813,18 +1452,17 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                            subplot_titles=[f"Cross-Correlation: {param1} (ID: {id1}) vs {param2} (ID: {id2})" 
                                           for id1, param1, id2, param2 in param_pairs])
         
+        # Transform every series once and reuse the spectra for all pairs
+        if ('xcorr', 'all') in precomputed:
+            xcorr = precomputed[('xcorr', 'all')]
+        else:
+            xcorr = calculate_cross_correlation_matrix(data_frames, params, options.get('max_lag', None))
+        curves = xcorr['curves'] if xcorr else {}
+        
         row = 1
         for id1, param1, id2, param2 in param_pairs:
-            if (id1 in data_frames and param1 in data_frames[id1].columns and
-                id2 in data_frames and param2 in data_frames[id2].columns):
-                
-                # Calculate cross-correlation
-                max_lag = options.get('max_lag', None)
-                lags, cross_corr = calculate_cross_correlation(
-                    data_frames[id1], param1, 
-                    data_frames[id2], param2, 
-                    max_lag
-                )
+            if (id1, id2) in curves:
+                lags, cross_corr = curves[(id1, id2)]
                 
                 if lags is not None and cross_corr is not None:
                     # Add cross-correlation trace
@@ -876,6 +1514,58 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
         )
         return fig
     
+    # Advanced: Cross-Correlation peak lag/correlation matrix
+    elif viz_type == "Cross-Correlation Matrix":
+        if len(params) < 2:
+            st.warning("Cross-correlation requires at least two parameters")
+            return None
+        
+        if ('xcorr', 'all') in precomputed:
+            xcorr = precomputed[('xcorr', 'all')]
+        else:
+            xcorr = calculate_cross_correlation_matrix(data_frames, params, options.get('max_lag', None))
+        if xcorr is None:
+            return None
+        
+        labels = [f"{params[data_id]} (ID: {data_id})" for data_id in xcorr['labels']]
+        
+        fig = make_subplots(rows=1, cols=2, 
+                           subplot_titles=["Peak Correlation", "Lag at Peak"])
+        
+        fig.add_trace(
+            go.Heatmap(
+                z=xcorr['peak_corr'],
+                x=labels,
+                y=labels,
+                zmin=-1, zmax=1,
+                colorscale=options.get('colorscale', 'RdBu_r'),
+                text=np.round(xcorr['peak_corr'], 3),
+                texttemplate="%{text}",
+                colorbar=dict(x=0.45),
+                name="Peak Correlation"
+            ),
+            row=1, col=1
+        )
+        
+        fig.add_trace(
+            go.Heatmap(
+                z=xcorr['peak_lags'],
+                x=labels,
+                y=labels,
+                colorscale='Viridis',
+                text=xcorr['peak_lags'],
+                texttemplate="%{text}",
+                name="Lag at Peak"
+            ),
+            row=1, col=2
+        )
+        
+        fig.update_layout(
+            height=max(400, 60 * len(labels)),
+            title_text="Cross-Correlation Peak Matrix"
+        )
+        return fig
+    
     # Advanced: 3D Scatter Plot
     elif viz_type == "3D Scatter Plot":
         if len(params) < 3:
@@ -897,6 +1587,10 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
         y_data = y_data[:min_len]
         z_data = z_data[:min_len]
         
+        # Scatter3d is already WebGL; thin it evenly to stay within the point budget
+        stride = max(1, -(-min_len // options.get('point_budget', PLOT_POINT_BUDGET)))
+        x_data, y_data, z_data = x_data[::stride], y_data[::stride], z_data[::stride]
+        
         if min_len > 0:
             fig = go.Figure(data=[go.Scatter3d(
                 x=x_data,
@@ -947,9 +1641,10 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
                 
                 if 'normalized_time' in df.columns:
                     # Add trace
-                    fig.add_trace(go.Scatter(
-                        x=df['normalized_time'],
-                        y=df[param],
+                    fig.add_trace(budget_trace(
+                        df['normalized_time'],
+                        df[param],
+                        max_points=per_trace,
                         mode='lines+markers',
                         name=f"{param} (ID: {data_id})"
                     ))
@@ -964,6 +1659,65 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
         )
         return fig
     
+    elif viz_type == "DTW Alignment":
+        if not timestamp_cols:
+            st.warning("Timestamp columns must be selected for DTW alignment")
+            return None
+        
+        usable = [data_id for data_id, param in params.items()
+                  if data_id in data_frames and param in data_frames[data_id].columns]
+        if len(usable) < 2:
+            st.warning("DTW alignment needs at least two trials")
+            return None
+        
+        ref_id = options.get('reference_id') if options.get('reference_id') in usable else usable[0]
+        ref_df = data_frames[ref_id]
+        
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=False, vertical_spacing=0.12,
+                            subplot_titles=["Original (own time axis)", f"Warped onto reference ID {ref_id}"])
+        
+        reference = None
+        for data_id in usable:
+            if data_id == ref_id:
+                continue
+            result = dtw_align(
+                ref_df, params[ref_id], data_frames[data_id], params[data_id],
+                timestamp_cols.get(ref_id), timestamp_cols.get(data_id),
+                band=options.get('band', 0.1), mode=options.get('dtw_mode', 'auto'),
+                normalize=options.get('normalize', True)
+            )
+            if result is None:
+                continue
+            
+            if reference is None:
+                reference = result
+                for row in (1, 2):
+                    fig.add_trace(budget_trace(result['ref_time'], result['reference'], max_points=per_trace,
+                                               mode='lines', name=f"{params[ref_id]} (ID: {ref_id}, reference)",
+                                               line=dict(color='black'), showlegend=row == 1),
+                                  row=row, col=1)
+            
+            label = f"{params[data_id]} (ID: {data_id}, DTW {result['normalized_distance']:.3f})"
+            fig.add_trace(budget_trace(result['time'], result['original'], max_points=per_trace,
+                                       mode='lines', name=label, legendgroup=str(data_id)),
+                          row=1, col=1)
+            fig.add_trace(budget_trace(result['ref_time'], result['warped'], max_points=per_trace,
+                                       mode='lines', name=label, legendgroup=str(data_id), showlegend=False),
+                          row=2, col=1)
+        
+        if reference is None:
+            return None
+        
+        fig.update_xaxes(title_text="Time (s)", row=1, col=1)
+        fig.update_xaxes(title_text="Reference time (s)", row=2, col=1)
+        fig.update_yaxes(title_text="z-score" if options.get('normalize', True) else "Value")
+        fig.update_layout(
+            height=700,
+            title=f"DTW Alignment (band {options.get('band', 0.1):.0%}, mode: {options.get('dtw_mode', 'auto')})",
+            legend_title="Parameters"
+        )
+        return fig
+    
     # Advanced: Merged Time Series
     elif viz_type == "Merged Time Series":
         if not timestamp_cols or not st.session_state.value_columns:
@@ -994,10 +1748,12 @@ def create_visualization(viz_type, data_frames, params, timestamp_cols=None, opt
         ts_col = merged_df.columns[0]
         
         # Add traces for each value column
+        merged_budget = trace_budget(len(merged_df.columns) - 1, options.get('point_budget', PLOT_POINT_BUDGET))
         for col in merged_df.columns[1:]:
-            fig.add_trace(go.Scatter(
-                x=merged_df[ts_col],
-                y=merged_df[col],
+            fig.add_trace(budget_trace(
+                merged_df[ts_col],
+                merged_df[col],
+                max_points=merged_budget,
                 mode='lines',
                 name=col
             ))
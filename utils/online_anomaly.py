@@ -0,0 +1,194 @@
+import os
+import time
+import math
+from array import array
+from datetime import datetime, timezone
+from utils.batch_writer import BatchWriter
+
+# EWMA detector: smoothing factor, z-score threshold and readings before it may flag
+ANOMALY_EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.05"))
+ANOMALY_EWMA_THRESHOLD = float(os.getenv("ANOMALY_EWMA_THRESHOLD", "4.0"))
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "30"))
+
+# Rolling MAD detector: window length and robust z-score threshold
+ANOMALY_MAD_WINDOW = int(os.getenv("ANOMALY_MAD_WINDOW", "61"))
+ANOMALY_MAD_THRESHOLD = float(os.getenv("ANOMALY_MAD_THRESHOLD", "5.0"))
+
+# Event writer: rows per INSERT batch and longest wait before a partial batch is written
+ANOMALY_BATCH_SIZE = int(os.getenv("ANOMALY_BATCH_SIZE", "500"))
+ANOMALY_FLUSH_INTERVAL = float(os.getenv("ANOMALY_FLUSH_INTERVAL", "2.0"))
+
+# Streams with no readings for this long drop their detector state
+ANOMALY_STATE_TTL = float(os.getenv("ANOMALY_STATE_TTL", "3600"))
+
+# Scale factor making the MAD a consistent estimator of the standard deviation
+_MAD_SCALE = 1.4826
+
+ANOMALY_EVENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomaly_events (
+    id BIGSERIAL PRIMARY KEY,
+    patient_id INTEGER NOT NULL,
+    parameter TEXT NOT NULL,
+    detector TEXT NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    expected DOUBLE PRECISION,
+    score DOUBLE PRECISION NOT NULL,
+    event_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_anomaly_events_patient_time ON anomaly_events(patient_id, event_time DESC);
+"""
+
+class EWMADetector:
+    """
+    Exponentially weighted mean and variance; flags readings more than `threshold`
+    standard deviations from the running mean. Three floats of state.
+
+    Flagged readings are winsorized before updating, so one spike doesn't inflate the
+    variance while a genuine level shift is still tracked.
+    """
+    __slots__ = ('alpha', 'threshold', 'mean', 'var', 'count')
+    name = 'ewma'
+
+    def __init__(self, alpha=None, threshold=None):
+        self.alpha = alpha or ANOMALY_EWMA_ALPHA
+        self.threshold = threshold or ANOMALY_EWMA_THRESHOLD
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, x):
+        """Feed one reading; returns (score, expected) if it is anomalous, else None"""
+        self.count += 1
+        if self.count == 1:
+            self.mean = x
+            return None
+
+        std = math.sqrt(self.var)
+        score = abs(x - self.mean) / std if std > 0 else 0.0
+        flagged = self.count > ANOMALY_WARMUP and score > self.threshold
+        expected = self.mean
+
+        if flagged:
+            x = self.mean + math.copysign(self.threshold * std, x - self.mean)
+        diff = x - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+
+        return (score, expected) if flagged else None
+
+class RollingMADDetector:
+    """
+    Median and median absolute deviation over the last `window` readings; flags readings
+    whose robust z-score |x - median| / (1.4826 * MAD) exceeds `threshold`.
+    State is a fixed-size ring buffer of doubles.
+    """
+    __slots__ = ('window', 'threshold', 'values', 'position', 'filled')
+    name = 'mad'
+
+    def __init__(self, window=None, threshold=None):
+        self.window = window or ANOMALY_MAD_WINDOW
+        self.threshold = threshold or ANOMALY_MAD_THRESHOLD
+        self.values = array('d', bytes(8 * self.window))
+        self.position = 0
+        self.filled = 0
+
+    def update(self, x):
+        """Feed one reading; returns (score, expected) if it is anomalous, else None"""
+        result = None
+        if self.filled >= min(self.window, ANOMALY_WARMUP):
+            recent = sorted(self.values[:self.filled])
+            half = self.filled // 2
+            median = recent[half] if self.filled % 2 else 0.5 * (recent[half - 1] + recent[half])
+            deviations = sorted(abs(v - median) for v in recent)
+            mad = deviations[half] if self.filled % 2 else 0.5 * (deviations[half - 1] + deviations[half])
+            if mad > 0:
+                score = abs(x - median) / (_MAD_SCALE * mad)
+                if score > self.threshold:
+                    result = (score, median)
+
+        self.values[self.position] = x
+        self.position = (self.position + 1) % self.window
+        self.filled = min(self.filled + 1, self.window)
+        return result
+
+DETECTORS = {'ewma': EWMADetector, 'mad': RollingMADDetector}
+
+class _StreamState:
+    """Detectors of one (patient, parameter) stream plus whether it is currently anomalous"""
+    __slots__ = ('detectors', 'active', 'last_seen')
+
+    def __init__(self, detector_names):
+        self.detectors = [DETECTORS[name]() for name in detector_names]
+        self.active = set()
+        self.last_seen = time.monotonic()
+
+class AnomalyMonitor:
+    """
+    Online anomaly detection for every (patient, parameter) stream passing through ingest.
+
+    An event is emitted when a stream enters the anomalous state for a detector; further
+    flagged readings are folded into that episode until a normal reading ends it.
+    """
+
+    def __init__(self, detector_names=('ewma', 'mad')):
+        self.detector_names = tuple(detector_names)
+        self.streams = {}
+
+    def observe(self, patient_id, sensor_data, event_time=None):
+        """
+        Run one reading through the detectors of each of its numeric parameters.
+
+        Args:
+            patient_id (int): Patient the reading belongs to
+            sensor_data (dict): {parameter: value}
+            event_time (datetime, optional): Reading time (defaults to now)
+
+        Returns:
+            list: Event tuples (patient_id, parameter, detector, value, expected, score, event_time)
+        """
+        event_time = event_time or datetime.now(timezone.utc)
+        now = time.monotonic()
+        events = []
+
+        for param, value in sensor_data.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                continue
+
+            state = self.streams.get((patient_id, param))
+            if state is None:
+                state = self.streams[(patient_id, param)] = _StreamState(self.detector_names)
+            state.last_seen = now
+
+            for detector in state.detectors:
+                flagged = detector.update(float(value))
+                if flagged is None:
+                    state.active.discard(detector.name)
+                elif detector.name not in state.active:
+                    state.active.add(detector.name)
+                    score, expected = flagged
+                    events.append((patient_id, param, detector.name, float(value), expected, score, event_time))
+
+        return events
+
+    def prune(self, max_idle=None):
+        """Drop the state of streams idle for longer than max_idle seconds; returns how many"""
+        cutoff = time.monotonic() - (max_idle or ANOMALY_STATE_TTL)
+        stale = [key for key, state in self.streams.items() if state.last_seen < cutoff]
+        for key in stale:
+            del self.streams[key]
+        return len(stale)
+
+class AnomalyEventWriter(BatchWriter):
+    """Buffers anomaly events and writes them to anomaly_events in batches"""
+
+    def __init__(self, pool, batch_size=None, flush_interval=None):
+        super().__init__(
+            pool, ANOMALY_EVENTS_SCHEMA,
+            """
+            INSERT INTO anomaly_events (patient_id, parameter, detector, value, expected, score, event_time)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            """,
+            batch_size or ANOMALY_BATCH_SIZE, flush_interval or ANOMALY_FLUSH_INTERVAL, name='anomaly events'
+        )
@@ -0,0 +1,157 @@
+import os
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Most points a single figure sends to the browser, shared across its traces
+PLOT_POINT_BUDGET = int(os.getenv("PLOT_POINT_BUDGET", "10000"))
+
+# Traces with more points than this are drawn with WebGL (Scattergl) instead of SVG
+PLOT_WEBGL_THRESHOLD = int(os.getenv("PLOT_WEBGL_THRESHOLD", "5000"))
+
+# 'lttb' keeps the visual shape of lines; 'minmax' keeps every bucket's extremes
+PLOT_DOWNSAMPLE_METHOD = os.getenv("PLOT_DOWNSAMPLE_METHOD", "lttb")
+
+def _as_float(values):
+    """Numeric view of x values (datetimes become ns since epoch) for the decimation maths"""
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if getattr(values.dt, 'tz', None) is not None:
+            values = values.dt.tz_convert(None)
+        return values.astype('datetime64[ns]').to_numpy().view('int64').astype(float)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+
+def _take(values, idx):
+    """Select positions from a Series/Index/array, keeping its type"""
+    if isinstance(values, pd.Series):
+        return values.iloc[idx]
+    if isinstance(values, pd.Index):
+        return values[idx]
+    return np.asarray(values)[idx]
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets selection.
+
+    Keeps the first and last points and, in each of n_out - 2 buckets, the point
+    forming the largest triangle with the previous pick and the next bucket's mean.
+
+    Args:
+        x (np.ndarray): Sorted float x values
+        y (np.ndarray): Float y values (finite)
+        n_out (int): Number of points to keep
+
+    Returns:
+        np.ndarray: Sorted positions of the kept points
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    starts, ends = edges[:-1], edges[1:]
+    next_ends = np.append(edges[2:], n)
+
+    # Next-bucket means for every bucket at once from cumulative sums
+    cum_x = np.concatenate([[0.0], np.cumsum(x)])
+    cum_y = np.concatenate([[0.0], np.cumsum(y)])
+    counts = next_ends - ends
+    avg_x = (cum_x[next_ends] - cum_x[ends]) / counts
+    avg_y = (cum_y[next_ends] - cum_y[ends]) / counts
+
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+
+    # Only the anchor (previous pick) is sequential
+    a = 0
+    for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        xa, ya = x[a], y[a]
+        area = np.abs((xa - avg_x[i]) * (y[start:end] - ya) - (xa - x[start:end]) * (avg_y[i] - ya))
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+
+    return picked
+
+def minmax_indices(y, n_out):
+    """
+    Keep the minimum and maximum of each of n_out / 2 equal-count buckets (fully vectorized).
+
+    Args:
+        y (np.ndarray): Float y values (finite)
+        n_out (int): Approximate number of points to keep
+
+    Returns:
+        np.ndarray: Sorted positions of the kept points
+    """
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if n_out >= n:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+    used = ~np.all(np.isnan(blocks), axis=1)
+    offsets = np.arange(buckets)[used] * size
+    lows = offsets + np.nanargmin(blocks[used], axis=1)
+    highs = offsets + np.nanargmax(blocks[used], axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lows, highs]))
+
+def downsample(x, y, max_points, method=None):
+    """
+    Reduce a series to at most about max_points points for display.
+
+    Non-finite y values are dropped before decimation. The output keeps the input types,
+    so datetime x values stay datetimes.
+
+    Args:
+        x: x values (Series, Index or array)
+        y: y values (Series or array)
+        max_points (int): Point budget for this series
+        method (str, optional): 'lttb' or 'minmax' (defaults to PLOT_DOWNSAMPLE_METHOD)
+
+    Returns:
+        tuple: (x_out, y_out)
+    """
+    y_float = pd.to_numeric(pd.Series(np.asarray(y)), errors='coerce').to_numpy(dtype=float)
+    if len(y_float) <= max_points:
+        return x, y
+
+    finite = np.flatnonzero(np.isfinite(y_float))
+    x_float = _as_float(_take(x, finite))
+    # Shift to start at zero so epoch-ns x values keep precision in the cumulative sums
+    x_float = x_float - x_float[0] if len(x_float) else x_float
+
+    if (method or PLOT_DOWNSAMPLE_METHOD) == 'minmax':
+        keep = minmax_indices(y_float[finite], max_points)
+    else:
+        keep = lttb_indices(x_float, y_float[finite], max_points)
+
+    idx = finite[keep]
+    return _take(x, idx), _take(y, idx)
+
+def trace_budget(n_traces, budget=None):
+    """Points each of n_traces traces may use under a per-figure budget"""
+    return max(100, (budget or PLOT_POINT_BUDGET) // max(1, n_traces))
+
+def budget_trace(x, y, max_points=None, method=None, **kwargs):
+    """
+    Build a scatter/line trace that respects a point budget.
+
+    Long series are downsampled, and anything still above PLOT_WEBGL_THRESHOLD
+    points is drawn with Scattergl. Pass hovertemplate rather than per-point hover text.
+
+    Args:
+        x: x values
+        y: y values
+        max_points (int, optional): Point budget for this trace (defaults to PLOT_POINT_BUDGET)
+        method (str, optional): Downsampling method
+        **kwargs: Any other go.Scatter properties (mode, name, line, marker, hovertemplate, ...)
+
+    Returns:
+        go.Scatter or go.Scattergl
+    """
+    x, y = downsample(x, y, max_points or PLOT_POINT_BUDGET, method)
+    trace_type = go.Scattergl if len(y) > PLOT_WEBGL_THRESHOLD else go.Scatter
+    return trace_type(x=x, y=y, **kwargs)
@@ -0,0 +1,244 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+
+logger = logging.getLogger('profiling')
+
+# Longest profile a single request may ask for (seconds)
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+
+# Sampling period of the CPU profiler (seconds); 5 ms is 200 stacks/s per thread
+PROFILING_SAMPLE_INTERVAL = float(os.getenv("PROFILING_SAMPLE_INTERVAL", "0.005"))
+
+# Frames kept per allocation when tracemalloc is started for a diff
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "10"))
+
+# Nothing runs until a profile is requested: no tracer, no hooks, no background thread.
+# One profile at a time per process, so a CPU run never includes tracemalloc's overhead.
+_busy = threading.Lock()
+
+def _frame_label(code, labels):
+    label = labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        label = labels[code] = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+class StackSampler:
+    """
+    Statistical CPU profiler: samples every thread's Python stack with
+    sys._current_frames() at a fixed period and counts identical stacks.
+
+    Nothing is traced between samples, so the cost is the sampling itself (a few
+    microseconds per thread per sample) and the profiled code runs unmodified.
+    """
+
+    def __init__(self, interval=None, thread_filter=None):
+        self.interval = interval or PROFILING_SAMPLE_INTERVAL
+        self.thread_filter = thread_filter
+        # {(thread name, root frame, ..., leaf frame): samples}
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._labels = {}
+
+    def sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            name = names.get(ident, f"thread-{ident}")
+            if self.thread_filter and self.thread_filter not in name:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code, self._labels))
+                frame = frame.f_back
+            stack.append(name)
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self, seconds):
+        """Sample for `seconds` on the calling thread (blocking)"""
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_sample = start
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now >= next_sample:
+                self.sample()
+                next_sample += self.interval
+                # Fell behind (GIL contention): skip the missed ticks rather than burst
+                if next_sample < now:
+                    next_sample = now + self.interval
+            time.sleep(max(0.0, min(next_sample, deadline) - time.perf_counter()))
+        self.duration = time.perf_counter() - start
+        return self
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed format (`frame;frame;frame count` per line), for flamegraph.pl or speedscope"""
+        lines = [";".join(frame.replace(";", ":") for frame in stack) + f" {count}"
+                 for stack, count in self.stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def top(self, limit=30):
+        """Functions by self and total samples"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack[1:]):
+                total[frame] += count
+        return {
+            'samples': self.samples,
+            'seconds': round(self.duration, 3),
+            'interval_ms': self.interval * 1000,
+            'self': [{'frame': frame, 'samples': count} for frame, count in own.most_common(limit)],
+            'total': [{'frame': frame, 'samples': count} for frame, count in total.most_common(limit)],
+        }
+
+def profile_cpu(seconds, interval=None, thread_filter=None):
+    """
+    Run the sampling profiler for `seconds` on this thread.
+
+    Returns:
+        StackSampler or None: None if another profile is already running
+    """
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        return StackSampler(interval, thread_filter).run(seconds)
+    finally:
+        _busy.release()
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+def profile_memory(seconds, limit=25, group_by="lineno"):
+    """
+    Allocation sites that grew over `seconds`, from two tracemalloc snapshots.
+
+    tracemalloc is started for the window and stopped again afterwards, unless it was
+    already tracing (PYTHONTRACEMALLOC), in which case it is left as it was.
+
+    Args:
+        seconds (float): Time between the snapshots
+        limit (int): Sites returned
+        group_by (str): 'lineno', 'filename' or 'traceback'
+
+    Returns:
+        dict or None: None if another profile is already running
+    """
+    if not _busy.acquire(blocking=False):
+        return None
+    started_here = not tracemalloc.is_tracing()
+    try:
+        if started_here:
+            tracemalloc.start(PROFILING_TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        before = _snapshot()
+        time.sleep(seconds)
+        after = _snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        stats = after.compare_to(before, group_by)
+
+        sites = []
+        for stat in stats[:limit]:
+            sites.append({
+                'site': stat.traceback.format() if group_by == "traceback" else str(stat.traceback[0]),
+                'size_diff_kb': round(stat.size_diff / 1024, 1),
+                'size_kb': round(stat.size / 1024, 1),
+                'count_diff': stat.count_diff,
+                'count': stat.count,
+            })
+        return {
+            'seconds': seconds,
+            'group_by': group_by,
+            'traced_current_kb': round(current / 1024, 1),
+            'traced_peak_kb': round(peak / 1024, 1),
+            'started_tracing': started_here,
+            'sites': sites,
+        }
+    finally:
+        if started_here:
+            tracemalloc.stop()
+        _busy.release()
+
+def profiling_router():
+    """
+    Admin-only profiling endpoints for a FastAPI app:
+
+        GET /debug/profile/cpu?seconds=10[&format=collapsed|top][&thread=MainThread]
+        GET /debug/profile/memory?seconds=10[&limit=25][&group_by=lineno|filename|traceback]
+
+    Requests need `Authorization: Bearer <JWT>` signed with JWT_SECRET and carrying
+    role=admin (see `python -m utils.profiling token`). Profiles run in a worker
+    thread, so the event loop keeps serving while it is being sampled.
+    """
+    from fastapi import APIRouter, Depends, HTTPException, Query
+    from fastapi.responses import PlainTextResponse
+    from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+    from auth.jwt_auth import verify_token
+
+    bearer = HTTPBearer(auto_error=False)
+
+    async def require_admin(credentials: HTTPAuthorizationCredentials = Depends(bearer)):
+        payload = verify_token(credentials.credentials) if credentials else None
+        if not payload or payload.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Admin token required")
+        return payload
+
+    router = APIRouter(prefix="/debug/profile", dependencies=[Depends(require_admin)])
+
+    @router.get("/cpu")
+    async def cpu_profile(
+        seconds: float = Query(10.0, gt=0, le=PROFILING_MAX_SECONDS),
+        format: str = Query("collapsed", pattern="^(collapsed|top)$"),
+        thread: str = Query(None),
+        interval_ms: float = Query(PROFILING_SAMPLE_INTERVAL * 1000, ge=1, le=1000),
+    ):
+        logger.info(f"CPU profile requested for {seconds:.0f} s")
+        sampler = await asyncio.to_thread(profile_cpu, seconds, interval_ms / 1000, thread)
+        if sampler is None:
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        if format == "top":
+            return sampler.top()
+        return PlainTextResponse(sampler.collapsed())
+
+    @router.get("/memory")
+    async def memory_profile(
+        seconds: float = Query(10.0, gt=0, le=PROFILING_MAX_SECONDS),
+        limit: int = Query(25, ge=1, le=500),
+        group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    ):
+        logger.info(f"Memory profile requested for {seconds:.0f} s")
+        result = await asyncio.to_thread(profile_memory, seconds, limit, group_by)
+        if result is None:
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        return result
+
+    return router
+
+if __name__ == "__main__":
+    # python -m utils.profiling token [minutes]  ->  a short-lived admin token for the endpoints
+    if len(sys.argv) >= 2 and sys.argv[1] == "token":
+        import jwt
+        from datetime import datetime, timedelta, timezone
+        from auth.jwt_auth import JWT_SECRET, JWT_ALGORITHM
+        minutes = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+        print(jwt.encode({"sub": "profiler", "role": "admin",
+                          "exp": datetime.now(timezone.utc) + timedelta(minutes=minutes)},
+                         JWT_SECRET, algorithm=JWT_ALGORITHM))
+    else:
+        print("usage: python -m utils.profiling token [minutes]")
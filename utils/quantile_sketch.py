@@ -0,0 +1,351 @@
+import struct
+import numpy as np
+import pandas as pd
+from backend_auth import get_db_connection
+from utils.trial_moments import get_parameter_columns
+
+# Larger compression keeps more centroids: better accuracy, bigger sketches
+DEFAULT_COMPRESSION = 200
+
+_HEADER = struct.Struct("<4sIddd")
+_MAGIC = b"TDG1"
+
+TRIAL_SKETCHES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trial_quantile_sketches (
+    data_id INTEGER NOT NULL,
+    patient_id INTEGER NOT NULL,
+    parameter TEXT NOT NULL,
+    sample_count BIGINT NOT NULL,
+    sketch BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (data_id, parameter)
+);
+CREATE INDEX IF NOT EXISTS idx_trial_sketches_patient_param ON trial_quantile_sketches(patient_id, parameter);
+"""
+
+def _compress(means, weights, compression):
+    """
+    Collapse sorted-able centroids into t-digest clusters in one vectorized pass.
+
+    Each centroid is assigned to the unit-wide bucket of the k1 scale function
+    k(q) = compression / (2 * pi) * asin(2q - 1) that its left quantile falls in,
+    so clusters stay small near the tails and large around the median.
+    """
+    order = np.argsort(means, kind='stable')
+    means, weights = means[order], weights[order]
+
+    total = weights.sum()
+    q_left = (np.cumsum(weights) - weights) / total
+    k = compression / (2 * np.pi) * np.arcsin(2 * np.clip(q_left, 0.0, 1.0) - 1)
+    _, cluster = np.unique(np.floor(k + compression / 4), return_inverse=True)
+
+    merged_weights = np.bincount(cluster, weights=weights)
+    merged_means = np.bincount(cluster, weights=means * weights) / merged_weights
+    return merged_means, merged_weights
+
+class QuantileSketch:
+    """Mergeable t-digest for approximate percentiles and histograms"""
+
+    def __init__(self, means=None, weights=None, minimum=np.nan, maximum=np.nan,
+                 compression=DEFAULT_COMPRESSION):
+        self.means = np.asarray(means if means is not None else [], dtype=float)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=float)
+        self.min = float(minimum)
+        self.max = float(maximum)
+        self.compression = compression
+
+    @classmethod
+    def from_values(cls, values, compression=DEFAULT_COMPRESSION):
+        """
+        Build a sketch from raw samples (NaNs are ignored).
+
+        Args:
+            values (array-like): Samples
+            compression (int): t-digest compression parameter
+
+        Returns:
+            QuantileSketch: Sketch of the samples (empty if there are none)
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return cls(compression=compression)
+
+        means, weights = _compress(values, np.ones(len(values)), compression)
+        return cls(means, weights, values.min(), values.max(), compression)
+
+    @classmethod
+    def merge(cls, sketches, compression=DEFAULT_COMPRESSION):
+        """
+        Merge any number of sketches into one.
+
+        Args:
+            sketches (iterable): QuantileSketch objects (empty ones are skipped)
+            compression (int): Compression of the merged sketch
+
+        Returns:
+            QuantileSketch: Combined sketch
+        """
+        sketches = [s for s in sketches if s is not None and s.count > 0]
+        if not sketches:
+            return cls(compression=compression)
+
+        means, weights = _compress(
+            np.concatenate([s.means for s in sketches]),
+            np.concatenate([s.weights for s in sketches]),
+            compression
+        )
+        return cls(
+            means, weights,
+            min(s.min for s in sketches), max(s.max for s in sketches),
+            compression
+        )
+
+    @property
+    def count(self):
+        """Number of samples summarized"""
+        return float(self.weights.sum()) if len(self.weights) else 0.0
+
+    @property
+    def mean(self):
+        """Exact mean of the summarized samples"""
+        if not self.count:
+            return np.nan
+        return float(np.dot(self.means, self.weights) / self.count)
+
+    def _knots(self):
+        """Cumulative weight at each centroid centre, padded with the exact min/max"""
+        centres = np.cumsum(self.weights) - self.weights / 2
+        cum = np.concatenate([[0.0], centres, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return cum, values
+
+    def quantile(self, q):
+        """
+        Approximate quantile(s).
+
+        Args:
+            q (float or array-like): Quantile(s) in [0, 1]
+
+        Returns:
+            float or np.ndarray: Estimated value(s) (NaN for an empty sketch)
+        """
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        cum, values = self._knots()
+        return np.interp(np.clip(q, 0.0, 1.0) * self.count, cum, values)
+
+    def cdf(self, x):
+        """
+        Approximate fraction of samples <= x.
+
+        Args:
+            x (float or array-like): Value(s)
+
+        Returns:
+            float or np.ndarray: CDF estimate(s) in [0, 1]
+        """
+        if not self.count:
+            return np.full(np.shape(x), np.nan) if np.ndim(x) else np.nan
+        cum, values = self._knots()
+        return np.interp(x, values, cum, left=0.0, right=self.count) / self.count
+
+    def histogram(self, bins=30, value_range=None):
+        """
+        Approximate histogram counts.
+
+        Args:
+            bins (int or array-like): Number of equal-width bins or explicit bin edges
+            value_range (tuple, optional): (low, high) for equal-width bins (defaults to min/max)
+
+        Returns:
+            tuple: (counts, bin_edges)
+        """
+        if np.ndim(bins):
+            edges = np.asarray(bins, dtype=float)
+        else:
+            low, high = value_range or (self.min, self.max)
+            edges = np.linspace(low, high, int(bins) + 1)
+        return np.diff(self.cdf(edges)) * self.count, edges
+
+    def summary(self):
+        """Count, mean, min, quartiles, max and IQR as a dict"""
+        q1, median, q3 = (float(v) for v in self.quantile([0.25, 0.5, 0.75])) if self.count else (np.nan,) * 3
+        return {
+            'Count': int(self.count),
+            'Mean': self.mean,
+            'Median': median,
+            'Min': self.min,
+            'Max': self.max,
+            'Range': self.max - self.min,
+            '25%': q1,
+            '75%': q3,
+            'IQR': q3 - q1
+        }
+
+    def box_stats(self):
+        """Quartiles and Tukey whisker ends, ready for a precomputed plotly box"""
+        stats = self.summary()
+        return {
+            'q1': stats['25%'],
+            'median': stats['Median'],
+            'q3': stats['75%'],
+            'mean': stats['Mean'],
+            'lowerfence': max(self.min, stats['25%'] - 1.5 * stats['IQR']),
+            'upperfence': min(self.max, stats['75%'] + 1.5 * stats['IQR'])
+        }
+
+    def to_bytes(self):
+        """Compact binary encoding (header + float64 means + float64 weights)"""
+        header = _HEADER.pack(_MAGIC, len(self.means), float(self.compression), self.min, self.max)
+        return header + self.means.astype('<f8').tobytes() + self.weights.astype('<f8').tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        """Decode a sketch produced by to_bytes"""
+        blob = bytes(blob)
+        magic, k, compression, minimum, maximum = _HEADER.unpack_from(blob)
+        if magic != _MAGIC:
+            raise ValueError("Not a quantile sketch")
+        body = np.frombuffer(blob, dtype='<f8', offset=_HEADER.size, count=2 * k)
+        return cls(body[:k].copy(), body[k:].copy(), minimum, maximum, int(compression))
+
+def compute_trial_sketches(df, params=None, compression=DEFAULT_COMPRESSION):
+    """
+    Build one sketch per parameter of a trial.
+
+    Args:
+        df (pd.DataFrame): Trial data
+        params (list, optional): Parameters to sketch (defaults to all numeric measurement columns)
+        compression (int): t-digest compression parameter
+
+    Returns:
+        dict: {parameter: QuantileSketch} for parameters with at least one value
+    """
+    if df is None or df.empty:
+        return {}
+
+    sketches = {}
+    for param in params or get_parameter_columns(df):
+        if param in df.columns:
+            sketch = QuantileSketch.from_values(
+                pd.to_numeric(df[param], errors='coerce').to_numpy(dtype=float), compression
+            )
+            if sketch.count:
+                sketches[param] = sketch
+    return sketches
+
+def save_trial_sketches(cursor, data_id, patient_id, sketches):
+    """
+    Store a trial's sketches using an open cursor (caller commits).
+
+    Args:
+        cursor: psycopg2 cursor inside the finalization transaction
+        data_id (int): patient_data row the sketches describe
+        patient_id (int): Owner of the trial
+        sketches (dict): {parameter: QuantileSketch}
+    """
+    cursor.execute(TRIAL_SKETCHES_SCHEMA)
+    cursor.executemany("""
+        INSERT INTO trial_quantile_sketches (data_id, patient_id, parameter, sample_count, sketch)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (data_id, parameter) DO UPDATE
+        SET sample_count = EXCLUDED.sample_count, sketch = EXCLUDED.sketch, created_at = NOW()
+    """, [
+        (data_id, patient_id, param, int(sketch.count), sketch.to_bytes())
+        for param, sketch in sketches.items()
+    ])
+
+def load_sketches(params, data_ids=None, patient_ids=None):
+    """
+    Load stored sketches for some parameters, filtered by trials and/or patients.
+
+    Args:
+        params (list): Parameters to load
+        data_ids (list, optional): Restrict to these trials
+        patient_ids (list, optional): Restrict to these patients
+
+    Returns:
+        dict: {(data_id, parameter): QuantileSketch}
+    """
+    conditions = ["parameter = ANY(%s)"]
+    args = [list(params)]
+    if data_ids is not None:
+        conditions.append("data_id = ANY(%s)")
+        args.append([int(d) for d in data_ids])
+    if patient_ids is not None:
+        conditions.append("patient_id = ANY(%s)")
+        args.append([int(p) for p in patient_ids])
+
+    conn = get_db_connection()
+    if not conn:
+        return {}
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT data_id, parameter, sketch
+                FROM trial_quantile_sketches
+                WHERE {' AND '.join(conditions)}
+            """, tuple(args))
+            rows = cursor.fetchall()
+    except Exception as e:
+        print(f"Error loading quantile sketches: {str(e)}")
+        return {}
+    finally:
+        conn.close()
+
+    return {(data_id, param): QuantileSketch.from_bytes(blob) for data_id, param, blob in rows}
+
+def merged_sketches(params, data_ids=None, patient_ids=None, data_frames=None):
+    """
+    Merge stored sketches per parameter across an arbitrary set of trials or patients.
+
+    Args:
+        params (list): Parameters to merge
+        data_ids (list, optional): Restrict to these trials
+        patient_ids (list, optional): Restrict to these patients
+        data_frames (dict, optional): Already-loaded trials {data_id: dataframe}; any of these
+                                      without stored sketches are sketched on the fly
+
+    Returns:
+        tuple: ({parameter: QuantileSketch}, number of trials covered)
+    """
+    stored = load_sketches(params, data_ids, patient_ids)
+    per_param = {param: [] for param in params}
+    covered = set()
+
+    for (data_id, param), sketch in stored.items():
+        per_param[param].append(sketch)
+        covered.add(str(data_id))
+
+    for data_id, df in (data_frames or {}).items():
+        if str(data_id) not in covered:
+            for param, sketch in compute_trial_sketches(df, [p for p in params if p in df.columns]).items():
+                per_param[param].append(sketch)
+            covered.add(str(data_id))
+
+    return {param: QuantileSketch.merge(sketches) for param, sketches in per_param.items()}, len(covered)
+
+def query_percentiles(params, quantiles, data_ids=None, patient_ids=None, data_frames=None):
+    """
+    Approximate percentiles per parameter over any set of trials or patients.
+
+    Returns:
+        pd.DataFrame: One row per parameter, one column per requested quantile
+    """
+    sketches, _ = merged_sketches(params, data_ids, patient_ids, data_frames)
+    return pd.DataFrame(
+        {param: sketch.quantile(quantiles) for param, sketch in sketches.items()},
+        index=list(quantiles)
+    ).T
+
+def query_histogram(param, bins=30, data_ids=None, patient_ids=None, data_frames=None):
+    """
+    Approximate histogram for one parameter over any set of trials or patients.
+
+    Returns:
+        tuple: (counts, bin_edges)
+    """
+    sketches, _ = merged_sketches([param], data_ids, patient_ids, data_frames)
+    return sketches[param].histogram(bins)
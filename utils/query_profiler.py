@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Debug query profiler for the Streamlit pages.
+#   "0"     off (default): get_db_connection returns plain connections
+#   "1"     every rerun is profiled and gets the overlay
+#   "param" only reruns of pages opened with ?profile=1
+QUERY_PROFILER = os.getenv("QUERY_PROFILER", "0").strip().lower()
+
+# One JSON line per profiled rerun, for offline analysis
+QUERY_PROFILE_LOG = os.getenv("QUERY_PROFILE_LOG", os.path.join("logs", "query_profile.jsonl"))
+
+# Statements listed in the overlay and the log
+QUERY_PROFILE_TOP = int(os.getenv("QUERY_PROFILE_TOP", "10"))
+
+_SQL_LIMIT = 300
+_SESSION_KEY = "_query_profile"
+_WHITESPACE = re.compile(r"\s+")
+
+# The profile of the rerun running on this thread; Streamlit runs each rerun on its
+# session's script thread, so the DB calls it makes land on the same thread.
+_local = threading.local()
+_log_lock = threading.Lock()
+
+def profiler_available():
+    """True if connections should carry the profiling cursor at all"""
+    return QUERY_PROFILER in ("1", "param")
+
+def _statement_text(query):
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    # psycopg2.sql.Composed and friends have no plain text without a connection
+    text = query if isinstance(query, str) else repr(query)
+    return _WHITESPACE.sub(" ", text).strip()[:_SQL_LIMIT]
+
+class PageProfile:
+    """DB statements and section timings of one page rerun"""
+
+    def __init__(self, page):
+        self.page = page
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.finished = None
+        self.connects = 0
+        self.connect_seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        # {statement text: [executions, seconds, rows, slowest]}; parameters are never kept
+        self.statements = {}
+        # [(name, seconds, queries, db_seconds)] in completion order
+        self.sections = []
+
+    def record_connect(self, seconds):
+        self.connects += 1
+        self.connect_seconds += seconds
+
+    def record(self, query, seconds, rows):
+        rows = max(rows or 0, 0)
+        self.queries += 1
+        self.db_seconds += seconds
+        self.rows += rows
+        text = _statement_text(query)
+        entry = self.statements.get(text)
+        if entry is None:
+            entry = self.statements[text] = [0, 0.0, 0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += rows
+        entry[3] = max(entry[3], seconds)
+
+    @contextmanager
+    def section(self, name):
+        start, queries, db_seconds = time.perf_counter(), self.queries, self.db_seconds
+        try:
+            yield
+        finally:
+            self.sections.append((name, time.perf_counter() - start,
+                                  self.queries - queries, self.db_seconds - db_seconds))
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        return self
+
+    @property
+    def total_seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def top_statements(self, limit=None):
+        """Statements by total time: [{sql, calls, total_ms, max_ms, rows}]"""
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {'sql': text, 'calls': calls, 'total_ms': seconds * 1000, 'max_ms': slowest * 1000, 'rows': rows}
+            for text, (calls, seconds, rows, slowest) in ranked[:limit or QUERY_PROFILE_TOP]
+        ]
+
+    def repeated_statements(self, threshold=3):
+        """Statements run `threshold`+ times in one rerun: the usual sign of an N+1 loop"""
+        return {text: entry[0] for text, entry in self.statements.items() if entry[0] >= threshold}
+
+    def to_dict(self):
+        return {
+            'page': self.page,
+            'started_at': self.started_at.isoformat(),
+            'total_ms': round(self.total_seconds * 1000, 2),
+            'connects': self.connects,
+            'connect_ms': round(self.connect_seconds * 1000, 2),
+            'queries': self.queries,
+            'db_ms': round(self.db_seconds * 1000, 2),
+            'rows': self.rows,
+            'sections': [
+                {'name': name, 'ms': round(seconds * 1000, 2), 'queries': queries, 'db_ms': round(db * 1000, 2)}
+                for name, seconds, queries, db in self.sections
+            ],
+            'statements': [
+                {**entry, 'total_ms': round(entry['total_ms'], 2), 'max_ms': round(entry['max_ms'], 2)}
+                for entry in self.top_statements()
+            ],
+            'distinct_statements': len(self.statements),
+        }
+
+def current_profile():
+    """The PageProfile of the rerun on this thread, or None"""
+    return getattr(_local, "profile", None)
+
+def _cursor_class():
+    """psycopg2 cursor subclass that reports every execute to the current profile"""
+    import psycopg2.extensions
+
+    class ProfilingCursor(psycopg2.extensions.cursor):
+        # Client-side cursors fetch the whole result inside execute(), so its duration
+        # covers server time and transfer, and rowcount is the number of rows fetched.
+
+        def execute(self, query, vars=None):
+            profile = current_profile()
+            if profile is None:
+                return super().execute(query, vars)
+            start = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                profile.record(query, time.perf_counter() - start, self.rowcount)
+
+        def executemany(self, query, vars_list):
+            profile = current_profile()
+            if profile is None:
+                return super().executemany(query, vars_list)
+            start = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                profile.record(query, time.perf_counter() - start, self.rowcount)
+
+    return ProfilingCursor
+
+_profiling_cursor = None
+
+def profiled_connect(connect_fn, **kwargs):
+    """
+    Open a connection through `connect_fn` (psycopg2.connect), profiled when enabled.
+
+    The cursor class only checks a thread-local when no page is being profiled, so
+    connections handed to background threads cost nothing extra.
+    """
+    global _profiling_cursor
+    if not profiler_available():
+        return connect_fn(**kwargs)
+    if _profiling_cursor is None:
+        _profiling_cursor = _cursor_class()
+    start = time.perf_counter()
+    conn = connect_fn(cursor_factory=_profiling_cursor, **kwargs)
+    profile = current_profile()
+    if profile is not None:
+        profile.record_connect(time.perf_counter() - start)
+    return conn
+
+def _requested():
+    if QUERY_PROFILER == "1":
+        return True
+    if QUERY_PROFILER != "param":
+        return False
+    import streamlit as st
+    try:
+        return st.query_params.get("profile") == "1"
+    except Exception:
+        return False
+
+def start_page_profile(page):
+    """
+    Begin profiling this rerun of `page` (call once, near the top of the page).
+
+    Reruns cut short by st.stop() never reach render_profile_overlay(); their profile
+    is logged when the next rerun starts.
+
+    Returns:
+        PageProfile or None: None when profiling is off for this rerun
+    """
+    _local.profile = None
+    if not profiler_available():
+        return None
+
+    import streamlit as st
+    # Reruns may land on a new script thread, so the unfinished profile is found via the session
+    previous = st.session_state.get(_SESSION_KEY)
+    if previous is not None and previous.finished is None:
+        append_profile_log(previous.finish())
+    st.session_state[_SESSION_KEY] = None
+    if not _requested():
+        return None
+    _local.profile = st.session_state[_SESSION_KEY] = PageProfile(page)
+    return _local.profile
+
+@contextmanager
+def profile_section(name):
+    """Time a block of the page; a no-op when the rerun is not profiled"""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    with profile.section(name):
+        yield
+
+def append_profile_log(profile, path=None):
+    """Append one rerun to the JSON-lines log; errors are printed, never raised"""
+    path = path or QUERY_PROFILE_LOG
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(profile.to_dict(), default=str)
+        with _log_lock, open(path, "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+        return True
+    except Exception as e:
+        print(f"Error writing query profile log: {str(e)}")
+        return False
+
+def render_profile_overlay():
+    """
+    Finish the current rerun's profile, log it and show it in a collapsed sidebar
+    expander (call once, at the end of the page). Does nothing when not profiled.
+    """
+    profile = current_profile()
+    if profile is None or profile.finished is not None:
+        return None
+    profile.finish()
+    _local.profile = None
+    append_profile_log(profile)
+
+    import streamlit as st
+    import pandas as pd
+    summary = profile.to_dict()
+    with st.sidebar.expander(f"🔍 Query profile: {summary['queries']} queries, {summary['db_ms']:.0f} ms", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("Queries", summary['queries'])
+        col2.metric("DB time", f"{summary['db_ms']:.0f} ms")
+        col1.metric("Rows fetched", summary['rows'])
+        col2.metric("Connections", summary['connects'], help=f"{summary['connect_ms']:.0f} ms connecting")
+        st.caption(f"Rerun took {summary['total_ms']:.0f} ms; "
+                   f"{summary['distinct_statements']} distinct statements")
+
+        repeated = profile.repeated_statements()
+        if repeated:
+            st.warning(f"{len(repeated)} statement(s) ran 3+ times in this rerun (N+1 pattern?)")
+
+        if summary['sections']:
+            st.markdown("**Sections**")
+            st.dataframe(pd.DataFrame(summary['sections']), hide_index=True, use_container_width=True)
+        if summary['statements']:
+            st.markdown("**Statements by total time**")
+            st.dataframe(pd.DataFrame(summary['statements'])[['calls', 'total_ms', 'max_ms', 'rows', 'sql']],
+                         hide_index=True, use_container_width=True)
+        st.caption(f"Logged to {QUERY_PROFILE_LOG}")
+    return profile
@@ -0,0 +1,147 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Frames transformed per chunk; bounds memory to about CHUNK_FRAMES * nperseg values
+SPECTRAL_CHUNK_FRAMES = int(os.getenv("SPECTRAL_CHUNK_FRAMES", "512"))
+
+# Display grid the spectrogram is pooled down to
+SPECTROGRAM_TIME_BINS = int(os.getenv("SPECTROGRAM_TIME_BINS", "600"))
+SPECTROGRAM_FREQ_BINS = int(os.getenv("SPECTROGRAM_FREQ_BINS", "128"))
+
+def estimate_sampling_rate(timestamps):
+    """
+    Sampling rate in Hz from the median spacing of a timestamp column.
+
+    Args:
+        timestamps: Timestamp values (datetime-like or parseable strings)
+
+    Returns:
+        float: Samples per second, or None if it can't be worked out
+    """
+    ts = pd.to_datetime(pd.Series(timestamps), errors='coerce').dropna()
+    if len(ts) < 2:
+        return None
+    if getattr(ts.dt, 'tz', None) is not None:
+        ts = ts.dt.tz_convert(None)
+
+    ns = np.sort(ts.astype('datetime64[ns]').to_numpy().view('int64'))
+    steps = np.diff(ns)
+    steps = steps[steps > 0]
+    if len(steps) == 0:
+        return None
+    return 1e9 / float(np.median(steps))
+
+def uniform_signal(df, param, timestamp_col=None):
+    """
+    Pull a parameter as an evenly sampled signal.
+
+    With a timestamp column the readings are interpolated onto a regular grid at the
+    median sampling rate, so jitter and small gaps don't distort frequencies. Without one,
+    the samples are taken as-is at 1 Hz.
+
+    Returns:
+        tuple: (signal np.ndarray, sampling rate in Hz, start time or None)
+    """
+    values = pd.to_numeric(df[param], errors='coerce')
+
+    if timestamp_col and timestamp_col in df.columns:
+        ts = pd.to_datetime(df[timestamp_col], errors='coerce')
+        if getattr(ts.dt, 'tz', None) is not None:
+            ts = ts.dt.tz_convert(None)
+        valid = ts.notna() & values.notna()
+        fs = estimate_sampling_rate(ts[valid])
+        if fs:
+            t_ns = ts[valid].astype('datetime64[ns]').to_numpy().view('int64')
+            order = np.argsort(t_ns, kind='stable')
+            t = (t_ns[order] - t_ns[order][0]) / 1e9
+            y = values[valid].to_numpy(dtype=float)[order]
+            grid = np.arange(0.0, t[-1] + 0.5 / fs, 1.0 / fs)
+            return np.interp(grid, t, y), fs, ts[valid].iloc[order[0]]
+
+    return values.dropna().to_numpy(dtype=float), 1.0, None
+
+def _pool(values, factor, axis):
+    """Average consecutive groups of `factor` entries along an axis (the ragged tail is averaged too)"""
+    if factor <= 1:
+        return values
+    n = values.shape[axis]
+    edges = np.arange(0, n, factor)
+    sums = np.add.reduceat(values, edges, axis=axis)
+    counts = np.diff(np.append(edges, n))
+    shape = [1] * values.ndim
+    shape[axis] = len(counts)
+    return sums / counts.reshape(shape)
+
+def chunked_spectrogram(signal, fs, nperseg=256, noverlap=None, window='hann',
+                        time_bins=None, freq_bins=None, chunk_frames=None):
+    """
+    Short-time Fourier power spectrogram and Welch PSD computed chunk by chunk.
+
+    Frames are transformed CHUNK_FRAMES at a time and immediately pooled onto the
+    display grid, so memory is bounded by the chunk and grid sizes rather than the
+    signal length. The Welch PSD is the running mean of every frame's periodogram.
+
+    Args:
+        signal (np.ndarray): Evenly sampled signal
+        fs (float): Sampling rate in Hz
+        nperseg (int): Samples per window
+        noverlap (int, optional): Overlapping samples between windows (defaults to nperseg // 2)
+        window (str): scipy window name
+        time_bins (int, optional): Maximum time columns in the output
+        freq_bins (int, optional): Maximum frequency rows in the output
+        chunk_frames (int, optional): Frames transformed per chunk
+
+    Returns:
+        dict: {'times' (s, bin centres), 'freqs' (Hz), 'power' (freq x time, PSD units),
+               'welch_freqs', 'welch_psd', 'fs', 'nperseg'} or None if the signal is too short
+    """
+    signal = np.asarray(signal, dtype=float)
+    signal = signal - np.mean(signal) if len(signal) else signal
+    nperseg = int(min(nperseg, len(signal)))
+    if nperseg < 8:
+        return None
+
+    noverlap = nperseg // 2 if noverlap is None else int(min(noverlap, nperseg - 1))
+    step = nperseg - noverlap
+    n_frames = 1 + (len(signal) - nperseg) // step
+
+    from scipy.signal import get_window
+    win = get_window(window, nperseg)
+    # One-sided PSD density scaling (as scipy.signal.welch with scaling='density')
+    scale = np.full(nperseg // 2 + 1, 2.0 / (fs * np.sum(win ** 2)))
+    scale[0] /= 2
+    if nperseg % 2 == 0:
+        scale[-1] /= 2
+
+    frames_per_bin = -(-n_frames // (time_bins or SPECTROGRAM_TIME_BINS))
+    # Keep chunk boundaries on display-bin boundaries so no bin straddles two chunks
+    chunk = max(1, (chunk_frames or SPECTRAL_CHUNK_FRAMES) // frames_per_bin) * frames_per_bin
+
+    pooled = []
+    psd_sum = np.zeros(nperseg // 2 + 1)
+    for first in range(0, n_frames, chunk):
+        count = min(chunk, n_frames - first)
+        start = first * step
+        segment = signal[start:start + (count - 1) * step + nperseg]
+        frames = np.lib.stride_tricks.sliding_window_view(segment, nperseg)[::step][:count]
+
+        power = np.abs(np.fft.rfft(frames * win, axis=1)) ** 2 * scale
+        psd_sum += power.sum(axis=0)
+        pooled.append(_pool(power, frames_per_bin, axis=0))
+
+    power = np.concatenate(pooled, axis=0).T
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / fs)
+
+    freq_factor = -(-len(freqs) // (freq_bins or SPECTROGRAM_FREQ_BINS))
+    frame_centres = (np.arange(n_frames) * step + nperseg / 2) / fs
+
+    return {
+        'times': _pool(frame_centres, frames_per_bin, axis=0),
+        'freqs': _pool(freqs, freq_factor, axis=0),
+        'power': _pool(power, freq_factor, axis=0),
+        'welch_freqs': freqs,
+        'welch_psd': psd_sum / n_frames,
+        'fs': fs,
+        'nperseg': nperseg
+    }
@@ -0,0 +1,79 @@
+import os
+import base64
+import hashlib
+import mimetypes
+import threading
+import streamlit as st
+
+# Streamlit serves <app root>/static at app/static/ when server.enableStaticServing is on
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+STATIC_URL = "app/static"
+
+# Process-wide: {absolute path: (mtime, sha256 prefix, bytes)}; shared by every session and rerun
+_assets = {}
+_data_uris = {}
+_lock = threading.Lock()
+
+def _resolve(name):
+    """Absolute path of an asset named relative to static/ (e.g. 'enhanced_style.css')"""
+    return os.path.normpath(os.path.join(STATIC_DIR, name))
+
+def _load(name):
+    """(content hash, bytes) of an asset, read from disk only when the file changes"""
+    path = _resolve(name)
+    mtime = os.path.getmtime(path)
+    cached = _assets.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    with _lock:
+        _assets[path] = (mtime, digest, data)
+    return digest, data
+
+def asset_hash(name):
+    """Content hash of an asset (changes whenever the file does)"""
+    return _load(name)[0]
+
+def static_serving_enabled():
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+def asset_url(name):
+    """
+    URL for an image (or other binary) asset, for <img src> and CSS url().
+
+    With static serving on this is a short app/static/<name>?v=<hash> URL the browser
+    fetches once and caches, so reruns only resend the URL. Otherwise it falls back to a
+    data URI that is base64-encoded once per process and content version.
+    """
+    digest, data = _load(name)
+    path = _resolve(name)
+
+    if static_serving_enabled() and path.startswith(STATIC_DIR + os.sep):
+        relative = os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+        return f"{STATIC_URL}/{relative}?v={digest}"
+
+    key = (path, digest)
+    uri = _data_uris.get(key)
+    if uri is None:
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        uri = f"data:{mimetype};base64,{base64.b64encode(data).decode()}"
+        with _lock:
+            # Drop encodings of older versions of the same file
+            for stale in [k for k in _data_uris if k[0] == path]:
+                del _data_uris[stale]
+            _data_uris[key] = uri
+    return uri
+
+def asset_text(name):
+    """Decoded text of a text asset (CSS), cached per content version"""
+    return _load(name)[1].decode("utf-8")
+
+def inject_css(name):
+    """Apply a stylesheet from static/ without reopening the file on every rerun"""
+    st.markdown(f"<style>{asset_text(name)}</style>", unsafe_allow_html=True)
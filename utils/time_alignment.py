@@ -0,0 +1,201 @@
+import os
+import numpy as np
+import pandas as pd
+
+ALIGNMENT_METHODS = ["interpolate", "ffill", "nearest", "mean"]
+
+# Most grid points an alignment may produce; beyond this the step is coarsened
+ALIGN_MAX_GRID_POINTS = int(os.getenv("ALIGN_MAX_GRID_POINTS", "200000"))
+
+def _to_epoch_ns(timestamps):
+    """
+    Convert a timestamp column to int64 nanoseconds since epoch (UTC for tz-aware input).
+
+    Returns:
+        tuple: (int64 array with invalid entries dropped, boolean mask of valid rows, tz or None)
+    """
+    ts = pd.to_datetime(timestamps, errors='coerce')
+    tz = getattr(ts.dt, 'tz', None)
+    if tz is not None:
+        ts = ts.dt.tz_convert(None)
+    valid = ts.notna().to_numpy()
+    ns = ts[valid].astype('datetime64[ns]').to_numpy().view('int64')
+    return ns, valid, tz
+
+def _series_arrays(df, ts_col, val_col):
+    """Pull sorted (time_ns, value) arrays for one dataset, dropping invalid rows"""
+    ns, valid, tz = _to_epoch_ns(df[ts_col])
+    values = pd.to_numeric(df[val_col], errors='coerce').to_numpy(dtype=float)[valid]
+
+    finite = np.isfinite(values)
+    ns, values = ns[finite], values[finite]
+
+    order = np.argsort(ns, kind='stable')
+    return ns[order], values[order], tz
+
+def _freq_to_ns(freq):
+    """Grid step in nanoseconds for a pandas frequency string like '1s' or '5min'"""
+    return int(pd.Timedelta(pd.tseries.frequencies.to_offset(freq)).value)
+
+def build_time_grid(start_ns, end_ns, freq='1s'):
+    """
+    Build one regular grid covering [start, end] at the given frequency.
+
+    Args:
+        start_ns (int): Earliest timestamp in ns since epoch
+        end_ns (int): Latest timestamp in ns since epoch
+        freq (str): Pandas frequency string for the grid step
+
+    Returns:
+        np.ndarray: int64 grid in ns since epoch, aligned to multiples of the step
+    """
+    step = _freq_to_ns(freq)
+    first = (start_ns // step) * step
+    return np.arange(first, end_ns + 1, step, dtype=np.int64)
+
+def _merge_spans(spans, step):
+    """Union of [start, end] spans in ns, joining spans less than one step apart"""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + step:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def _span_points(spans, step):
+    return sum(end // step - start // step + 1 for start, end in spans)
+
+def build_span_grid(spans, step, max_points=None):
+    """
+    Build a grid only over the time spans some series covers.
+
+    Trials recorded weeks apart would otherwise get one grid over the whole gap, all
+    of it NaN. Grid points stay on multiples of the step, so a series sampled over
+    any covered span sees the same points as on a continuous grid. If the spans still
+    need more than max_points, the step is widened until they fit.
+
+    Args:
+        spans (list): (start_ns, end_ns) of each series
+        step (int): Grid step in ns
+        max_points (int, optional): Grid size cap (defaults to ALIGN_MAX_GRID_POINTS)
+
+    Returns:
+        tuple: (int64 grid, step actually used in ns)
+    """
+    max_points = max_points or ALIGN_MAX_GRID_POINTS
+    merged = _merge_spans(spans, step)
+    points = _span_points(merged, step)
+    requested = step
+    while points > max_points:
+        step *= max(2, -(-points // max_points))
+        merged = _merge_spans(spans, step)
+        points = _span_points(merged, step)
+    if step != requested:
+        print(f"[WARN] Alignment grid would need more than {max_points} points; "
+              f"step coarsened from {pd.Timedelta(requested)} to {pd.Timedelta(step)}")
+
+    pieces = [np.arange((start // step) * step, end + 1, step, dtype=np.int64) for start, end in merged]
+    return np.concatenate(pieces), step
+
+def _sample_onto_grid(grid, t, v, method, step):
+    """Sample one sorted series onto the grid; points outside the series' span become NaN"""
+    if method == 'mean':
+        # Average of the readings in [grid[i], grid[i] + step); the grid may have gaps
+        bins = np.clip(np.searchsorted(grid, t, side='right') - 1, 0, len(grid) - 1)
+        sums = np.bincount(bins, weights=v, minlength=len(grid))
+        counts = np.bincount(bins, minlength=len(grid))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    out = np.full(len(grid), np.nan)
+    inside = (grid >= t[0]) & (grid <= t[-1])
+    if not inside.any():
+        return out
+    g = grid[inside]
+
+    if method == 'interpolate':
+        out[inside] = np.interp(g, t, v)
+    elif method == 'ffill':
+        idx = np.searchsorted(t, g, side='right') - 1
+        out[inside] = v[idx]
+    elif method == 'nearest':
+        right = np.clip(np.searchsorted(t, g, side='left'), 0, len(t) - 1)
+        left = np.clip(right - 1, 0, len(t) - 1)
+        use_left = np.abs(g - t[left]) <= np.abs(t[right] - g)
+        out[inside] = v[np.where(use_left, left, right)]
+    else:
+        raise ValueError(f"Unknown alignment method: {method}")
+
+    return out
+
+def align_time_series(data_frames, value_columns, timestamp_columns, method='interpolate', freq='1s'):
+    """
+    Align any number of time series onto one common time grid in a single pass.
+
+    Every series is sorted once and sampled onto the shared grid with vectorized
+    np.interp / searchsorted, so the cost is O(total samples + k * grid length)
+    with no repeated merges or re-sorts. The grid covers only the spans some series
+    has data in and is capped at ALIGN_MAX_GRID_POINTS (see build_span_grid), so
+    trials far apart in time do not produce a grid over the gap between them.
+
+    Args:
+        data_frames (dict): Dictionary of dataframes {data_id: dataframe}
+        value_columns (dict): Dictionary of value column names {data_id: column_name}
+        timestamp_columns (dict): Dictionary of timestamp column names {data_id: column_name}
+        method (str): 'interpolate', 'ffill', 'nearest' or 'mean' (per-bin average)
+        freq (str): Grid frequency (coarsened if the grid would exceed the cap)
+
+    Returns:
+        tuple: (grid, values, columns, tz) where grid is an int64 ns array,
+               values is a (len(grid), k) float array column-stacked in `columns` order,
+               columns is a list of (data_id, column_label) and tz is the
+               timezone of the first tz-aware input (or None)
+        Returns (None, None, [], None) if no dataset has usable data.
+    """
+    series = []
+    tz = None
+    for data_id, df in data_frames.items():
+        if (data_id in timestamp_columns and timestamp_columns[data_id] in df.columns and
+            data_id in value_columns and value_columns[data_id] in df.columns):
+            t, v, series_tz = _series_arrays(df, timestamp_columns[data_id], value_columns[data_id])
+            if len(t):
+                series.append((data_id, f"{value_columns[data_id]}_{data_id}", t, v))
+                tz = tz or series_tz
+
+    if not series:
+        return None, None, [], None
+
+    grid, step = build_span_grid([(t[0], t[-1]) for _, _, t, _ in series], _freq_to_ns(freq))
+
+    values = np.empty((len(grid), len(series)))
+    for col, (_, _, t, v) in enumerate(series):
+        values[:, col] = _sample_onto_grid(grid, t, v, method, step)
+
+    columns = [(data_id, label) for data_id, label, _, _ in series]
+    return grid, values, columns, tz
+
+def aligned_to_frame(grid, values, columns, timestamp_name='timestamp', tz=None):
+    """
+    Wrap an aligned grid/array pair as a DataFrame without copying the values.
+
+    Args:
+        grid (np.ndarray): int64 ns grid from align_time_series
+        values (np.ndarray): (len(grid), k) aligned values
+        columns (list): (data_id, column_label) pairs from align_time_series
+        timestamp_name (str): Name of the timestamp column
+        tz: Timezone to convert the timestamps back to (None for naive)
+
+    Returns:
+        pd.DataFrame: Timestamp column followed by one column per aligned series
+    """
+    if grid is None:
+        return pd.DataFrame()
+
+    timestamps = pd.to_datetime(grid.view('datetime64[ns]'))
+    if tz is not None:
+        timestamps = timestamps.tz_localize('UTC').tz_convert(tz)
+
+    frame = pd.DataFrame(values, columns=[label for _, label in columns], copy=False)
+    frame.insert(0, timestamp_name, timestamps)
+    return frame
@@ -0,0 +1,212 @@
+import os
+import numpy as np
+
+# scipy and statsmodels are imported inside the smoothers: pages import this module for
+# TREND_METHODS, and the statsmodels import alone costs more than the page's first render.
+
+# Series up to this many points get an exact LOWESS fit; longer ones are binned first
+TREND_EXACT_MAX_POINTS = int(os.getenv("TREND_EXACT_MAX_POINTS", "5000"))
+
+# Number of bins the large-n methods reduce a series to before smoothing
+TREND_BIN_COUNT = int(os.getenv("TREND_BIN_COUNT", "2000"))
+
+# Method used above the cutoff when method='auto' ('binned_lowess' or 'savgol')
+TREND_LARGE_METHOD = os.getenv("TREND_LARGE_METHOD", "binned_lowess")
+
+TREND_METHODS = ["auto", "lowess", "binned_lowess", "savgol", "ema"]
+
+def trend_fraction(n, window=None):
+    """
+    Work out the LOWESS span fraction the way create_trend_analysis always has.
+
+    Args:
+        n (int): Number of points in the series
+        window (int, optional): Smoothing window size in points
+
+    Returns:
+        float: Fraction of the series used for each local fit
+    """
+    if window is None:
+        window = max(3, n // 5)
+    return min(1.0, max(0.1, window / n))
+
+def _bin_series(x, y, bins):
+    """Reduce (x, y) to per-bin means over equal-width x bins, dropping empty bins"""
+    edges = np.linspace(x[0], x[-1], bins + 1)
+    idx = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, bins - 1)
+    counts = np.bincount(idx, minlength=bins)
+    keep = counts > 0
+    x_binned = np.bincount(idx, weights=x, minlength=bins)[keep] / counts[keep]
+    y_binned = np.bincount(idx, weights=y, minlength=bins)[keep] / counts[keep]
+    return x_binned, y_binned
+
+def lowess_trend(x, y, frac):
+    """
+    Exact LOWESS fit at every point (cost grows with n * frac * n).
+
+    Args:
+        x (np.ndarray): Sorted x values
+        y (np.ndarray): y values
+        frac (float): Span fraction
+
+    Returns:
+        np.ndarray: Trend values aligned with x
+    """
+    from statsmodels.nonparametric.smoothers_lowess import lowess
+    return lowess(y, x, frac=frac, it=1, return_sorted=False)
+
+def binned_lowess_trend(x, y, frac, bins=None):
+    """
+    LOWESS on per-bin means, interpolated back onto the original x.
+
+    The span fraction is kept, so the curve has the same shape as the exact fit,
+    and statsmodels' delta skips regressions between nearby anchor points.
+
+    Args:
+        x (np.ndarray): Sorted x values
+        y (np.ndarray): y values
+        frac (float): Span fraction
+        bins (int, optional): Number of bins (defaults to TREND_BIN_COUNT)
+
+    Returns:
+        np.ndarray: Trend values aligned with x
+    """
+    bins = bins or TREND_BIN_COUNT
+    if len(x) <= bins:
+        x_binned, y_binned = x, y
+    else:
+        x_binned, y_binned = _bin_series(x, y, bins)
+
+    from statsmodels.nonparametric.smoothers_lowess import lowess
+    delta = 0.01 * (x_binned[-1] - x_binned[0])
+    trend_binned = lowess(y_binned, x_binned, frac=frac, it=1, delta=delta, return_sorted=False)
+    return np.interp(x, x_binned, trend_binned)
+
+def savgol_trend(x, y, frac, bins=None, polyorder=2):
+    """
+    Savitzky-Golay smoothing on per-bin means, interpolated back onto the original x.
+
+    Args:
+        x (np.ndarray): Sorted x values
+        y (np.ndarray): y values
+        frac (float): Span fraction, converted to an odd window over the bins
+        bins (int, optional): Number of bins (defaults to TREND_BIN_COUNT)
+        polyorder (int): Polynomial order of each local fit
+
+    Returns:
+        np.ndarray: Trend values aligned with x
+    """
+    bins = bins or TREND_BIN_COUNT
+    if len(x) <= bins:
+        x_binned, y_binned = x, y
+    else:
+        x_binned, y_binned = _bin_series(x, y, bins)
+
+    # savgol needs an odd window no longer than the series
+    largest_odd = len(y_binned) if len(y_binned) % 2 else len(y_binned) - 1
+    window_length = min(int(frac * len(y_binned)) | 1, largest_odd)
+    if window_length <= polyorder:
+        return np.interp(x, x_binned, y_binned)
+
+    from scipy.signal import savgol_filter
+    trend_binned = savgol_filter(y_binned, window_length, polyorder, mode='interp')
+    return np.interp(x, x_binned, trend_binned)
+
+def ema_trend(y, window):
+    """
+    Exponential moving average over a whole series in one vectorized pass.
+
+    Args:
+        y (np.ndarray): y values
+        window (int): Equivalent window size; alpha = 2 / (window + 1)
+
+    Returns:
+        np.ndarray: Trend values aligned with y
+    """
+    from scipy.signal import lfilter
+    alpha = 2.0 / (max(1, window) + 1.0)
+    # y_t = alpha * x_t + (1 - alpha) * y_{t-1}, seeded with the first value
+    trend, _ = lfilter([alpha], [1.0, alpha - 1.0], y, zi=[(1.0 - alpha) * y[0]])
+    return trend
+
+class StreamingEMA:
+    """O(1) exponential moving average for live readings"""
+
+    def __init__(self, window=5):
+        """
+        Args:
+            window (int): Equivalent window size; alpha = 2 / (window + 1)
+        """
+        self.alpha = 2.0 / (max(1, window) + 1.0)
+        self.value = None
+        self.count = 0
+
+    def update(self, reading):
+        """
+        Fold one reading into the average.
+
+        Args:
+            reading (float): New value (NaN/None readings are ignored)
+
+        Returns:
+            float: Current trend value (None until the first valid reading)
+        """
+        if reading is None or reading != reading:
+            return self.value
+        if self.value is None:
+            self.value = float(reading)
+        else:
+            self.value += self.alpha * (float(reading) - self.value)
+        self.count += 1
+        return self.value
+
+def choose_trend_method(n, method='auto', exact_max_points=None):
+    """
+    Pick the smoothing algorithm for a series of n points.
+
+    Args:
+        n (int): Number of points
+        method (str): Requested method, or 'auto' to decide by size
+        exact_max_points (int, optional): Size cutoff for exact LOWESS
+                                          (defaults to TREND_EXACT_MAX_POINTS)
+
+    Returns:
+        str: One of 'lowess', 'binned_lowess', 'savgol', 'ema'
+    """
+    if method != 'auto':
+        return method
+    cutoff = TREND_EXACT_MAX_POINTS if exact_max_points is None else exact_max_points
+    return 'lowess' if n <= cutoff else TREND_LARGE_METHOD
+
+def compute_trend(y, x=None, window=None, method='auto', exact_max_points=None, bins=None):
+    """
+    Compute a smoothed trend, choosing the algorithm by series size.
+
+    Args:
+        y (array-like): Values to smooth (no NaNs)
+        x (array-like, optional): Sorted x values; defaults to 0..n-1
+        window (int, optional): Smoothing window size in points
+        method (str): 'auto', 'lowess', 'binned_lowess', 'savgol' or 'ema'
+        exact_max_points (int, optional): Size cutoff for exact LOWESS when method='auto'
+        bins (int, optional): Bin count for the large-n methods
+
+    Returns:
+        tuple: (trend_values, method_used)
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+
+    method = choose_trend_method(n, method, exact_max_points)
+    frac = trend_fraction(n, window)
+
+    if method == 'lowess':
+        return lowess_trend(x, y, frac), method
+    if method == 'binned_lowess':
+        return binned_lowess_trend(x, y, frac, bins), method
+    if method == 'savgol':
+        return savgol_trend(x, y, frac, bins), method
+    if method == 'ema':
+        return ema_trend(y, window if window is not None else max(3, n // 5)), method
+
+    raise ValueError(f"Unknown trend method: {method}")
@@ -0,0 +1,92 @@
+import os
+import pandas as pd
+from utils.trial_moments import compute_trial_moments, save_trial_moments
+from utils.quantile_sketch import compute_trial_sketches, save_trial_sketches
+
+# Opt-in: after a trial is saved, queue a background job storing its default FFT, trend,
+# outlier (and HRV) results, so the first Advanced Visualization view of it is a lookup
+PRECOMPUTE_ANALYTICS = os.getenv("PRECOMPUTE_ANALYTICS", "false").lower() in ("1", "true", "yes")
+
+def trial_frame_from_series(simple_data):
+    """Build a dataframe from the {'timestamps': [...], param: [...]} layout saved by end_trial"""
+    frame = pd.DataFrame({key: values for key, values in simple_data.items() if key != "timestamps"})
+    if "timestamps" in simple_data:
+        frame["timestamps"] = pd.to_datetime(simple_data["timestamps"], errors="coerce")
+    return frame
+
+def run_trial_finalizers(cursor, data_id, patient_id, df):
+    """
+    Store the per-trial moments and quantile sketches right after a trial is saved
+    to patient_data. Both are single passes over the data; the heavier default
+    analyses are queued separately after commit (see queue_trial_precompute).
+
+    Runs inside the caller's transaction behind a savepoint, so a failure here
+    is logged and rolled back without losing the trial itself.
+
+    Args:
+        cursor: psycopg2 cursor of the finalization transaction
+        data_id (int): The new patient_data row
+        patient_id (int): Owner of the trial
+        df (pd.DataFrame): The trial data
+    """
+    cursor.execute("SAVEPOINT trial_finalizers")
+    try:
+        moments = compute_trial_moments(df)
+        if moments:
+            save_trial_moments(cursor, data_id, patient_id, moments)
+        sketches = compute_trial_sketches(df)
+        if sketches:
+            save_trial_sketches(cursor, data_id, patient_id, sketches)
+        cursor.execute("RELEASE SAVEPOINT trial_finalizers")
+    except Exception as e:
+        print(f"Error precomputing trial summaries for data_id {data_id}: {str(e)}")
+        cursor.execute("ROLLBACK TO SAVEPOINT trial_finalizers")
+
+def precompute_trial_analyses(data_id, df):
+    """
+    Store the default analyses of a committed trial (runs in an analysis worker process).
+
+    Args:
+        data_id (int): The patient_data row
+        df (pd.DataFrame): The trial data
+
+    Returns:
+        bool: True if the results were stored
+    """
+    # Imported lazily: the analysis functions pull in the plotting stack
+    from backend_auth import get_db_connection
+    from utils.multi_data_backend import precompute_default_analyses
+
+    conn = get_db_connection(workload='analytics')
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            precompute_default_analyses(cursor, data_id, df)
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Error precomputing analyses for data_id {data_id}: {str(e)}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def queue_trial_precompute(data_id, df):
+    """
+    Queue precompute_trial_analyses on the analysis job runner when PRECOMPUTE_ANALYTICS
+    is set. Call after the trial is committed; ending the trial never waits for it.
+
+    Returns:
+        str or None: Job id, or None if precompute is disabled or could not be queued
+    """
+    if not PRECOMPUTE_ANALYTICS:
+        return None
+    try:
+        from utils.job_runner import submit_job, job_key
+        return submit_job(f"Precompute trial {data_id}",
+                          {'precompute': (precompute_trial_analyses, (data_id, df), {})},
+                          job_id=job_key('precompute', data_id))
+    except Exception as e:
+        print(f"Error queueing analysis precompute for data_id {data_id}: {str(e)}")
+        return None
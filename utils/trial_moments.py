@@ -0,0 +1,217 @@
+import json
+import numpy as np
+import pandas as pd
+from backend_auth import get_db_connection
+
+# Columns that are metadata rather than measured parameters
+NON_PARAMETER_COLUMNS = ['data_id', 'patient_id', 'time_seconds', 'time_minutes']
+
+TRIAL_MOMENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trial_moments (
+    data_id INTEGER PRIMARY KEY,
+    patient_id INTEGER NOT NULL,
+    moments JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_trial_moments_patient_id ON trial_moments(patient_id);
+"""
+
+def get_parameter_columns(df):
+    """Numeric measurement columns of a trial dataframe"""
+    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+    return [col for col in numeric_cols if col not in NON_PARAMETER_COLUMNS]
+
+def compute_trial_moments(df, params=None):
+    """
+    Compute mergeable sufficient statistics for one trial.
+
+    For every parameter pair (i, j) the statistics cover the rows where both
+    values are present, so merged results match pandas' pairwise-complete
+    Pearson correlation exactly:
+        n[i][j]     = count of rows with both i and j present
+        sum[i][j]   = sum of x_i over those rows
+        sumsq[i][j] = sum of x_i ** 2 over those rows
+        cross[i][j] = sum of x_i * x_j over those rows
+    The diagonal holds the plain per-parameter count, sum and sum of squares.
+
+    Args:
+        df (pd.DataFrame): Trial data
+        params (list, optional): Parameters to include (defaults to all numeric measurement columns)
+
+    Returns:
+        dict: JSON-serializable moments {'params', 'n', 'sum', 'sumsq', 'cross'} or None
+    """
+    if df is None or df.empty:
+        return None
+
+    params = [p for p in (params or get_parameter_columns(df)) if p in df.columns]
+    if not params:
+        return None
+
+    values = df[params].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    present = np.isfinite(values)
+    mask = present.astype(float)
+    filled = np.where(present, values, 0.0)
+
+    return {
+        'params': params,
+        'n': (mask.T @ mask).astype(int).tolist(),
+        'sum': (filled.T @ mask).tolist(),
+        'sumsq': ((filled ** 2).T @ mask).tolist(),
+        'cross': (filled.T @ filled).tolist()
+    }
+
+def merge_moments(moments_list):
+    """
+    Combine the moments of any set of trials into one set of moments.
+
+    Trials may have different parameter sets; the result covers their union.
+
+    Args:
+        moments_list (list): Moments dicts from compute_trial_moments (None entries are skipped)
+
+    Returns:
+        dict: Merged moments, or None if nothing was given
+    """
+    moments_list = [m for m in moments_list if m]
+    if not moments_list:
+        return None
+
+    params = []
+    for moments in moments_list:
+        params.extend(p for p in moments['params'] if p not in params)
+    position = {p: i for i, p in enumerate(params)}
+
+    k = len(params)
+    merged = {key: np.zeros((k, k)) for key in ('n', 'sum', 'sumsq', 'cross')}
+    for moments in moments_list:
+        idx = np.array([position[p] for p in moments['params']])
+        block = np.ix_(idx, idx)
+        for key in merged:
+            merged[key][block] += np.asarray(moments[key], dtype=float)
+
+    result = {key: value.tolist() for key, value in merged.items()}
+    result['n'] = merged['n'].astype(int).tolist()
+    result['params'] = params
+    return result
+
+def pooled_statistics(moments, params=None):
+    """
+    Turn (merged) moments into pooled means, variances and a Pearson correlation matrix.
+
+    Args:
+        moments (dict): Moments from compute_trial_moments or merge_moments
+        params (list, optional): Subset/order of parameters to report
+
+    Returns:
+        tuple: (counts pd.Series, means pd.Series, variances pd.Series, correlation pd.DataFrame)
+    """
+    all_params = moments['params']
+    params = [p for p in (params or all_params) if p in all_params]
+    idx = np.array([all_params.index(p) for p in params], dtype=int)
+    block = np.ix_(idx, idx)
+
+    n = np.asarray(moments['n'], dtype=float)[block]
+    s = np.asarray(moments['sum'], dtype=float)[block]
+    q = np.asarray(moments['sumsq'], dtype=float)[block]
+    c = np.asarray(moments['cross'], dtype=float)[block]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Centered sums over the rows shared by each pair
+        ss = np.maximum(q - s ** 2 / n, 0.0)
+        sp = c - s * s.T / n
+        corr = sp / np.sqrt(ss * ss.T)
+
+        counts = np.diag(n)
+        means = np.diag(s) / counts
+        variances = np.diag(ss) / (counts - 1)
+
+    corr[n < 2] = np.nan
+    corr = np.clip(corr, -1.0, 1.0)
+    np.fill_diagonal(corr, np.where(np.diag(ss) > 0, 1.0, np.nan))
+
+    return (
+        pd.Series(counts.astype(int), index=params),
+        pd.Series(means, index=params),
+        pd.Series(variances, index=params),
+        pd.DataFrame(corr, index=params, columns=params)
+    )
+
+def save_trial_moments(cursor, data_id, patient_id, moments):
+    """
+    Store a trial's moments using an open cursor (caller commits).
+
+    Args:
+        cursor: psycopg2 cursor inside the finalization transaction
+        data_id (int): patient_data row the moments describe
+        patient_id (int): Owner of the trial
+        moments (dict): Moments from compute_trial_moments
+    """
+    cursor.execute(TRIAL_MOMENTS_SCHEMA)
+    cursor.execute("""
+        INSERT INTO trial_moments (data_id, patient_id, moments)
+        VALUES (%s, %s, %s::jsonb)
+        ON CONFLICT (data_id) DO UPDATE SET moments = EXCLUDED.moments, created_at = NOW()
+    """, (data_id, patient_id, json.dumps(moments)))
+
+def _fetch_moments(query, args):
+    """Run a trial_moments query and return {data_id: moments}"""
+    conn = get_db_connection()
+    if not conn:
+        return {}
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, args)
+            rows = cursor.fetchall()
+    except Exception as e:
+        print(f"Error loading trial moments: {str(e)}")
+        return {}
+    finally:
+        conn.close()
+
+    return {
+        data_id: (json.loads(moments) if isinstance(moments, str) else moments)
+        for data_id, moments in rows
+    }
+
+def load_trial_moments(data_ids):
+    """Stored moments for specific trials as {data_id: moments} (missing trials are absent)"""
+    if not data_ids:
+        return {}
+    return _fetch_moments("""
+        SELECT data_id, moments FROM trial_moments WHERE data_id = ANY(%s)
+    """, ([int(d) for d in data_ids],))
+
+def load_patient_moments(patient_id):
+    """Stored moments for every trial of one patient as {data_id: moments}"""
+    return _fetch_moments("""
+        SELECT data_id, moments FROM trial_moments WHERE patient_id = %s
+    """, (patient_id,))
+
+def load_cohort_moments(patient_ids=None):
+    """Stored moments for a set of patients (or everyone) as {data_id: moments}"""
+    if patient_ids is None:
+        return _fetch_moments("SELECT data_id, moments FROM trial_moments", ())
+    return _fetch_moments("""
+        SELECT data_id, moments FROM trial_moments WHERE patient_id = ANY(%s)
+    """, ([int(p) for p in patient_ids],))
+
+def fill_missing_moments(stored, data_frames):
+    """
+    Merge stored moments with moments computed from already-loaded trials that have none stored.
+
+    Args:
+        stored (dict): {data_id: moments} from one of the load_* functions
+        data_frames (dict): Loaded trials {data_id: dataframe}
+
+    Returns:
+        dict: {str(data_id): moments}
+    """
+    result = {str(data_id): moments for data_id, moments in stored.items()}
+    for data_id, df in data_frames.items():
+        if str(data_id) not in result:
+            moments = compute_trial_moments(df)
+            if moments:
+                result[str(data_id)] = moments
+    return result
@@ -1,18 +1,23 @@
 from fastapi import FastAPI, WebSocket, HTTPException
+from fastapi.responses import PlainTextResponse
 from typing import Dict
 import json
 import asyncpg
-from datetime import datetime
+from datetime import datetime, timezone
 import os
 import sys
+import time
 import asyncio
 import logging
 
 # Add the parent directory to the path so we can import the database manager
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database.db_manager import get_async_pool, start_temp_table_cleanup
-print("[INFO] Starting WebSocket server...")
-print(f"[DEBUG] Using Python executable: {sys.executable}")
+from database.db_manager import get_async_pool, get_statement, warm_async_pool, start_temp_table_cleanup, get_workload_stats
+from utils.online_anomaly import AnomalyMonitor, AnomalyEventWriter
+from utils.alert_rules import AlertEngine, AlertWriter
+from utils.ingest_metrics import IngestMetrics
+from utils.latency_trace import LatencyAggregator, LatencyWriter, LATENCY_SCHEMA, parse_device_time, elapsed_ms
+from utils.profiling import profiling_router
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,9 +27,30 @@ logger = logging.getLogger('websocket_server')
 
 app = FastAPI()
 
+# Admin-only on-demand CPU (sampling) and memory (tracemalloc) profiles under /debug/profile
+app.include_router(profiling_router())
+
 # Store active connections
 active_connections: Dict[int, WebSocket] = {}
 
+# Online anomaly detection state for every (patient, parameter) stream, and its batched event writer
+anomaly_monitor = AnomalyMonitor()
+anomaly_writer = None
+
+# Compiled clinical alert rules with per-stream duration state, and the batched alerts writer
+alert_engine = AlertEngine()
+alert_writer = None
+
+# Frame counters, stage latencies and pool/queue gauges served at /metrics
+metrics = IngestMetrics()
+metrics.bind_connections(active_connections)
+metrics.bind_queues(lambda: {"anomaly_events": anomaly_writer, "alerts": alert_writer})
+metrics.bind_workloads(get_workload_stats)
+
+# Device->receive and receive->commit latency, summarized per window into latency_metrics
+ingest_latency = LatencyAggregator("ingest")
+latency_writer = None
+
 @app.websocket("/ws/stream/{patient_id}")
 async def websocket_endpoint(websocket: WebSocket, patient_id: int):
     await websocket.accept()
@@ -36,7 +62,7 @@ async def websocket_endpoint(websocket: WebSocket, patient_id: int):
         
         # Test the connection
         async with pool.acquire() as conn:
-            await conn.fetchval("SELECT 1")
+            await (await get_statement(conn, 'ping')).fetchval()
             logger.info(f"Database connection test successful for patient_id: {patient_id}")
         
         await websocket.send_json({"status": "connected", "message": "WebSocket connection established"})
@@ -44,47 +70,59 @@ async def websocket_endpoint(websocket: WebSocket, patient_id: int):
         while True:
             # Receive data from client
             data = await websocket.receive_json()
+            received_at = time.perf_counter()
+            received_time = datetime.now(timezone.utc)
+            metrics.frames.inc("received")
             
             # Validate data format
             if not isinstance(data, dict) or "sensor_data" not in data:
+                metrics.frames.inc("invalid")
                 await websocket.send_json({"error": "Invalid data format"})
                 continue
             
             try:
-                async with pool.acquire() as conn:
-                    # Always insert into live_patient_data (rolling data)
+                payload = json.dumps(data["sensor_data"])
+                device_time = parse_device_time(data.get("timestamp"))
+                ingest_latency.add("device_to_receive", elapsed_ms(device_time, received_time))
+                async with metrics.acquire(pool) as conn:
+                    db_started = time.perf_counter()
+                    # Always insert into live_patient_data (rolling data); statements are prepared per connection
                     try:
-                        await conn.execute("""
-                            INSERT INTO live_patient_data (patient_id, sensor_data)
-                            VALUES ($1, $2::jsonb)
-                        """, patient_id, json.dumps(data["sensor_data"]))
+                        await (await get_statement(conn, 'insert_live')).fetch(patient_id, payload, device_time, received_time)
+                        # Autocommit: the row is committed once the statement returns
+                        ingest_latency.add("receive_to_commit", (time.perf_counter() - received_at) * 1000.0)
                     except asyncpg.UndefinedTableError:
                         logger.warning("live_patient_data table not found. This should not happen with auto-initialization.")
+                        metrics.frames.inc("failed")
                         await websocket.send_json({"error": "Database tables not properly initialized"})
                         continue
                     
+                    # One row per patient for the ward view
+                    try:
+                        await (await get_statement(conn, 'upsert_latest')).fetch(patient_id, payload, device_time, received_time)
+                    except asyncpg.UndefinedTableError:
+                        logger.warning("latest_reading table not found; ward view will not update.")
+                    
                     # Check if there's an active trial
                     trial_id = None
                     try:
-                        trial_result = await conn.fetchrow("""
-                            SELECT trial_id 
-                            FROM patient_trials 
-                            WHERE patient_id = $1 
-                            AND end_time IS NULL
-                            ORDER BY start_time DESC 
-                            LIMIT 1
-                        """, patient_id)
+                        trial_result = await (await get_statement(conn, 'active_trial')).fetchrow(patient_id)
                         
                         if trial_result:
                             trial_id = trial_result['trial_id']
                             
                             # If there's an active trial, also insert into trial_temp
-                            await conn.execute("""
-                                INSERT INTO trial_temp (trial_id, patient_id, sensor_data)
-                                VALUES ($1, $2, $3::jsonb)
-                            """, trial_id, patient_id, json.dumps(data["sensor_data"]))
+                            await (await get_statement(conn, 'insert_trial_temp')).fetch(trial_id, patient_id, payload)
                     except asyncpg.UndefinedTableError:
                         logger.warning("Required database tables not found. This should not happen with auto-initialization.")
+                    metrics.db_insert.observe(time.perf_counter() - db_started)
+                
+                # Score the reading against its streams' running baselines; events are written in batches
+                if anomaly_writer is not None and isinstance(data["sensor_data"], dict):
+                    anomaly_writer.add(anomaly_monitor.observe(patient_id, data["sensor_data"], device_time))
+                if alert_writer is not None and isinstance(data["sensor_data"], dict):
+                    alert_writer.add(alert_engine.evaluate(patient_id, data["sensor_data"],
+                                                          device_time.timestamp() if device_time else None))
                     
                 # Send acknowledgment
                 await websocket.send_json({
@@ -92,7 +130,10 @@ async def websocket_endpoint(websocket: WebSocket, patient_id: int):
                     "trial_id": trial_id,
                     "timestamp": datetime.now().isoformat()
                 })
+                metrics.frames.inc("acked")
+                metrics.receive_to_ack.observe(time.perf_counter() - received_at)
             except Exception as db_error:
+                metrics.frames.inc("failed")
                 logger.error(f"Database operation error for patient {patient_id}: {str(db_error)}")
                 await websocket.send_json({
                     "status": "error",
@@ -109,13 +150,18 @@ async def websocket_endpoint(websocket: WebSocket, patient_id: int):
         if patient_id in active_connections:
             del active_connections[patient_id]
 
+# Prometheus scrape endpoint; reads only in-process counters, never the database
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     try:
         pool = await get_async_pool()
         async with pool.acquire() as conn:
-            result = await conn.fetchval("SELECT 1")
+            result = await (await get_statement(conn, 'ping')).fetchval()
             return {"status": "healthy", "database": "connected"}
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -124,7 +170,10 @@ async def health_check():
 @app.on_event("startup")
 async def startup_event():
     """Run when the server starts"""
+    global anomaly_writer, alert_writer, latency_writer
     logger.info("Starting WebSocket server...")
+    logger.debug(f"Using Python executable: {sys.executable}")
+    metrics.loop.start()
     # Start the temp table cleanup thread
     start_temp_table_cleanup()
     
@@ -132,6 +181,28 @@ async def startup_event():
     try:
         pool = await get_async_pool()
         logger.info("Database pool initialized successfully")
+        
+        # Timestamp columns the ingest statements write (added in place on older databases)
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(LATENCY_SCHEMA)
+        except Exception as e:
+            logger.error(f"Failed to apply latency schema: {e}")
+        
+        # Connect and prepare the hot statements now so the first frames don't pay for it
+        await warm_async_pool()
+        
+        if pool is not None:
+            metrics.bind_pool(pool)
+            anomaly_writer = AnomalyEventWriter(pool)
+            anomaly_writer.start(anomaly_monitor.prune)
+            
+            await alert_engine.load(pool)
+            alert_writer = AlertWriter(pool)
+            alert_writer.start(lambda: alert_engine.refresh(pool))
+            
+            latency_writer = LatencyWriter(pool, ingest_latency)
+            latency_writer.start(latency_writer.collect)
     except Exception as e:
         logger.error(f"Failed to initialize database pool: {e}")
 
@@ -139,6 +210,14 @@ async def startup_event():
 async def shutdown_event():
     """Run when the server shuts down"""
     logger.info("Shutting down WebSocket server...")
+    metrics.loop.stop()
+    if anomaly_writer is not None:
+        await anomaly_writer.stop()
+    if alert_writer is not None:
+        await alert_writer.stop()
+    if latency_writer is not None:
+        latency_writer.add(ingest_latency.drain(force=True))
+        await latency_writer.stop()
 
 if __name__ == "__main__":
     import uvicorn